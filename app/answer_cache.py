@@ -0,0 +1,97 @@
+"""In-memory LRU/TTL cache of chat answers.
+
+Many students ask the same question about the same slide.  Answers are keyed
+by class, slide, the normalised question and a digest of the slide text, so a
+repeated question skips the LLM round-trip entirely.  The cache also keeps
+simple latency figures for the completions it could not avoid.
+"""
+
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+import hashlib
+import os
+import re
+import threading
+import time
+
+try:  # package style
+    from app.metrics import observe_stage  # type: ignore
+except ImportError:
+    from metrics import observe_stage  # type: ignore
+
+ANSWER_CACHE_SIZE = int(os.environ.get("ANSWER_CACHE_SIZE", "2048"))
+ANSWER_CACHE_TTL = float(os.environ.get("ANSWER_CACHE_TTL", str(24 * 60 * 60)))
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_question(question: str) -> str:
+    """Lower-case ``question`` and drop punctuation and extra whitespace."""
+
+    text = _PUNCTUATION.sub(" ", question.lower())
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+class AnswerCache:
+    def __init__(self, max_entries: int = ANSWER_CACHE_SIZE, ttl: float = ANSWER_CACHE_TTL) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple, Tuple[float, str]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.llm_calls = 0
+        self.llm_seconds_total = 0.0
+        self.llm_seconds_max = 0.0
+
+    @staticmethod
+    def key(uid: str, slide_index: int, question: str, slide_text: Optional[str]) -> Tuple:
+        text_digest = hashlib.sha256((slide_text or "").encode()).hexdigest()
+        return (uid, slide_index, normalize_question(question), text_digest)
+
+    def get(self, key: Tuple) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: Tuple, answer: str) -> None:
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl, answer)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def record_llm(self, seconds: float) -> None:
+        observe_stage("llm", seconds)
+        with self._lock:
+            self.llm_calls += 1
+            self.llm_seconds_total += seconds
+            self.llm_seconds_max = max(self.llm_seconds_max, seconds)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "llm_calls": self.llm_calls,
+                "llm_seconds_avg": (
+                    self.llm_seconds_total / self.llm_calls if self.llm_calls else 0.0
+                ),
+                "llm_seconds_max": self.llm_seconds_max,
+            }
+
+
+answer_cache = AnswerCache()
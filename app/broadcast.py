@@ -0,0 +1,144 @@
+"""Fan-out of realtime avatar frames to many WebSocket viewers.
+
+Every viewer of a class used to open its own fal realtime session and
+receive base64 text frames with no flow control.  An :class:`AvatarStream`
+now runs one upstream ``stream_musetalk`` session per class and copies each
+frame, decoded once to raw JPEG bytes, into a small per-viewer queue.  When a
+viewer falls behind, its oldest queued frame is dropped instead of letting
+memory grow or slowing down everyone else.
+"""
+
+from typing import AsyncIterator, Callable, Dict, Optional, Set, Tuple
+
+import asyncio
+import base64
+import binascii
+import os
+
+try:  # package style
+    from app.metrics import WS_FRAMES, WS_FRAMES_DROPPED  # type: ignore
+except ImportError:
+    from metrics import WS_FRAMES, WS_FRAMES_DROPPED  # type: ignore
+
+FRAME_QUEUE_SIZE = int(os.environ.get("FRAME_QUEUE_SIZE", "8"))
+
+# ("bytes", jpeg) for frames, ("text", message) for RESULT::/ERROR: notices;
+# ``None`` marks the end of the stream.
+Message = Optional[Tuple[str, object]]
+
+
+def decode_frame(item) -> Tuple[str, object]:
+    if isinstance(item, (bytes, bytearray)):
+        return ("bytes", bytes(item))
+    if item.startswith(("RESULT::", "ERROR:")):
+        return ("text", item)
+    try:
+        return ("bytes", base64.b64decode(item, validate=True))
+    except (binascii.Error, ValueError):
+        return ("text", item)
+
+
+class Subscriber:
+    """Bounded frame queue for one viewer."""
+
+    def __init__(self, maxsize: int = FRAME_QUEUE_SIZE) -> None:
+        self.queue: "asyncio.Queue[Message]" = asyncio.Queue(maxsize)
+        self.dropped = 0
+
+    def offer(self, message: Message) -> None:
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+            WS_FRAMES_DROPPED.inc()
+        self.queue.put_nowait(message)
+
+
+class AvatarStream:
+    """One upstream session shared by every subscriber of a class."""
+
+    def __init__(self, key: str, source: Callable[[], AsyncIterator],
+                 on_close: Callable[["AvatarStream"], None]) -> None:
+        self.key = key
+        self.source = source
+        self.on_close = on_close
+        self.subscribers: Set[Subscriber] = set()
+        self.frames = 0
+        self._task: Optional[asyncio.Task] = None
+        self._last_text: Optional[Tuple[str, object]] = None
+
+    def subscribe(self) -> Subscriber:
+        sub = Subscriber()
+        if self._last_text is not None:
+            # Late joiners still learn about a finished fallback render
+            sub.offer(self._last_text)
+        self.subscribers.add(sub)
+        if self._task is None:
+            self._task = asyncio.create_task(self._pump())
+        return sub
+
+    def unsubscribe(self, sub: Subscriber) -> None:
+        self.subscribers.discard(sub)
+        if not self.subscribers:
+            self.close()
+
+    def close(self) -> None:
+        self.on_close(self)
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+
+    def _publish(self, message: Message) -> None:
+        for sub in list(self.subscribers):
+            sub.offer(message)
+
+    async def _pump(self) -> None:
+        upstream = self.source()
+        try:
+            async for item in upstream:
+                message = decode_frame(item)
+                if message[0] == "bytes":
+                    self.frames += 1
+                    WS_FRAMES.inc(direction="received")
+                else:
+                    self._last_text = message
+                self._publish(message)
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            self._publish(("text", f"ERROR: {exc}"))
+        finally:
+            if hasattr(upstream, "aclose"):
+                await upstream.aclose()
+            self.on_close(self)
+            self._publish(None)
+
+
+class Broadcaster:
+    """Registry of live :class:`AvatarStream` objects keyed by class id."""
+
+    def __init__(self) -> None:
+        self._streams: Dict[str, AvatarStream] = {}
+
+    def join(self, key: str, source: Callable[[], AsyncIterator]) -> Tuple[AvatarStream, Subscriber]:
+        stream = self._streams.get(key)
+        if stream is None:
+            stream = self._streams[key] = AvatarStream(key, source, self._forget)
+        return stream, stream.subscribe()
+
+    def _forget(self, stream: AvatarStream) -> None:
+        # A cancelled pump finishes after a new viewer may already have
+        # started a fresh stream for the same class; leave that one alone
+        if self._streams.get(stream.key) is stream:
+            del self._streams[stream.key]
+
+    def stats(self) -> dict:
+        return {
+            key: {
+                "viewers": len(stream.subscribers),
+                "frames": stream.frames,
+                "dropped": sum(sub.dropped for sub in stream.subscribers),
+            }
+            for key, stream in self._streams.items()
+        }
+
+
+avatar_broadcaster = Broadcaster()
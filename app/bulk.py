@@ -0,0 +1,370 @@
+"""Bulk ingestion of many classes from one archive.
+
+Onboarding a course used to mean one ``POST /upload`` per lecture, each
+sending the same avatar again.  ``POST /ingest`` takes a zip archive whose
+``manifest.json`` describes every class::
+
+    {"shared": {"avatar": "avatar.mp4"},
+     "classes": [{"name": "Week 1", "audio": "week1/audio.wav",
+                  "timestamps": "week1/timestamps.json",
+                  "slides": "week1/slides.pdf"}, ...]}
+
+A class names its ``audio``, ``timestamps``, ``avatar`` and optionally
+``slides`` (archive member names), ``slides_id`` and ``mode``; whatever it
+leaves out is taken from ``shared``.  A file used by several classes is
+extracted once and hard-linked into each class directory, so it is stored
+once on disk and, being the same content, uploaded to fal once.
+
+Classes are prepared (extracted, rasterized, text-indexed) at most
+``INGEST_CONCURRENCY`` at a time, and each render job is queued as soon as its
+class is ready.  Slide work on later lectures therefore overlaps with the
+renders of earlier ones, which the job queue bounds by
+``RENDER_CONCURRENCY``.  ``GET /ingest/{id}`` aggregates the state of every
+class with the throughput so far.  Batches are JSON records in
+``jobs/batches`` kept by a :class:`~jobs.JobStore`.
+"""
+
+from collections import Counter
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+import uuid
+import zipfile
+
+try:  # package style
+    from app.hashing import remember_digest  # type: ignore
+    from app.ingest import MAX_UPLOAD_BYTES, UPLOAD_CHUNK_SIZE  # type: ignore
+    from app.jobs import FINAL_STATUSES, JobStore  # type: ignore
+    from app.metrics import observe_stage  # type: ignore
+    from app.storage import ClassStorage, storage  # type: ignore
+except ImportError:
+    from hashing import remember_digest  # type: ignore
+    from ingest import MAX_UPLOAD_BYTES, UPLOAD_CHUNK_SIZE  # type: ignore
+    from jobs import FINAL_STATUSES, JobStore  # type: ignore
+    from metrics import observe_stage  # type: ignore
+    from storage import ClassStorage, storage  # type: ignore
+
+log = logging.getLogger(__name__)
+
+INGEST_CONCURRENCY = int(os.environ.get("INGEST_CONCURRENCY", "2"))
+INGEST_MAX_CLASSES = int(os.environ.get("INGEST_MAX_CLASSES", "200"))
+
+MANIFEST_NAME = "manifest.json"
+REQUIRED_FIELDS = ("audio", "timestamps", "avatar")
+# Name of each file in the class directory; the avatar keeps its extension.
+_FILE_NAMES = {"audio": "audio.wav", "timestamps": "timestamps.json", "slides": "slides.pdf"}
+
+# ``prepare(uid, paths, digests, slides_id, mode)`` registers the files of a
+# class, renders its slides and queues its render; returns the job.
+Prepare = Callable[[str, Dict[str, str], Dict[str, str], str, str], Awaitable[dict]]
+
+# Job statuses shown as one aggregate state.
+_RENDERING = {"uploading", "inferring", "downloading"}
+
+
+class ArchiveError(ValueError):
+    """The archive or its manifest cannot be ingested."""
+
+
+def read_manifest(archive_path: str) -> List[dict]:
+    """Validate the archive and return one ``{"name", "mode", "slides_id",
+    "files"}`` spec per class, ``files`` mapping fields to member names."""
+
+    try:
+        with zipfile.ZipFile(archive_path) as zf:
+            members = {info.filename: info.file_size for info in zf.infolist()}
+            raw = zf.read(MANIFEST_NAME) if MANIFEST_NAME in members else None
+    except zipfile.BadZipFile as exc:
+        raise ArchiveError(f"not a zip archive: {exc}") from None
+    if raw is None:
+        raise ArchiveError(f"archive has no {MANIFEST_NAME}")
+    try:
+        manifest = json.loads(raw)
+    except ValueError as exc:
+        raise ArchiveError(f"invalid {MANIFEST_NAME}: {exc}") from None
+    if not isinstance(manifest, dict):
+        raise ArchiveError(f"{MANIFEST_NAME} must be an object")
+
+    shared = manifest.get("shared") or {}
+    classes = manifest.get("classes")
+    if not isinstance(shared, dict):
+        raise ArchiveError('"shared" must be an object')
+    if not isinstance(classes, list) or not classes:
+        raise ArchiveError(f"{MANIFEST_NAME} lists no classes")
+    if len(classes) > INGEST_MAX_CLASSES:
+        raise ArchiveError(f"at most {INGEST_MAX_CLASSES} classes per archive")
+
+    specs = []
+    for number, entry in enumerate(classes, start=1):
+        if not isinstance(entry, dict):
+            raise ArchiveError(f"class {number} is not an object")
+        name = str(entry.get("name") or f"class {number}")
+        mode = entry.get("mode", shared.get("mode", "full"))
+        if mode not in ("full", "segmented"):
+            raise ArchiveError(f"{name}: unknown render mode {mode!r}")
+        files = {}
+        for field in (*REQUIRED_FIELDS, "slides"):
+            member = entry.get(field, shared.get(field))
+            if member is None:
+                if field in REQUIRED_FIELDS:
+                    raise ArchiveError(f"{name}: no {field}")
+                continue
+            if not isinstance(member, str) or member not in members:
+                raise ArchiveError(f"{name}: {member} is not in the archive")
+            if members[member] > MAX_UPLOAD_BYTES[field]:
+                raise ArchiveError(f"{name}: {member} exceeds the size limit for {field}")
+            files[field] = member
+        specs.append({
+            "name": name,
+            "mode": mode,
+            "slides_id": str(entry.get("slides_id", shared.get("slides_id", ""))),
+            "files": files,
+        })
+    return specs
+
+
+def _extract(zf: zipfile.ZipFile, member: str, path: str, field: str) -> str:
+    """Copy ``member`` to ``path`` in chunks; returns its SHA-256 digest."""
+
+    # The header size was checked, but only the bytes read can be trusted
+    limit = MAX_UPLOAD_BYTES[field]
+    h = hashlib.sha256()
+    size = 0
+    tmp = f"{path}.part"
+    try:
+        with zf.open(member) as src, open(tmp, "wb") as out:
+            while True:
+                chunk = src.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > limit:
+                    raise ArchiveError(f"{member} exceeds the size limit for {field}")
+                h.update(chunk)
+                out.write(chunk)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    os.replace(tmp, path)
+    digest = h.hexdigest()
+    remember_digest(path, digest)
+    return digest
+
+
+def _link(src: str, dst: str) -> None:
+    try:
+        os.link(src, dst)
+    except OSError:
+        # Different filesystem, or one without hard links
+        shutil.copyfile(src, dst)
+
+
+class BulkIngest:
+    """Runs ingest batches and reports on them."""
+
+    def __init__(self, store: JobStore, jobs: JobStore, prepare: Prepare,
+                 classes: ClassStorage = storage, concurrency: int = INGEST_CONCURRENCY) -> None:
+        self.store = store
+        self.jobs = jobs
+        self.prepare = prepare
+        self.classes = classes
+        self.concurrency = max(1, concurrency)
+        self._tasks: set = set()
+        self._preparing: set = set()
+
+    def archive_path(self) -> str:
+        """A fresh path for an uploaded archive, next to the batch records."""
+
+        os.makedirs(self.store.directory, exist_ok=True)
+        return os.path.join(self.store.directory, f"{uuid.uuid4().hex}.zip")
+
+    def recover(self) -> None:
+        """Load batch records; classes whose preparation a restart
+        interrupted are marked failed (queued renders resume on their own)."""
+
+        for batch in self.store.load():
+            if batch["status"] != "preparing":
+                continue
+            classes = batch["classes"]
+            for entry in classes:
+                if entry["state"] in ("pending", "preparing"):
+                    if entry["uid"]:
+                        self.classes.remove_class(entry["uid"])
+                    entry.update(state="failed", error="interrupted by a restart")
+            self._cleanup(batch["archive"])
+            self.store.update(batch["id"], status="prepared", classes=classes)
+
+    def start(self, archive_path: str, specs: List[dict]) -> dict:
+        """Record a batch for ``specs`` and prepare its classes in the background."""
+
+        batch = self.store.create(
+            status="preparing",
+            archive=archive_path,
+            classes=[
+                {"name": spec["name"], "uid": None, "job_id": None, "state": "pending", "error": None}
+                for spec in specs
+            ],
+        )
+        task = asyncio.create_task(self._run(batch["id"], archive_path, specs))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return batch
+
+    # -- preparation ------------------------------------------------------
+
+    @staticmethod
+    def _cleanup(archive_path: str) -> None:
+        shutil.rmtree(f"{archive_path}.shared", ignore_errors=True)
+        try:
+            os.remove(archive_path)
+        except FileNotFoundError:
+            pass
+
+    def _extract_shared(self, archive_path: str, specs: List[dict]) -> Dict[str, Tuple[str, str]]:
+        """Extract members used by more than one class into a staging folder."""
+
+        uses = Counter(
+            (field, member) for spec in specs for field, member in spec["files"].items()
+        )
+        staging = f"{archive_path}.shared"
+        os.makedirs(staging, exist_ok=True)
+        shared = {}
+        with zipfile.ZipFile(archive_path) as zf:
+            for (field, member), count in uses.items():
+                if count > 1 and member not in shared:
+                    path = os.path.join(staging, hashlib.sha256(member.encode()).hexdigest())
+                    shared[member] = (path, _extract(zf, member, path, field))
+        return shared
+
+    def _materialize(self, archive_path: str, spec: dict, uid: str,
+                     shared: Dict[str, Tuple[str, str]]) -> Tuple[Dict[str, str], Dict[str, str]]:
+        """Put the files of one class into its directory."""
+
+        paths, digests = {}, {}
+        with zipfile.ZipFile(archive_path) as zf:
+            for field, member in spec["files"].items():
+                name = _FILE_NAMES.get(field) or f"avatar{os.path.splitext(member)[1] or '.mp4'}"
+                path = self.classes.input_path(uid, name)
+                if member in shared:
+                    src, digest = shared[member]
+                    _link(src, path)
+                    remember_digest(path, digest)
+                else:
+                    digest = _extract(zf, member, path, field)
+                paths[field], digests[field] = path, digest
+        return paths, digests
+
+    async def _prepare_class(self, batch_id: str, classes: List[dict], index: int,
+                             archive_path: str, spec: dict, shared: dict) -> None:
+        entry = classes[index]
+        uid = uuid.uuid4().hex
+        entry.update(state="preparing", uid=uid)
+        self._preparing.add(uid)
+        self.store.update(batch_id, classes=classes)
+        start = time.perf_counter()
+        try:
+            paths, digests = await asyncio.to_thread(
+                self._materialize, archive_path, spec, uid, shared
+            )
+            job = await self.prepare(uid, paths, digests, spec["slides_id"], spec["mode"])
+        except Exception as exc:
+            log.warning("Ingesting %s failed: %s", spec["name"], exc, extra={"batch": batch_id})
+            await asyncio.to_thread(self.classes.remove_class, uid)
+            entry.update(state="failed", uid=None, error=str(exc))
+        else:
+            entry.update(state="queued", job_id=job["id"])
+        finally:
+            self._preparing.discard(uid)
+        elapsed = time.perf_counter() - start
+        observe_stage("ingest_class", elapsed)
+        entry["prepare_seconds"] = round(elapsed, 3)
+        self.store.update(batch_id, classes=classes)
+
+    async def _run(self, batch_id: str, archive_path: str, specs: List[dict]) -> None:
+        classes = self.store.get(batch_id)["classes"]
+        slots = asyncio.Semaphore(self.concurrency)
+
+        async def one(index: int, spec: dict) -> None:
+            async with slots:
+                await self._prepare_class(batch_id, classes, index, archive_path, spec, shared)
+
+        try:
+            shared = await asyncio.to_thread(self._extract_shared, archive_path, specs)
+            await asyncio.gather(*(one(i, spec) for i, spec in enumerate(specs)))
+        except Exception as exc:
+            log.error("Ingest batch %s failed: %s", batch_id, exc)
+            for entry in classes:
+                if entry["state"] == "pending":
+                    entry.update(state="failed", error=str(exc))
+        finally:
+            await asyncio.to_thread(self._cleanup, archive_path)
+            self.store.update(batch_id, status="prepared", classes=classes, prepared_at=time.time())
+        log.info("Ingest batch %s prepared", batch_id, extra={"classes": len(classes)})
+
+    # -- reporting ----------------------------------------------------------
+
+    def status(self, batch_id: str) -> Optional[dict]:
+        """Per-class state plus aggregate counts, throughput and an ETA."""
+
+        batch = self.store.get(batch_id)
+        if batch is None:
+            return None
+        counts: Counter = Counter()
+        classes = []
+        finished_at = batch.get("prepared_at") or 0.0
+        for entry in batch["classes"]:
+            state, error = entry["state"], entry["error"]
+            if entry["job_id"]:
+                job = self.jobs.get(entry["job_id"]) or {}
+                state = job.get("status", "queued")
+                error = job.get("error")
+                if state in FINAL_STATUSES:
+                    finished_at = max(finished_at, job.get("finished_at") or 0.0)
+            counts["rendering" if state in _RENDERING else state] += 1
+            classes.append({
+                "name": entry["name"],
+                "id": entry["uid"],
+                "job_id": entry["job_id"],
+                "status": state,
+                "error": error,
+            })
+
+        total = len(classes)
+        complete = counts["done"] + counts["failed"]
+        if counts["pending"] or counts["preparing"]:
+            status = "preparing"
+        elif complete < total:
+            status = "rendering"
+        else:
+            status = "done"
+        end = finished_at if status == "done" else time.time()
+        elapsed = max(end - batch["created_at"], 1e-6)
+        rate = counts["done"] / elapsed
+        return {
+            "id": batch["id"],
+            "status": status,
+            "total": total,
+            "counts": {
+                state: counts[state]
+                for state in ("pending", "preparing", "queued", "rendering", "done", "failed")
+            },
+            "elapsed_seconds": round(elapsed, 1),
+            "classes_per_hour": round(rate * 3600, 2),
+            "eta_seconds": round((total - complete) / rate, 1) if rate and complete < total else None,
+            "classes": classes,
+        }
+
+    def active_uids(self) -> set:
+        """Classes whose files are still being put in place."""
+
+        return set(self._preparing)
+
+    def stats(self) -> dict:
+        return {"concurrency": self.concurrency, "batches_running": len(self._tasks)}
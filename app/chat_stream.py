@@ -0,0 +1,129 @@
+"""Incremental chat answers: token stream -> sentences -> avatar clips.
+
+The ``/chat`` endpoint waits for the full completion, then synthesises and
+renders the whole answer before the student sees anything.  Here the LLM
+output is streamed, cut at sentence boundaries, and each sentence is sent to
+TTS and MuseTalk as soon as it is complete while later sentences are still
+being generated.  Time to first frame then depends on the first sentence only.
+"""
+
+from typing import AsyncIterator, List, Optional
+
+import asyncio
+import os
+import re
+import uuid
+
+try:  # package style
+    from app.musetalk_runner import run_musetalk  # type: ignore
+    from app.delivery import discard, package_output, staging_path  # type: ignore
+    from app.storage import storage  # type: ignore
+    from app.tts import tts_service  # type: ignore
+except ImportError:
+    from musetalk_runner import run_musetalk  # type: ignore
+    from delivery import discard, package_output, staging_path  # type: ignore
+    from storage import storage  # type: ignore
+    from tts import tts_service  # type: ignore
+
+
+# Sentences shorter than this are merged with the next one; a clip per
+# "Sure." would cost a full render for half a second of video.
+MIN_SENTENCE_CHARS = 40
+
+# Upper bound on sentences of one answer rendering at the same time.
+SENTENCE_CONCURRENCY = int(os.environ.get("CHAT_SENTENCE_CONCURRENCY", "3"))
+
+_BOUNDARY = re.compile(r"(?<=[.!?])\s+")
+
+
+class SentenceSplitter:
+    """Accumulate streamed text and release complete sentences."""
+
+    def __init__(self, min_chars: int = MIN_SENTENCE_CHARS) -> None:
+        self.min_chars = min_chars
+        self._buffer = ""
+        self._pending = ""
+
+    def feed(self, text: str) -> List[str]:
+        self._buffer += text
+        parts = _BOUNDARY.split(self._buffer)
+        self._buffer = parts.pop()
+        sentences = []
+        for part in parts:
+            self._pending = f"{self._pending} {part}".strip()
+            if len(self._pending) >= self.min_chars:
+                sentences.append(self._pending)
+                self._pending = ""
+        return sentences
+
+    def flush(self) -> List[str]:
+        rest = f"{self._pending} {self._buffer}".strip()
+        self._pending = self._buffer = ""
+        return [rest] if rest else []
+
+
+async def stream_completion(client, prompt: str, model: str = "gpt-3.5-turbo") -> AsyncIterator[str]:
+    """Yield the text deltas of a streamed chat completion."""
+
+    stream = await client.chat.completions.create(
+        model=model,
+        messages=[{"role": "user", "content": prompt}],
+        stream=True,
+    )
+    async for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+
+async def render_clip(uid: str, audio_path: str, avatar_path: str, kind: str = "qa_clip",
+                      prefix: str = "qa", position: Optional[int] = None) -> str:
+    """Render an answer clip and return its name relative to ``/outputs``."""
+
+    output_path = storage.output_path(uid, f"{prefix}_{uuid.uuid4().hex}.mp4")
+    staged = staging_path(output_path)
+    try:
+        await run_musetalk(audio_path, avatar_path, staged)
+        await asyncio.to_thread(package_output, staged, output_path, False)
+    finally:
+        await asyncio.to_thread(discard, staged)
+    await asyncio.to_thread(storage.register, uid, kind, output_path, position=position)
+    return storage.output_name(output_path)
+
+
+class ClipPipeline:
+    """Render sentences concurrently and deliver the clips in order."""
+
+    def __init__(self, uid: str, avatar_path: str, concurrency: int = SENTENCE_CONCURRENCY) -> None:
+        self.uid = uid
+        self.avatar_path = avatar_path
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._tasks: "asyncio.Queue" = asyncio.Queue()
+
+    async def _render(self, text: str) -> str:
+        async with self._semaphore:
+            audio_path = await tts_service.synthesize(text)
+            return await render_clip(self.uid, audio_path, self.avatar_path)
+
+    def submit(self, text: str) -> None:
+        self._tasks.put_nowait((text, asyncio.create_task(self._render(text))))
+
+    def close(self) -> None:
+        self._tasks.put_nowait(None)
+
+    async def results(self) -> AsyncIterator[tuple]:
+        """Yield ``(index, text, clip_name)`` as clips finish, in sentence order."""
+
+        index = 0
+        while True:
+            item = await self._tasks.get()
+            if item is None:
+                return
+            text, task = item
+            yield index, text, await task
+            index += 1
+
+    def cancel(self) -> None:
+        while not self._tasks.empty():
+            item = self._tasks.get_nowait()
+            if item is not None:
+                item[1].cancel()
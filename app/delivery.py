@@ -0,0 +1,171 @@
+"""Post-render packaging of generated videos for fast playback.
+
+MuseTalk results may have their ``moov`` atom at the end of the file, in
+which case a browser has to fetch most of a long lecture before it can start.
+:func:`faststart` remuxes such files (stream copy, no re-encode) so the index
+comes first, and :func:`package_hls` adds an HLS rendition with short
+segments so time to first frame no longer depends on the lecture length.
+Both steps need ``ffmpeg`` and are skipped when it is unavailable.
+
+``/outputs`` lets clients cache files, so a URL must never show bytes that
+later change.  Videos are therefore rendered to a :func:`staging_path`,
+remuxed and packaged there, and only then renamed to their public name by
+:func:`package_output`.  HLS segments are named after their content, and
+answer clips get a fresh random name each; both never change once written
+(:data:`WRITE_ONCE_NAME`) and may be cached as immutable.  Everything else
+(``lecture.mp4``, playlists, ``seg_{n}.mp4``, previews) is replaced by the
+next render and must be revalidated.
+"""
+
+from typing import Optional
+
+import hashlib
+import logging
+import os
+import re
+import shutil
+import struct
+import subprocess
+import uuid
+
+log = logging.getLogger(__name__)
+
+HLS_ENABLED = os.environ.get("HLS_ENABLED", "1") != "0"
+HLS_SEGMENT_SECONDS = int(os.environ.get("HLS_SEGMENT_SECONDS", "4"))
+
+WRITE_ONCE_NAME = re.compile(r"^(?:(?:qa|warm)_[0-9a-f]{32}\.mp4|seg_\d+\.[0-9a-f]{12}\.ts)$")
+
+
+def staging_path(path: str) -> str:
+    """A private name next to ``path`` to render into before publishing."""
+
+    root, ext = os.path.splitext(path)
+    return f"{root}.{uuid.uuid4().hex}.tmp{ext}"
+
+
+def moov_first(path: str) -> bool:
+    """Return True if the MP4 ``moov`` box precedes the ``mdat`` box."""
+
+    with open(path, "rb") as f:
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                return False
+            size, kind = struct.unpack(">I4s", header)
+            if kind == b"moov":
+                return True
+            if kind == b"mdat":
+                return False
+            if size == 1:
+                size = struct.unpack(">Q", f.read(8))[0]
+                f.seek(size - 16, os.SEEK_CUR)
+            elif size == 0:
+                return False
+            else:
+                f.seek(size - 8, os.SEEK_CUR)
+
+
+def _ffmpeg(*args: str) -> None:
+    subprocess.run(
+        ["ffmpeg", "-y", "-v", "error", *args],
+        check=True,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+    )
+
+
+def faststart(path: str) -> bool:
+    """Move the index of ``path`` to the front; return True if remuxed."""
+
+    if moov_first(path):
+        return False
+    tmp = f"{path}.{uuid.uuid4().hex}.mp4"
+    try:
+        _ffmpeg("-i", path, "-map", "0", "-c", "copy", "-movflags", "+faststart", tmp)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return True
+
+
+def hls_dir(path: str) -> str:
+    return f"{os.path.splitext(path)[0]}_hls"
+
+
+def _hash_segments(directory: str, playlist: str) -> None:
+    """Rename the segments in ``directory`` after their content."""
+
+    names = {}
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(".ts"):
+            continue
+        h = hashlib.sha256()
+        with open(os.path.join(directory, name), "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                h.update(chunk)
+        hashed = f"{name[:-3]}.{h.hexdigest()[:12]}.ts"
+        os.replace(os.path.join(directory, name), os.path.join(directory, hashed))
+        names[name] = hashed
+    with open(playlist) as f:
+        lines = [names.get(line.strip(), line.rstrip("\n")) for line in f]
+    with open(playlist, "w") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def package_hls(path: str, out_dir: Optional[str] = None) -> str:
+    """Write a VOD HLS rendition of ``path`` into ``out_dir`` (by default
+    next to it) and return the playlist path.
+
+    The rendition is built in a scratch folder and renamed into place, so
+    a playlist is never visible before all of its segments exist.
+    """
+
+    out_dir = out_dir or hls_dir(path)
+    scratch = f"{out_dir}.{uuid.uuid4().hex}.tmp"
+    os.makedirs(scratch)
+    try:
+        _ffmpeg(
+            "-i", path,
+            "-c", "copy",
+            "-f", "hls",
+            "-hls_time", str(HLS_SEGMENT_SECONDS),
+            "-hls_playlist_type", "vod",
+            "-hls_segment_filename", os.path.join(scratch, "seg_%04d.ts"),
+            os.path.join(scratch, "index.m3u8"),
+        )
+        _hash_segments(scratch, os.path.join(scratch, "index.m3u8"))
+        shutil.rmtree(out_dir, ignore_errors=True)
+        os.replace(scratch, out_dir)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+    return os.path.join(out_dir, "index.m3u8")
+
+
+def package_output(staged: str, path: str, hls: bool = True) -> Optional[str]:
+    """Make ``staged`` fast-start, optionally add HLS, then publish it as
+    ``path``.  Packaging is best effort; the video is published regardless.
+
+    Returns the HLS playlist path when one was produced.
+    """
+
+    playlist = None
+    if shutil.which("ffmpeg") is not None:
+        try:
+            if faststart(staged):
+                log.debug("Moved moov atom to the front of %s", path)
+            if hls and HLS_ENABLED:
+                playlist = package_hls(staged, hls_dir(path))
+        except (subprocess.CalledProcessError, OSError) as exc:
+            log.warning("Failed to package %s: %s", path, exc)
+    os.replace(staged, path)
+    return playlist
+
+
+def discard(staged: str) -> None:
+    """Remove a staged file that will not be published."""
+
+    try:
+        os.remove(staged)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,61 @@
+"""Size bounds for the content-addressed file caches under ``CACHE_DIR``.
+
+The TTS and media caches name files by a digest of what produced them and
+otherwise never delete anything.  Like :class:`musetalk_runner.RenderCache`
+they track recency through the file modification time, bumped on every hit,
+and trim the least recently used files once a directory exceeds its budget.
+"""
+
+from typing import Optional, Tuple
+
+import os
+
+
+def touch(path: str) -> bool:
+    """Mark ``path`` as just used; ``False`` if it no longer exists."""
+
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def trim(directory: str, max_bytes: int, keep: Optional[str] = None) -> Tuple[int, int]:
+    """Delete least recently used files until ``directory`` fits in
+    ``max_bytes``; returns ``(files, bytes)`` removed.
+
+    ``keep`` (the entry just written) is never removed, nor are temporary
+    files still being written.
+    """
+
+    if max_bytes <= 0:
+        return 0, 0
+    entries = []
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return 0, 0
+    for name in names:
+        if name.startswith(".") or ".tmp" in name:
+            continue
+        path = os.path.join(directory, name)
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            continue
+        entries.append((st.st_mtime, st.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    count = freed = 0
+    for _, size, path in sorted(entries):
+        if total - freed <= max_bytes:
+            break
+        if path == keep:
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            continue
+        count += 1
+        freed += size
+    return count, freed
@@ -0,0 +1,59 @@
+"""Content hashing helpers shared by the caches.
+
+Hashing a multi-megabyte avatar on every request would cost almost as much as
+the work the caches save, so digests are memoised per ``(path, size, mtime)``
+and only recomputed when the file changes.  The memo keeps the
+``HASH_MEMO_SIZE`` most recently used digests.
+"""
+
+from collections import OrderedDict
+from typing import Tuple
+
+import hashlib
+import os
+import threading
+
+CHUNK_SIZE = 1024 * 1024
+HASH_MEMO_SIZE = int(os.environ.get("HASH_MEMO_SIZE", "4096"))
+
+_memo: "OrderedDict[Tuple[str, int, int], str]" = OrderedDict()
+_memo_lock = threading.Lock()
+
+
+def _memo_key(path: str) -> Tuple[str, int, int]:
+    st = os.stat(path)
+    return (os.path.realpath(path), st.st_size, st.st_mtime_ns)
+
+
+def _remember(key: Tuple[str, int, int], digest: str) -> None:
+    with _memo_lock:
+        _memo[key] = digest
+        _memo.move_to_end(key)
+        while len(_memo) > HASH_MEMO_SIZE:
+            _memo.popitem(last=False)
+
+
+def sha256_file(path: str) -> str:
+    """Return the hex SHA-256 digest of ``path``."""
+
+    key = _memo_key(path)
+    with _memo_lock:
+        digest = _memo.get(key)
+        if digest:
+            _memo.move_to_end(key)
+    if digest:
+        return digest
+
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            h.update(chunk)
+    digest = h.hexdigest()
+    _remember(key, digest)
+    return digest
+
+
+def remember_digest(path: str, digest: str) -> None:
+    """Record a digest computed elsewhere, e.g. while a file was streamed in."""
+
+    _remember(_memo_key(path), digest)
@@ -0,0 +1,86 @@
+"""Streaming ingestion of uploaded class files.
+
+Uploads are copied to disk in fixed-size chunks through ``aiofiles`` so a
+500 MB avatar never sits in memory and the event loop is never blocked on a
+large write.  Each file is hashed as it streams; the digest is recorded with
+:func:`hashing.remember_digest` so the upload and render caches can use it
+without reading the file again.
+"""
+
+from typing import Dict
+
+import hashlib
+import os
+import time
+
+import aiofiles
+from fastapi import HTTPException, UploadFile
+
+try:  # package style
+    from app.hashing import remember_digest  # type: ignore
+    from app.metrics import count_bytes, observe_stage  # type: ignore
+except ImportError:
+    from hashing import remember_digest  # type: ignore
+    from metrics import count_bytes, observe_stage  # type: ignore
+
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+_MB = 1024 * 1024
+
+# Per-field size limits in bytes, overridable through the environment.
+MAX_UPLOAD_BYTES: Dict[str, int] = {
+    "audio": int(os.environ.get("MAX_AUDIO_BYTES", str(200 * _MB))),
+    "timestamps": int(os.environ.get("MAX_TIMESTAMPS_BYTES", str(1 * _MB))),
+    "avatar": int(os.environ.get("MAX_AVATAR_BYTES", str(600 * _MB))),
+    "slides": int(os.environ.get("MAX_SLIDES_BYTES", str(200 * _MB))),
+    # A whole course for ``POST /ingest``
+    "archive": int(os.environ.get("MAX_ARCHIVE_BYTES", str(4096 * _MB))),
+}
+
+
+def _too_large(field: str, limit: int) -> HTTPException:
+    return HTTPException(
+        status_code=413, detail=f"{field} exceeds the {limit // _MB} MB upload limit"
+    )
+
+
+async def save_upload(file: UploadFile, path: str, field: str) -> dict:
+    """Stream ``file`` to ``path`` and return its size and SHA-256 digest.
+
+    Raises ``HTTPException(413)`` as soon as the file is known to exceed the
+    limit for ``field``; a partially written file is removed.
+    """
+
+    limit = MAX_UPLOAD_BYTES[field]
+    # Starlette knows the size once the multipart part is spooled, which lets
+    # us reject oversized files before copying a single byte.
+    if file.size is not None and file.size > limit:
+        raise _too_large(field, limit)
+
+    start = time.perf_counter()
+    h = hashlib.sha256()
+    size = 0
+    tmp = f"{path}.part"
+    try:
+        async with aiofiles.open(tmp, "wb") as out:
+            while True:
+                chunk = await file.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > limit:
+                    raise _too_large(field, limit)
+                h.update(chunk)
+                await out.write(chunk)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    os.replace(tmp, path)
+
+    digest = h.hexdigest()
+    remember_digest(path, digest)
+    observe_stage("ingest", time.perf_counter() - start)
+    count_bytes("in", "ingest", size)
+    return {"path": path, "size": size, "sha256": digest}
@@ -0,0 +1,197 @@
+"""Persistent background queue for avatar render jobs.
+
+Rendering a class through MuseTalk takes minutes, far longer than an HTTP
+request should stay open.  ``POST /upload`` therefore only stores the files and
+enqueues a job; a bounded pool of asyncio workers drains the queue and clients
+poll ``GET /jobs/{id}`` for progress.
+
+Each job is a small JSON document in ``JOBS_DIR`` so that queued or
+interrupted work is picked up again after a process restart.
+"""
+
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+try:  # package style
+    from app.metrics import JOBS_FINISHED, JOBS_IN_FLIGHT, observe_stage  # type: ignore
+except ImportError:
+    from metrics import JOBS_FINISHED, JOBS_IN_FLIGHT, observe_stage  # type: ignore
+
+log = logging.getLogger(__name__)
+
+JOBS_DIR = os.environ.get("JOBS_DIR", "jobs")
+
+# Lifecycle of a job, in order.  ``done`` and ``failed`` are terminal.
+STATUSES = ("queued", "uploading", "inferring", "downloading", "done", "failed")
+FINAL_STATUSES = {"done", "failed"}
+
+
+class JobStore:
+    """Thread-safe job records mirrored to one JSON file per job."""
+
+    def __init__(self, directory: str = JOBS_DIR) -> None:
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, dict] = {}
+
+    def load(self) -> List[dict]:
+        """Read every persisted job from disk, oldest first."""
+
+        os.makedirs(self.directory, exist_ok=True)
+        jobs = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.directory, name)) as f:
+                    jobs.append(json.load(f))
+            except (OSError, ValueError) as exc:
+                log.warning("Skipping unreadable job file %s: %s", name, exc)
+        jobs.sort(key=lambda j: j.get("created_at", 0))
+        with self._lock:
+            self._jobs = {j["id"]: j for j in jobs}
+        return jobs
+
+    def create(self, **fields) -> dict:
+        now = time.time()
+        job = {
+            "id": uuid.uuid4().hex,
+            "status": "queued",
+            "error": None,
+            "created_at": now,
+            "updated_at": now,
+            **fields,
+        }
+        with self._lock:
+            self._jobs[job["id"]] = job
+            self._write(job)
+        return dict(job)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def update(self, job_id: str, **fields) -> dict:
+        with self._lock:
+            job = self._jobs[job_id]
+            job.update(fields)
+            job["updated_at"] = time.time()
+            self._write(job)
+            return dict(job)
+
+    def active_uids(self) -> Set[str]:
+        """Classes with a job that has not finished yet."""
+
+        with self._lock:
+            return {
+                job["uid"] for job in self._jobs.values()
+                if job.get("uid") and job["status"] not in FINAL_STATUSES
+            }
+
+    def _write(self, job: dict) -> None:
+        # Write to a temporary file first so a crash never leaves a truncated
+        # record behind.
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{job['id']}.json")
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(job, f)
+        os.replace(tmp, path)
+
+
+def progress_callback(store: JobStore, job_id: str) -> Callable:
+    """Return an ``on_update`` callback that maps fal queue events to statuses.
+
+    ``fal_client`` reports ``Queued`` and ``InProgress`` while the model runs
+    and ``Completed`` once the result is ready, after which ``run_musetalk``
+    downloads the video.  Matching on the class name keeps this module free of
+    a ``fal_client`` import.
+    """
+
+    def on_update(update) -> None:
+        kind = type(update).__name__
+        if kind == "Queued":
+            store.update(job_id, status="inferring", position=getattr(update, "position", None))
+        elif kind == "InProgress":
+            store.update(job_id, status="inferring", position=None)
+        elif kind == "Completed":
+            store.update(job_id, status="downloading")
+
+    return on_update
+
+
+class JobQueue:
+    """Bounded worker pool that runs ``handler`` for each queued job."""
+
+    def __init__(
+        self,
+        store: JobStore,
+        handler: Callable[[dict], Awaitable[None]],
+        concurrency: int = 2,
+    ) -> None:
+        self.store = store
+        self.handler = handler
+        self.concurrency = max(1, concurrency)
+        self._queue: "asyncio.Queue[str]" = asyncio.Queue()
+        self._workers: List[asyncio.Task] = []
+
+    async def start(self) -> None:
+        """Resume unfinished jobs from disk and spawn the workers."""
+
+        for job in self.store.load():
+            if job["status"] not in FINAL_STATUSES:
+                # Work interrupted by a restart starts over from the queue.
+                self.store.update(job["id"], status="queued")
+                self._queue.put_nowait(job["id"])
+        self._workers = [
+            asyncio.create_task(self._worker()) for _ in range(self.concurrency)
+        ]
+
+    async def stop(self) -> None:
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def submit(self, **fields) -> dict:
+        job = self.store.create(**fields)
+        self._queue.put_nowait(job["id"])
+        return job
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    async def _worker(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            try:
+                job = self.store.get(job_id)
+                if job is None or job["status"] in FINAL_STATUSES:
+                    continue
+                started = time.time()
+                observe_stage("job_queue", started - job.get("created_at", started))
+                self.store.update(job_id, status="uploading", started_at=started)
+                JOBS_IN_FLIGHT.inc()
+                try:
+                    await self.handler(job)
+                except Exception as exc:
+                    log.error("Job %s failed: %s", job_id, exc, extra={"job_id": job_id})
+                    self.store.update(
+                        job_id, status="failed", error=str(exc), finished_at=time.time()
+                    )
+                    JOBS_FINISHED.inc(status="failed")
+                else:
+                    self.store.update(job_id, status="done", finished_at=time.time())
+                    JOBS_FINISHED.inc(status="done")
+                finally:
+                    JOBS_IN_FLIGHT.dec()
+            finally:
+                self._queue.task_done()
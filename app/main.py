@@ -1,3 +1,7 @@
+import time
+
+_import_start = time.perf_counter()
+
 from fastapi import (
     FastAPI,
     UploadFile,
@@ -5,25 +9,62 @@ from fastapi import (
     WebSocketDisconnect,
     HTTPException,
     Form,
+    Request,
 )
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, PlainTextResponse, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 import uuid
 import os
 import asyncio
 import shutil
+import hashlib
 import json
-import subprocess
+import logging
 
-import openai
-import requests
-from gtts import gTTS
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
 # Import the runner in a way that works for both ``uvicorn app.main:app`` and
 # ``streamlit run app/main.py`` execution modes.
 try:  # package style
-    from app.musetalk_runner import run_musetalk, stream_musetalk  # type: ignore
+    from app.musetalk_runner import fal_stats, render_cache, run_musetalk, stream_musetalk  # type: ignore
+    from app.jobs import JOBS_DIR, JobQueue, JobStore, progress_callback  # type: ignore
+    from app.bulk import ArchiveError, BulkIngest, read_manifest  # type: ignore
+    from app.upload_cache import upload_cache  # type: ignore
+    from app.ingest import save_upload  # type: ignore
+    from app.slides import (  # type: ignore
+        SLIDE_DPI,
+        SLIDE_WIDTHS,
+        VARIANT_NAME,
+        SlideConversionError,
+        encode_variants,
+        extract_frames,
+        rasterize_pdf,
+        slide_filename,
+    )
+    from app.hashing import sha256_file  # type: ignore
+    from app.manifest import (  # type: ignore
+        add_clip,
+        load_manifest,
+        set_segments,
+        update_manifest,
+        write_manifest,
+    )
+    from app.answer_cache import answer_cache  # type: ignore
+    from app.chat_stream import ClipPipeline, SentenceSplitter, render_clip, stream_completion  # type: ignore
+    from app.tts import tts_service  # type: ignore
+    from app.media import MEDIA_CACHE_DIR, media_stats, probe_duration  # type: ignore
+    from app.segments import render_segments  # type: ignore
+    from app.broadcast import avatar_broadcaster  # type: ignore
+    from app.delivery import WRITE_ONCE_NAME, discard, package_output, staging_path  # type: ignore
+    from app.static_cache import IMMUTABLE, REVALIDATE, CachedStaticFiles  # type: ignore
+    from app.storage import LECTURE_VIDEO, storage  # type: ignore
+    from app.retention import retention  # type: ignore
+    from app.warm_qa import WARM_QA, warm_answers  # type: ignore
+    from app.slide_index import slide_texts  # type: ignore
+    from app.services import get_openai, get_requests, warm_up  # type: ignore
+    from app.startup import startup_profile  # type: ignore
+    from app.logs import configure_logging  # type: ignore
+    from app import metrics  # type: ignore
 except Exception:
     # Script execution -- ensure this file's directory is on ``sys.path``
     import sys
@@ -31,7 +72,51 @@ except Exception:
 
 
     sys.path.insert(0, str(Path(__file__).resolve().parent))
-    from musetalk_runner import run_musetalk, stream_musetalk  # type: ignore
+    from musetalk_runner import fal_stats, render_cache, run_musetalk, stream_musetalk  # type: ignore
+    from jobs import JOBS_DIR, JobQueue, JobStore, progress_callback  # type: ignore
+    from bulk import ArchiveError, BulkIngest, read_manifest  # type: ignore
+    from upload_cache import upload_cache  # type: ignore
+    from ingest import save_upload  # type: ignore
+    from slides import (  # type: ignore
+        SLIDE_DPI,
+        SLIDE_WIDTHS,
+        VARIANT_NAME,
+        SlideConversionError,
+        encode_variants,
+        extract_frames,
+        rasterize_pdf,
+        slide_filename,
+    )
+    from hashing import sha256_file  # type: ignore
+    from manifest import (  # type: ignore
+        add_clip,
+        load_manifest,
+        set_segments,
+        update_manifest,
+        write_manifest,
+    )
+    from answer_cache import answer_cache  # type: ignore
+    from chat_stream import ClipPipeline, SentenceSplitter, render_clip, stream_completion  # type: ignore
+    from tts import tts_service  # type: ignore
+    from media import MEDIA_CACHE_DIR, media_stats, probe_duration  # type: ignore
+    from segments import render_segments  # type: ignore
+    from broadcast import avatar_broadcaster  # type: ignore
+    from delivery import WRITE_ONCE_NAME, discard, package_output, staging_path  # type: ignore
+    from static_cache import IMMUTABLE, REVALIDATE, CachedStaticFiles  # type: ignore
+    from storage import LECTURE_VIDEO, storage  # type: ignore
+    from retention import retention  # type: ignore
+    from warm_qa import WARM_QA, warm_answers  # type: ignore
+    from slide_index import slide_texts  # type: ignore
+    from services import get_openai, get_requests, warm_up  # type: ignore
+    from startup import startup_profile  # type: ignore
+    from logs import configure_logging  # type: ignore
+    import metrics  # type: ignore
+
+startup_profile.record("imports", time.perf_counter() - _import_start)
+_app_init_start = time.perf_counter()
+
+configure_logging()
+log = logging.getLogger(__name__)
 
 app = FastAPI()
 
@@ -46,22 +131,273 @@ app.add_middleware(
 
 # Mount static folders
 app.mount("/static", StaticFiles(directory="static"), name="static")
-app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
-app.mount("/outputs", StaticFiles(directory="outputs"), name="outputs")
+
+
+def _upload_cache_control(path: str) -> str:
+    # Slide variants are named after their content; everything else in a
+    # class directory can be rewritten and is revalidated by ETag
+    return IMMUTABLE if VARIANT_NAME.match(os.path.basename(path)) else REVALIDATE
+
+
+app.mount(
+    "/uploads",
+    CachedStaticFiles(directory="uploads", cache_control=_upload_cache_control),
+    name="uploads",
+)
+
+
+def _output_cache_control(path: str) -> str:
+    # Answer clips and HLS segments are never rewritten under the same name;
+    # lectures, playlists and previews are replaced by the next render
+    return IMMUTABLE if WRITE_ONCE_NAME.match(os.path.basename(path)) else REVALIDATE
+
+
+app.mount(
+    "/outputs",
+    CachedStaticFiles(
+        directory="outputs",
+        cache_control=_output_cache_control,
+        on_access=retention.touch_output,
+    ),
+    name="outputs",
+)
+
+
+# Render jobs run in the background; the number of simultaneous MuseTalk calls
+# is capped by ``RENDER_CONCURRENCY`` rather than by open HTTP connections.
+job_store = JobStore()
+
+
+def _current_paths(job: dict) -> dict:
+    """Point jobs queued before the per-class layout at the moved files."""
+
+    if os.path.exists(job["audio_path"]):
+        return job
+    uid = job["uid"]
+    found = {
+        key: storage.find(uid, kind)
+        for key, kind in (
+            ("audio_path", "audio"),
+            ("avatar_path", "avatar"),
+            ("timestamps_path", "timestamps"),
+        )
+    }
+    if any(entry is None for entry in found.values()):
+        return job
+    return {
+        **job,
+        **{key: entry["path"] for key, entry in found.items()},
+        "output_path": storage.output_path(uid, LECTURE_VIDEO),
+    }
+
+
+async def _run_segmented_job(job: dict, output_path: str) -> None:
+    with open(job["timestamps_path"]) as f:
+        timestamps = json.load(f)
+
+    published = asyncio.Lock()
+
+    async def publish(segments: list) -> None:
+        # Serialised, and the snapshot taken inside the lock, so an older
+        # state never overwrites a newer one
+        async with published:
+            snapshot = [dict(seg) for seg in segments]
+            await asyncio.to_thread(job_store.update, job["id"], segments=snapshot)
+            await asyncio.to_thread(set_segments, job["uid"], snapshot)
+
+    job_store.update(job["id"], status="inferring")
+    duration = await asyncio.to_thread(probe_duration, job["audio_path"])
+    segments = await render_segments(
+        job["uid"],
+        job["audio_path"],
+        job["avatar_path"],
+        timestamps,
+        output_path,
+        publish,
+        duration=duration,
+    )
+    for seg in segments:
+        await asyncio.to_thread(
+            storage.register, job["uid"], "segment", seg["video"], position=seg["index"] + 1
+        )
+
+
+async def _run_render_job(job: dict) -> None:
+    job = await asyncio.to_thread(_current_paths, job)
+    # Rendered and packaged under a private name; the public one only ever
+    # shows a finished, fast-start file
+    staged = staging_path(job["output_path"])
+    try:
+        if job.get("mode") == "segmented":
+            await _run_segmented_job(job, staged)
+        else:
+            stats = await run_musetalk(
+                job["audio_path"],
+                job["avatar_path"],
+                staged,
+                progress_callback(job_store, job["id"]),
+            )
+            job_store.update(job["id"], download=stats)
+
+        # Fast-start remux plus an HLS rendition for long lectures
+        playlist = await asyncio.to_thread(package_output, staged, job["output_path"])
+    finally:
+        await asyncio.to_thread(discard, staged)
+    await asyncio.to_thread(storage.register, job["uid"], "video", job["output_path"])
+    if playlist:
+        await asyncio.to_thread(
+            storage.register, job["uid"], "hls", os.path.dirname(playlist)
+        )
+        await asyncio.to_thread(update_manifest, job["uid"], hls=storage.url(playlist))
+    if WARM_QA:
+        warm_answers.schedule(job["uid"])
+
+
+job_queue = JobQueue(
+    job_store,
+    _run_render_job,
+    concurrency=int(os.environ.get("RENDER_CONCURRENCY", "2")),
+)
+
+
+@app.on_event("startup")
+@startup_profile.timed("job queue")
+async def _start_job_queue() -> None:
+    await job_queue.start()
+
+
+@app.on_event("shutdown")
+async def _stop_job_queue() -> None:
+    await job_queue.stop()
+
+
+# One OpenAI client for the whole process so connections and TLS sessions are
+# reused across chat requests.  It is created on first use, with ``openai``
+# imported off the event loop (usually already done by ``warm_up``), so
+# startup never waits for the import.
+app.state.openai = None
+
+
+async def _openai_client():
+    """The shared ``AsyncOpenAI`` client, or ``None`` without an API key."""
+
+    if app.state.openai is None and os.environ.get("OPENAI_API_KEY"):
+        openai = await asyncio.to_thread(get_openai)
+        if app.state.openai is None:
+            app.state.openai = openai.AsyncOpenAI(api_key=os.environ["OPENAI_API_KEY"])
+    return app.state.openai
+
+
+@app.on_event("shutdown")
+async def _close_openai_client() -> None:
+    if app.state.openai is not None:
+        await app.state.openai.close()
 
 
 # Prepare a default class from bundled input assets
 DEFAULT_ID = "default"
+# The demo class is recreated at startup; never expire it
+retention.keep.add(DEFAULT_ID)
+
 
+class _PrepareSteps:
+    """Skip default-class steps whose inputs are unchanged since last boot.
 
-def _prepare_default_class() -> None:
-    """Copy demo assets into place and pre-generate the default avatar."""
+    Each step records the digests of its inputs and the files it produced in
+    ``uploads/default/prepare.json``; a step is re-run only when an input
+    changed or one of its outputs went missing.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        try:
+            with open(path) as f:
+                self.state = json.load(f)
+        except (OSError, ValueError):
+            self.state = {}
+        self.timings: dict = {}
+
+    def run(self, step: str, inputs: dict, fn) -> bool:
+        """Run ``fn`` unless ``step`` is fresh; ``fn`` returns its outputs.
+
+        Returns True if the step's outputs are in place afterwards.
+        """
+
+        start = time.perf_counter()
+        prev = self.state.get(step)
+        if (
+            prev is not None
+            and prev["inputs"] == inputs
+            and all(os.path.exists(p) for p in prev["outputs"])
+        ):
+            self.timings[step] = {"seconds": round(time.perf_counter() - start, 3), "skipped": True}
+            return True
+        outputs = fn()
+        self.timings[step] = {"seconds": round(time.perf_counter() - start, 3), "skipped": False}
+        if not outputs:
+            return False
+        self.state[step] = {"inputs": inputs, "outputs": outputs}
+        self.save()
+        return True
+
+    def relocate(self, moved: dict) -> None:
+        """Follow files that were moved into the per-class layout."""
+
+        for entry in self.state.values():
+            if isinstance(entry, dict) and "outputs" in entry:
+                entry["inputs"] = {moved.get(k, k): v for k, v in entry["inputs"].items()}
+                entry["outputs"] = [moved.get(p, p) for p in entry["outputs"]]
+
+    def save(self) -> None:
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({**self.state, "timings": self.timings}, f)
+        os.replace(tmp, self.path)
+
+    def report(self) -> str:
+        return ", ".join(
+            f"{step} {t['seconds']}s{' (skipped)' if t['skipped'] else ''}"
+            for step, t in self.timings.items()
+        )
+
+
+def _digests(*paths: str) -> dict:
+    return {p: sha256_file(p) for p in paths}
+
+
+def _register_slides(uid: str, pages: list) -> list:
+    """Index rendered slides and their image variants; returns every path.
+
+    Variants left over from an earlier rendering of the deck are dropped
+    from the index (their files are already gone).
+    """
+
+    paths = []
+    for page in pages:
+        storage.register(uid, "slide", page["path"], position=page["page"])
+        paths.append(page["path"])
+        for variant in page["variants"]:
+            storage.register(uid, "slide_variant", variant["path"], position=page["page"])
+            paths.append(variant["path"])
+    current = set(paths)
+    for entry in storage.list(uid, "slide_variant"):
+        if entry["path"] not in current:
+            storage.unregister(uid, entry["path"])
+    return paths
+
+
+def _prepare_default_class(loop: asyncio.AbstractEventLoop) -> None:
+    """Copy demo assets into place and pre-generate the default avatar.
+
+    Runs in a worker thread; the render itself is scheduled on ``loop`` so it
+    shares the fal concurrency and rate limits with everything else.
+    """
 
     if not os.environ.get("ENABLE_DEFAULT_ASSETS"):
         return
 
-    os.makedirs("uploads", exist_ok=True)
-    os.makedirs("outputs", exist_ok=True)
+    # Earlier versions kept the default class in flat ``default_*`` files
+    moved = storage.adopt_legacy(DEFAULT_ID)
 
     src_dir = "inputs"
     src_audio = os.path.join(src_dir, "audio.wav")
@@ -69,18 +405,30 @@ def _prepare_default_class() -> None:
     src_avatar = os.path.join(src_dir, "avatar1.mp4")
     src_slides_id = os.path.join(src_dir, "slides_id.txt")
     src_pdf = os.path.join(src_dir, "slides.pdf")
+    src_video = os.path.join(src_dir, "video.mp4")
 
-    dst_audio = os.path.join("uploads", f"{DEFAULT_ID}_audio.wav")
-    dst_ts = os.path.join("uploads", f"{DEFAULT_ID}_timestamps.json")
-    dst_avatar = os.path.join("uploads", f"{DEFAULT_ID}_avatar.mp4")
-    dst_slides_id = os.path.join("uploads", f"{DEFAULT_ID}_slides_id.txt")
+    dst_audio = storage.input_path(DEFAULT_ID, "audio.wav")
+    dst_ts = storage.input_path(DEFAULT_ID, "timestamps.json")
+    dst_avatar = storage.input_path(DEFAULT_ID, "avatar.mp4")
+    dst_slides_id = storage.input_path(DEFAULT_ID, "slides_id.txt")
 
-    try:
-        shutil.copyfile(src_audio, dst_audio)
-        shutil.copyfile(src_ts, dst_ts)
-        shutil.copyfile(src_avatar, dst_avatar)
-        shutil.copyfile(src_slides_id, dst_slides_id)
+    steps = _PrepareSteps(storage.input_path(DEFAULT_ID, "prepare.json"))
+    steps.relocate(moved)
+    copies = [
+        (src_audio, dst_audio, "audio"),
+        (src_ts, dst_ts, "timestamps"),
+        (src_avatar, dst_avatar, "avatar"),
+        (src_slides_id, dst_slides_id, "slides_id"),
+    ]
+
+    def copy_assets() -> list:
+        for src, dst, kind in copies:
+            shutil.copyfile(src, dst)
+            storage.register(DEFAULT_ID, kind, dst)
+        return [dst for _, dst, _ in copies]
 
+    try:
+        steps.run("assets", _digests(*(src for src, _, _ in copies)), copy_assets)
     except FileNotFoundError:
         # If any demo asset is missing, simply skip generation
         return
@@ -88,80 +436,125 @@ def _prepare_default_class() -> None:
     # Generate slide images for the default class. Prefer converting a
     # bundled ``slides.pdf``; if it is missing, fall back to extracting frames
     # from ``video.mp4`` or placeholder images.
-    generated = False
+    with open(dst_ts) as f:
+        times = json.load(f)
+    slide_paths = [
+        storage.input_path(DEFAULT_ID, slide_filename(i + 1)) for i in range(len(times) - 1)
+    ]
+
+    def register_slides(paths: list) -> list:
+        pages = []
+        for i, path in enumerate(paths):
+            try:
+                variants = encode_variants(path, i + 1, storage.class_dir(DEFAULT_ID))
+            except Exception as exc:
+                log.warning("Encoding variants of %s failed: %s", path, exc)
+                variants = []
+            pages.append({"page": i + 1, "path": path, "variants": variants})
+        return _register_slides(DEFAULT_ID, pages)
+
+    def pdf_slides() -> list:
+        pages = rasterize_pdf(src_pdf, storage.class_dir(DEFAULT_ID))
+        return _register_slides(DEFAULT_ID, pages)
+
+    def video_slides() -> list:
+        extract_frames(src_video, times[:-1], slide_paths)
+        return register_slides(slide_paths)
+
+    def placeholder_slides() -> list:
+        written = []
+        for i, img_path in enumerate(slide_paths):
+            url = f"https://placehold.co/1280x720?text=Slide+{i+1}"
+            try:
+                resp = get_requests().get(url, timeout=10)
+                if resp.ok:
+                    with open(img_path, "wb") as imgf:
+                        imgf.write(resp.content)
+                    written.append(img_path)
+            except Exception:
+                break
+        return register_slides(written)
+
     try:
         if os.path.exists(src_pdf):
-            from pdf2image import convert_from_path
+            steps.run("slide_text", _digests(src_pdf), lambda: [slide_texts.build(DEFAULT_ID, src_pdf)])
+    except Exception as exc:
+        log.warning("Failed to extract slide text: %s", exc)
 
-            images = convert_from_path(src_pdf)
-            for i, img in enumerate(images, start=1):
-                img_path = os.path.join("uploads", f"{DEFAULT_ID}_slide_{i}.png")
-                img.save(img_path, "PNG")
-            generated = True
+    generated = False
+    try:
+        if os.path.exists(src_pdf):
+            generated = steps.run(
+                "slides", {**_digests(src_pdf), "dpi": SLIDE_DPI, "widths": list(SLIDE_WIDTHS)}, pdf_slides
+            )
     except Exception as exc:
-        print(f"Failed to render PDF slides: {exc}")
+        log.warning("Failed to render PDF slides: %s", exc)
 
     if not generated:
-        src_video = os.path.join(src_dir, "video.mp4")
         try:
-            with open(dst_ts) as f:
-                times = json.load(f)
             if os.path.exists(src_video):
-                for i, t in enumerate(times[:-1]):
-                    img_path = os.path.join("uploads", f"{DEFAULT_ID}_slide_{i+1}.png")
-                    cmd = [
-                        "ffmpeg",
-                        "-y",
-                        "-ss",
-                        str(t),
-                        "-i",
-                        src_video,
-                        "-vframes",
-                        "1",
-                        img_path,
-                    ]
-                    subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-                generated = True
+                generated = steps.run(
+                    "slides", {**_digests(src_video, src_ts), "widths": list(SLIDE_WIDTHS)}, video_slides
+                )
         except Exception as exc:
-            print(f"Failed to extract slides from video: {exc}")
-
+            log.warning("Failed to extract slides from video: %s", exc)
 
     if not generated:
         try:
-            with open(dst_ts) as f:
-                times = json.load(f)
-            for i in range(len(times) - 1):
-                url = f"https://placehold.co/1280x720?text=Slide+{i+1}"
-                img_path = os.path.join("uploads", f"{DEFAULT_ID}_slide_{i+1}.png")
-                try:
-                    resp = requests.get(url, timeout=10)
-                    if resp.ok:
-                        with open(img_path, "wb") as imgf:
-                            imgf.write(resp.content)
-                except Exception:
-                    break
+            steps.run(
+                "slides",
+                {**_digests(src_ts), "placeholder": True, "widths": list(SLIDE_WIDTHS)},
+                placeholder_slides,
+            )
         except Exception:
             pass
 
+    write_manifest(DEFAULT_ID)
 
-    output_path = os.path.join("outputs", f"{DEFAULT_ID}.mp4")
-    if os.path.exists(output_path):
-        return
+    output_path = storage.output_path(DEFAULT_ID, LECTURE_VIDEO)
+    if os.path.exists(output_path) and not {"render", "demo_video"} & steps.state.keys():
+        # Rendered before input tracking existed; adopt it rather than
+        # paying for a new render.
+        steps.state["render"] = {"inputs": _digests(dst_audio, dst_avatar), "outputs": [output_path]}
 
-    if os.environ.get("FAL_KEY"):
+    def render() -> list:
+        if not os.environ.get("FAL_KEY"):
+            return []
+        staged = staging_path(output_path)
         try:
-            run_musetalk(dst_audio, dst_avatar, output_path)
-            return
+            asyncio.run_coroutine_threadsafe(
+                run_musetalk(dst_audio, dst_avatar, staged), loop
+            ).result()
+            playlist = package_output(staged, output_path)
+            storage.register(DEFAULT_ID, "video", output_path)
+            if playlist:
+                storage.register(DEFAULT_ID, "hls", os.path.dirname(playlist))
+                update_manifest(DEFAULT_ID, hls=storage.url(playlist))
+            return [output_path]
         except Exception as exc:  # best-effort
-            print(f"Failed to generate default class: {exc}")
+            log.warning("Failed to generate default class: %s", exc)
+            return []
+        finally:
+            discard(staged)
 
-    # Fallback to pre-rendered demo video if API generation is unavailable
-    src_video = os.path.join(src_dir, "video.mp4")
-    try:
-        if os.path.exists(src_video):
-            shutil.copyfile(src_video, output_path)
-    except Exception as exc:
-        print(f"Failed to copy demo video: {exc}")
+    def demo_video() -> list:
+        try:
+            if os.path.exists(src_video):
+                shutil.copyfile(src_video, output_path)
+                storage.register(DEFAULT_ID, "video", output_path)
+                return [output_path]
+        except Exception as exc:
+            log.warning("Failed to copy demo video: %s", exc)
+        return []
+
+    if steps.run("render", _digests(dst_audio, dst_avatar), render):
+        steps.state.pop("demo_video", None)
+    elif os.path.exists(src_video):
+        # Fallback to pre-rendered demo video if API generation is unavailable.
+        # A separate step, so the render is tried again on the next boot.
+        steps.run("demo_video", _digests(src_video), demo_video)
+    steps.save()
+    log.info("Default class prepared", extra={"steps": steps.report()})
 
 
 # Prepare default assets in the background so startup is quick
@@ -173,12 +566,62 @@ async def _schedule_default_class() -> None:
 
     async def prepare() -> None:
         try:
-            await asyncio.to_thread(_prepare_default_class)
+            await asyncio.to_thread(_prepare_default_class, asyncio.get_running_loop())
         except Exception as exc:  # best-effort
-            print(f"Failed to generate default class: {exc}")
+            log.warning("Failed to generate default class: %s", exc)
 
     asyncio.create_task(prepare())
 
+
+@app.on_event("startup")
+async def _start_warm_qa() -> None:
+    if WARM_QA:
+        app.state.warm_qa = asyncio.create_task(warm_answers.run(_warm_clip, _is_idle))
+
+
+@app.on_event("shutdown")
+async def _stop_warm_qa() -> None:
+    task = getattr(app.state, "warm_qa", None)
+    if task is not None:
+        task.cancel()
+
+
+@app.on_event("startup")
+async def _start_retention() -> None:
+    interval = float(os.environ.get("RETENTION_INTERVAL", "60"))
+    if interval > 0:
+        app.state.retention = asyncio.create_task(retention.run(interval))
+
+
+@app.on_event("shutdown")
+async def _stop_retention() -> None:
+    task = getattr(app.state, "retention", None)
+    if task is not None:
+        task.cancel()
+
+
+@app.on_event("startup")
+async def _monitor_event_loop() -> None:
+    interval = float(os.environ.get("LOOP_LAG_INTERVAL", "0.25"))
+    if interval > 0:
+        app.state.loop_monitor = asyncio.create_task(metrics.monitor_event_loop(interval))
+
+
+@app.on_event("shutdown")
+async def _stop_loop_monitor() -> None:
+    task = getattr(app.state, "loop_monitor", None)
+    if task is not None:
+        task.cancel()
+
+
+# Import the heavy clients off the event loop once the app is serving, so the
+# first chat or render does not pay for them.
+@app.on_event("startup")
+async def _warm_imports() -> None:
+    if os.environ.get("WARM_IMPORTS", "1") == "0":
+        return
+    asyncio.create_task(asyncio.to_thread(warm_up))
+
 @app.get("/")
 def index():
     return FileResponse("static/index.html")
@@ -188,97 +631,263 @@ def index():
 def upload_page():
     return FileResponse("static/upload.html")
 
-@app.post("/upload")
+@app.post("/upload", status_code=202)
 async def upload(
     audio: UploadFile,
     timestamps: UploadFile,
     avatar: UploadFile,
     slides: UploadFile | None = None,
     slides_id: str = Form(""),
+    mode: str = Form("full"),
 
 ):
+    if mode not in ("full", "segmented"):
+        raise HTTPException(status_code=400, detail=f"Unknown render mode: {mode}")
     uid = uuid.uuid4().hex
-    os.makedirs("uploads", exist_ok=True)
-    os.makedirs("outputs", exist_ok=True)
 
-    # Save all uploaded files
+    # Save all uploaded files into the class directory
     paths = {
-        "audio": os.path.join("uploads", f"{uid}_audio.wav"),
-        "timestamps": os.path.join("uploads", f"{uid}_timestamps.json"),
-        "avatar": os.path.join(
-            "uploads", f"{uid}_avatar{os.path.splitext(avatar.filename)[1] or '.mp4'}"
+        "audio": storage.input_path(uid, "audio.wav"),
+        "timestamps": storage.input_path(uid, "timestamps.json"),
+        "avatar": storage.input_path(
+            uid, f"avatar{os.path.splitext(avatar.filename)[1] or '.mp4'}"
         ),
     }
-    for file, path in zip([audio, timestamps, avatar], paths.values()):
-        with open(path, "wb") as f:
-            f.write(await file.read())
-
+    files = {"audio": audio, "timestamps": timestamps, "avatar": avatar}
     if slides is not None:
-        pdf_path = os.path.join("uploads", f"{uid}_slides.pdf")
-        with open(pdf_path, "wb") as f:
-            f.write(await slides.read())
-        try:
-            from pdf2image import convert_from_path
+        files["slides"] = slides
+        paths["slides"] = storage.input_path(uid, "slides.pdf")
 
-            images = await asyncio.to_thread(convert_from_path, pdf_path)
-            for i, img in enumerate(images, start=1):
-                img.save(os.path.join("uploads", f"{uid}_slide_{i}.png"), "PNG")
-        except Exception as exc:
+    # Stream each file to disk; a rejected upload leaves nothing behind
+    digests = {}
+    try:
+        for field, file in files.items():
+            digests[field] = (await save_upload(file, paths[field], field))["sha256"]
+    except HTTPException:
+        shutil.rmtree(storage.class_dir(uid), ignore_errors=True)
+        raise
+
+    try:
+        job = await _prepare_class(uid, paths, digests, slides_id, mode)
+    except Exception as exc:
+        # Nothing refers to the half-prepared class; drop its files and rows
+        await asyncio.to_thread(storage.remove_class, uid)
+        if isinstance(exc, SlideConversionError):
             raise HTTPException(status_code=500, detail=f"PDF convert error: {exc}")
+        raise HTTPException(status_code=500, detail=f"Class preparation error: {exc}")
+
+    return {
+        "id": uid,
+        "job_id": job["id"],
+        "status": job["status"],
+        "output_video": storage.output_name(job["output_path"]),
+        "timestamps": f"{uid}/timestamps.json",
+    }
+
+
+_INPUT_KINDS = {"audio": "audio", "timestamps": "timestamps", "avatar": "avatar", "slides": "slides_pdf"}
+
+
+async def _prepare_class(uid: str, paths: dict, digests: dict, slides_id: str, mode: str) -> dict:
+    """Index the stored inputs of a new class, render its slides and queue
+    its render job; shared by ``/upload`` and bulk ingestion."""
+
+    def register_inputs() -> None:
+        for field, digest in digests.items():
+            storage.register(uid, _INPUT_KINDS[field], paths[field], sha256=digest)
+
+    await asyncio.to_thread(register_inputs)
+
+    slide_seconds = []
+    if "slides" in paths:
+        pdf_path = paths["slides"]
+
+        def rasterize() -> list:
+            try:
+                pages = rasterize_pdf(pdf_path, storage.class_dir(uid))
+            except Exception as exc:
+                raise SlideConversionError(str(exc)) from exc
+            _register_slides(uid, pages)
+            return pages
+
+        def index_text() -> None:
+            # Only chat context depends on it; a deck without text still plays
+            try:
+                slide_texts.build(uid, pdf_path)
+            except Exception as exc:
+                log.warning("Slide text extraction failed for %s: %s", uid, exc)
+
+        pages, _ = await asyncio.gather(
+            asyncio.to_thread(rasterize), asyncio.to_thread(index_text)
+        )
+        slide_seconds = [page["seconds"] for page in pages]
         slides_id = ""
 
+    def write_slides_id() -> None:
+        slides_id_path = storage.input_path(uid, "slides_id.txt")
+        with open(slides_id_path, "w") as f:
+            f.write(slides_id.strip())
+        storage.register(uid, "slides_id", slides_id_path)
+        write_manifest(uid)
+
+    await asyncio.to_thread(write_slides_id)
+
+    # Queue the avatar video; clients poll ``/jobs/{job_id}`` until it is done
+    return job_queue.submit(
+        uid=uid,
+        audio_path=paths["audio"],
+        avatar_path=paths["avatar"],
+        timestamps_path=paths["timestamps"],
+        output_path=storage.output_path(uid, LECTURE_VIDEO),
+        mode=mode,
+        digests=digests,
+        slide_seconds=slide_seconds,
+    )
+
+
+# Many classes from one archive; see ``bulk`` for the manifest format
+bulk_ingest = BulkIngest(JobStore(os.path.join(JOBS_DIR, "batches")), job_store, _prepare_class)
+
+# Classes with work in flight are never expired, and the caches share the
+# storage budget with the classes
+retention.in_use.extend([job_store.active_uids, warm_answers.active_uids, bulk_ingest.active_uids])
+retention.caches.extend([render_cache.directory, tts_service.cache_dir, MEDIA_CACHE_DIR])
 
-    with open(os.path.join("uploads", f"{uid}_slides_id.txt"), "w") as f:
-        f.write(slides_id.strip())
 
-    # Generate avatar video in a thread so the event loop is not blocked
-    output_path = os.path.join("outputs", f"{uid}.mp4")
+@app.on_event("startup")
+async def _recover_ingest_batches() -> None:
+    await asyncio.to_thread(bulk_ingest.recover)
+
+
+@app.post("/ingest", status_code=202)
+async def ingest(archive: UploadFile):
+    path = bulk_ingest.archive_path()
+    await save_upload(archive, path, "archive")
     try:
-        await asyncio.to_thread(
-            run_musetalk, paths["audio"], paths["avatar"], output_path
-        )
-    except Exception as exc:
-        raise HTTPException(status_code=500, detail=str(exc))
+        specs = await asyncio.to_thread(read_manifest, path)
+    except ArchiveError as exc:
+        os.remove(path)
+        raise HTTPException(status_code=400, detail=str(exc))
+    batch = bulk_ingest.start(path, specs)
+    return {"id": batch["id"], "classes": len(specs), "status": batch["status"]}
+
 
+@app.get("/ingest/{batch_id}")
+def ingest_status(batch_id: str):
+    report = bulk_ingest.status(batch_id)
+    if report is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return report
 
+
+@app.get("/jobs/{job_id}")
+def job_status(job_id: str):
+    job = job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
     return {
-        "id": uid,
-        "output_video": f"{uid}.mp4",
-        "timestamps": os.path.basename(paths["timestamps"]),
+        "id": job["id"],
+        "uid": job["uid"],
+        "status": job["status"],
+        "position": job.get("position"),
+        "error": job["error"],
+        "download": job.get("download"),
+        "segments": job.get("segments"),
+        "output_video": storage.output_name(job["output_path"]),
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"],
+    }
+
+
+@app.get("/classes/{uid}/manifest")
+def class_manifest(uid: str, request: Request):
+    body = load_manifest(uid)
+    if body is None:
+        raise HTTPException(status_code=404, detail="Class not found")
+    retention.touch(uid)
+    # The manifest only changes when a Q&A clip is added, so clients keep
+    # their copy and revalidate it with a cheap conditional request.
+    etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+@app.get("/metrics")
+def metrics_endpoint():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/startup")
+def startup_report():
+    return startup_profile.report()
+
+
+@app.get("/cache/stats")
+def cache_stats():
+    return {
+        "fal_uploads": upload_cache.stats(),
+        "renders": render_cache.stats(),
+        "answers": answer_cache.stats(),
+        "tts": tts_service.stats(),
+        "media": media_stats(),
+        "avatar_streams": avatar_broadcaster.stats(),
+        "retention": retention.stats(),
+        "fal": fal_stats(),
+        "warm_qa": warm_answers.stats(),
+        "ingest": bulk_ingest.stats(),
     }
 
 
 @app.websocket("/ws/avatar/{uid}")
 async def ws_avatar(ws: WebSocket, uid: str):
+    """Send realtime avatar frames as binary JPEG messages.
+
+    All viewers of ``uid`` share one upstream session; each has a small
+    queue that drops its oldest frame when the viewer cannot keep up.
+    """
+
     await ws.accept()
 
-    audio_path = os.path.join("uploads", f"{uid}_audio.wav")
-    avatar_path = None
-    for ext in [".mp4", ".jpg", ".png"]:
-        p = os.path.join("uploads", f"{uid}_avatar{ext}")
-        if os.path.exists(p):
-            avatar_path = p
-            break
+    audio = await asyncio.to_thread(storage.find, uid, "audio")
+    avatar_path = await asyncio.to_thread(_find_avatar, uid)
 
-    if not avatar_path or not os.path.exists(audio_path):
+    if not avatar_path or audio is None or not os.path.exists(audio["path"]):
         await ws.send_text("ERROR: files missing")
         await ws.close()
         return
 
-    output_path = os.path.join("outputs", f"{uid}_stream.mp4")
-    streamer = stream_musetalk(audio_path, avatar_path, output_path)
+    audio_path = audio["path"]
+    output_path = storage.output_path(uid, "stream.mp4")
+    retention.touch(uid)
+
+    async def upstream():
+        async for item in stream_musetalk(audio_path, avatar_path, output_path):
+            yield item
+        # Only the non-realtime fallback writes the video
+        if os.path.exists(output_path):
+            await asyncio.to_thread(storage.register, uid, "stream", output_path)
 
+    stream, viewer = avatar_broadcaster.join(uid, upstream)
 
     try:
-        async for frame in streamer:
-            await ws.send_text(frame)
+        while True:
+            message = await viewer.queue.get()
+            if message is None:
+                break
+            kind, data = message
+            if kind == "bytes":
+                await ws.send_bytes(data)
+                metrics.WS_FRAMES.inc(direction="sent")
+                metrics.ws_frame_rate.mark()
+            else:
+                await ws.send_text(data)
+        await ws.close()
     except WebSocketDisconnect:
         pass
-    except Exception as exc:
-        await ws.send_text(f"ERROR: {exc}")
     finally:
-        if hasattr(streamer, "aclose"):
-            await streamer.aclose()
+        stream.unsubscribe(viewer)
 
 
 class ChatRequest(BaseModel):
@@ -288,47 +897,205 @@ class ChatRequest(BaseModel):
     slide_text: str | None = None
 
 
-@app.post("/chat")
-async def chat(req: ChatRequest):
-    if not os.environ.get("OPENAI_API_KEY"):
-        raise HTTPException(status_code=500, detail="OPENAI_API_KEY not set")
-    client = openai.OpenAI(api_key=os.environ["OPENAI_API_KEY"])
+def _find_avatar(uid: str) -> str | None:
+    """Path of the class avatar.  Queries the index and may adopt a legacy
+    class; call it through ``asyncio.to_thread``."""
 
+    entry = storage.find(uid, "avatar")
+    return entry["path"] if entry else None
 
-    prompt = f"You are helping a student. They are currently on slide {req.slide_index}. Slide text: {req.slide_text or ''}. Question: {req.question}"
 
-    try:
-        completion = await asyncio.to_thread(
-            client.chat.completions.create,
+def _chat_prompt(req: ChatRequest) -> str:
+    """The LLM prompt for ``req``.  Blocking (index build, SQLite and JSON
+    reads); call it through ``asyncio.to_thread``."""
+
+    slide_text, related = slide_texts.context(req.uid, req.slide_index, req.question, req.slide_text)
+    prompt = f"You are helping a student. They are currently on slide {req.slide_index}. Slide text: {slide_text}."
+    if related:
+        prompt += " Related slides: " + " ".join(f"[slide {page}] {text}" for page, text in related) + "."
+    return f"{prompt} Question: {req.question}"
+
+
+async def _complete(client, req: ChatRequest) -> str:
+    """The answer to ``req``, from the answer cache or the LLM."""
+
+    cache_key = answer_cache.key(req.uid, req.slide_index, req.question, req.slide_text)
+    answer = answer_cache.get(cache_key)
+    if answer is None:
+        prompt = await asyncio.to_thread(_chat_prompt, req)
+        start = time.perf_counter()
+        completion = await client.chat.completions.create(
             model="gpt-3.5-turbo",
             messages=[{"role": "user", "content": prompt}],
         )
+        answer_cache.record_llm(time.perf_counter() - start)
         answer = completion.choices[0].message.content.strip()
+        answer_cache.put(cache_key, answer)
+    return answer
+
+
+async def _warm_clip(uid: str, slide: int, question: str) -> dict:
+    """Answer ``question`` for ``slide`` ahead of time (see ``warm_qa``)."""
 
+    client = await _openai_client()
+    avatar_path = await asyncio.to_thread(_find_avatar, uid)
+    if client is None or avatar_path is None:
+        raise RuntimeError("OPENAI_API_KEY not set" if client is None else "Avatar not found")
+    answer = await _complete(client, ChatRequest(uid=uid, question=question, slide_index=slide))
+    audio_path = await tts_service.synthesize(answer)
+    video = await render_clip(uid, audio_path, avatar_path, "warm_clip", "warm", slide)
+    return {"answer": answer, "video": video}
+
+
+def _is_idle() -> bool:
+    """No render queued or running and nothing waiting on fal."""
+
+    return (
+        job_queue.pending() == 0
+        and metrics.JOBS_IN_FLIGHT.value() == 0
+        and fal_stats()["in_flight"] == 0
+    )
+
+
+@app.post("/chat")
+async def chat(req: ChatRequest):
+    warm = await asyncio.to_thread(
+        warm_answers.match, req.uid, req.slide_index, req.question, req.slide_text
+    )
+    if warm is not None:
+        retention.touch(req.uid)
+        await asyncio.to_thread(add_clip, req.uid, warm["video"])
+        return {"answer": warm["answer"], "video": warm["video"]}
+
+    client = await _openai_client()
+    if client is None:
+        raise HTTPException(status_code=500, detail="OPENAI_API_KEY not set")
+
+    try:
+        answer = await _complete(client, req)
     except Exception as exc:
         raise HTTPException(status_code=500, detail=f"LLM error: {exc}")
 
     try:
-        tts = gTTS(answer)
-        audio_path = os.path.join("uploads", f"{req.uid}_qa.mp3")
-        tts.save(audio_path)
+        audio_path = await tts_service.synthesize(answer)
     except Exception as exc:
         raise HTTPException(status_code=500, detail=f"TTS error: {exc}")
 
-    avatar_path = None
-    for ext in [".mp4", ".jpg", ".png"]:
-        p = os.path.join("uploads", f"{req.uid}_avatar{ext}")
-        if os.path.exists(p):
-            avatar_path = p
-            break
+    avatar_path = await asyncio.to_thread(_find_avatar, req.uid)
     if not avatar_path:
         raise HTTPException(status_code=404, detail="Avatar not found")
+    retention.touch(req.uid)
 
-    output_name = f"{req.uid}_qa_{uuid.uuid4().hex}.mp4"
-    output_path = os.path.join("outputs", output_name)
     try:
-        await asyncio.to_thread(run_musetalk, audio_path, avatar_path, output_path)
+        output_name = await render_clip(req.uid, audio_path, avatar_path, "qa_clip", "qa")
     except Exception as exc:
         raise HTTPException(status_code=500, detail=f"MuseTalk error: {exc}")
+    await asyncio.to_thread(add_clip, req.uid, output_name)
 
     return {"answer": answer, "video": output_name}
+
+
+async def _stream_chat_answer(req: ChatRequest, avatar_path: str, client, send) -> None:
+    """Answer one question, pushing tokens and clips through ``send``."""
+
+    warm = await asyncio.to_thread(
+        warm_answers.match, req.uid, req.slide_index, req.question, req.slide_text
+    )
+    if warm is not None:
+        await asyncio.to_thread(add_clip, req.uid, warm["video"])
+        await send({"type": "token", "text": warm["answer"]})
+        await send({"type": "clip", "index": 0, "text": warm["answer"], "video": warm["video"]})
+        await send({"type": "done", "answer": warm["answer"]})
+        return
+
+    pipeline = ClipPipeline(req.uid, avatar_path)
+
+    async def deliver() -> None:
+        async for index, text, name in pipeline.results():
+            await asyncio.to_thread(add_clip, req.uid, name)
+            await send({"type": "clip", "index": index, "text": text, "video": name})
+
+    delivery = asyncio.create_task(deliver())
+    splitter = SentenceSplitter()
+    cache_key = answer_cache.key(req.uid, req.slide_index, req.question, req.slide_text)
+    answer = answer_cache.get(cache_key)
+    try:
+        if answer is None:
+            parts = []
+            prompt = await asyncio.to_thread(_chat_prompt, req)
+            start = time.perf_counter()
+            async for delta in stream_completion(client, prompt):
+                parts.append(delta)
+                await send({"type": "token", "text": delta})
+                for sentence in splitter.feed(delta):
+                    pipeline.submit(sentence)
+            answer_cache.record_llm(time.perf_counter() - start)
+            answer = "".join(parts).strip()
+            answer_cache.put(cache_key, answer)
+        else:
+            await send({"type": "token", "text": answer})
+            for sentence in splitter.feed(answer):
+                pipeline.submit(sentence)
+        for sentence in splitter.flush():
+            pipeline.submit(sentence)
+        pipeline.close()
+        await delivery
+    except Exception as exc:
+        pipeline.cancel()
+        delivery.cancel()
+        if isinstance(exc, WebSocketDisconnect):
+            raise
+        await send({"type": "error", "detail": str(exc)})
+        return
+    await send({"type": "done", "answer": answer})
+
+
+@app.websocket("/ws/chat/{uid}")
+async def ws_chat(ws: WebSocket, uid: str):
+    """Streaming variant of ``/chat``.
+
+    The client sends ``{"question", "slide_index", "slide_text"}`` messages and
+    receives ``token`` messages as the answer is generated, a ``clip`` message
+    per rendered sentence (in order) and finally ``done`` or ``error``.  A
+    malformed message gets an ``error`` and the socket stays open.
+    """
+
+    await ws.accept()
+    client = await _openai_client()
+    avatar_path = await asyncio.to_thread(_find_avatar, uid)
+    if client is None or avatar_path is None:
+        detail = "OPENAI_API_KEY not set" if client is None else "Avatar not found"
+        await ws.send_json({"type": "error", "detail": detail})
+        await ws.close()
+        return
+    retention.touch(uid)
+
+    send_lock = asyncio.Lock()
+
+    async def send(message: dict) -> None:
+        async with send_lock:
+            await ws.send_json(message)
+
+    try:
+        while True:
+            try:
+                data = await ws.receive_json()
+                if not isinstance(data, dict):
+                    raise ValueError("Expected a JSON object")
+                req = ChatRequest(uid=uid, **{k: v for k, v in data.items() if k != "uid"})
+            except (ValueError, ValidationError) as exc:
+                await send({"type": "error", "detail": f"Invalid message: {exc}"})
+                continue
+            await _stream_chat_answer(req, avatar_path, client, send)
+    except WebSocketDisconnect:
+        pass
+
+
+startup_profile.record("app init", time.perf_counter() - _app_init_start)
+
+
+# Registered last so it runs after every other startup hook.
+@app.on_event("startup")
+async def _report_startup() -> None:
+    startup_profile.mark_ready(since=_import_start)
+    log.info(startup_profile.summary())
@@ -0,0 +1,191 @@
+"""Per-class manifest describing everything the player needs.
+
+The browser used to discover slides by requesting ``{uid}_slide_{n}.png``
+until it hit a 404, plus separate requests for the timestamps and slides id.
+The manifest gathers slide URLs, timestamps, the slides id, the lecture video
+and any Q&A clips into one JSON document in the class directory, built from
+the storage index, so a class loads with a single request.  ``slide_images``
+lists, per slide, the ``srcset`` of each compressed format and a thumbnail.
+"""
+
+from typing import List, Optional
+
+import json
+import os
+import threading
+
+try:  # package style
+    from app.slides import parse_variant  # type: ignore
+    from app.storage import LECTURE_VIDEO, storage  # type: ignore
+except ImportError:
+    from slides import parse_variant  # type: ignore
+    from storage import LECTURE_VIDEO, storage  # type: ignore
+
+_lock = threading.Lock()
+
+
+def manifest_path(uid: str) -> str:
+    return storage.input_path(uid, "manifest.json")
+
+
+def _read(uid: str, kind: str):
+    entry = storage.find(uid, kind)
+    if entry is None:
+        return None
+    with open(entry["path"]) as f:
+        return f.read()
+
+
+def _slide_images(uid: str, count: int) -> List[dict]:
+    images: List[dict] = [{"thumb": None, "srcset": {}} for _ in range(count)]
+    sources: dict = {}
+    for entry in storage.list(uid, "slide_variant"):
+        info = parse_variant(os.path.basename(entry["path"]))
+        if info is None or not 1 <= info["page"] <= count:
+            continue
+        url = storage.url(entry["path"])
+        if info["thumb"]:
+            images[info["page"] - 1]["thumb"] = url
+        else:
+            sources.setdefault((info["page"], info["format"]), []).append((info["width"], url))
+    for (page, fmt), widths in sources.items():
+        images[page - 1]["srcset"][fmt] = ", ".join(f"{url} {w}w" for w, url in sorted(widths))
+    return images
+
+
+def build_manifest(uid: str) -> dict:
+    """Collect the current state of ``uid`` from the storage index."""
+
+    try:
+        timestamps = json.loads(_read(uid, "timestamps") or "[]")
+    except ValueError:
+        timestamps = []
+    slides_id = (_read(uid, "slides_id") or "").strip()
+    slides = [storage.url(e["path"]) for e in storage.list(uid, "slide")]
+    video = storage.find(uid, "video")
+    hls = storage.find(uid, "hls")
+    return {
+        "uid": uid,
+        "slide_count": len(slides),
+        "slides": slides,
+        "slide_images": _slide_images(uid, len(slides)),
+        "timestamps": timestamps,
+        "slides_id": slides_id,
+        # Known before the render finishes; the player retries until it exists
+        "output_video": storage.url(
+            video["path"] if video else os.path.join(storage.media_dir(uid), LECTURE_VIDEO)
+        ),
+        "hls": storage.url(os.path.join(hls["path"], "index.m3u8")) if hls else None,
+        "qa_clips": [storage.url(e["path"]) for e in storage.list(uid, "qa_clip")],
+        "segments": [],
+    }
+
+
+def _write(uid: str, manifest: dict) -> None:
+    path = manifest_path(uid)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, separators=(",", ":"))
+    os.replace(tmp, path)
+
+
+def write_manifest(uid: str) -> dict:
+    """Rebuild the manifest of ``uid`` from the index.
+
+    Clips and segments are published as they are made and not all of them
+    are indexed under a kind listed here, so they are carried over from the
+    current manifest (clips only while their file exists).
+    """
+
+    manifest = build_manifest(uid)
+    with _lock:
+        try:
+            with open(manifest_path(uid)) as f:
+                previous = json.load(f)
+        except (OSError, ValueError):
+            previous = {}
+        built = manifest["qa_clips"]
+        clips = [
+            url for url in previous.get("qa_clips", [])
+            if url in built or os.path.exists(url[1:])
+        ]
+        manifest["qa_clips"] = clips + [url for url in built if url not in clips]
+        manifest["segments"] = previous.get("segments", [])
+        _write(uid, manifest)
+    return manifest
+
+
+def load_manifest(uid: str) -> Optional[bytes]:
+    """Return the stored manifest bytes, building one for older classes."""
+
+    if storage.find(uid, "timestamps") is None:
+        return None
+    path = manifest_path(uid)
+    if not os.path.exists(path):
+        write_manifest(uid)
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def add_clip(uid: str, name: str) -> None:
+    """Record a newly generated Q&A clip (``name`` relative to ``/outputs``)."""
+
+    with _lock:
+        try:
+            with open(manifest_path(uid)) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            manifest = build_manifest(uid)
+        url = f"/outputs/{name}"
+        if url not in manifest["qa_clips"]:
+            manifest["qa_clips"].append(url)
+        _write(uid, manifest)
+
+
+def set_segments(uid: str, segments: List[dict]) -> None:
+    """Publish the per-slide segments of a segmented render."""
+
+    with _lock:
+        try:
+            with open(manifest_path(uid)) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            manifest = build_manifest(uid)
+        manifest["segments"] = [
+            {
+                "start": seg["start"],
+                "end": seg["end"],
+                "video": storage.url(seg["video"]) if seg.get("video") else None,
+            }
+            for seg in segments
+        ]
+        _write(uid, manifest)
+
+
+def drop_media(uid: str, urls: set) -> None:
+    """Forget Q&A clips and segments whose files were deleted."""
+
+    with _lock:
+        try:
+            with open(manifest_path(uid)) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return
+        manifest["qa_clips"] = [url for url in manifest["qa_clips"] if url not in urls]
+        manifest["segments"] = [
+            seg for seg in manifest.get("segments", []) if seg.get("video") not in urls
+        ]
+        _write(uid, manifest)
+
+
+def update_manifest(uid: str, **fields) -> None:
+    """Set top-level manifest fields, e.g. the HLS playlist once packaged."""
+
+    with _lock:
+        try:
+            with open(manifest_path(uid)) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            manifest = build_manifest(uid)
+        manifest.update(fields)
+        _write(uid, manifest)
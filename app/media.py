@@ -0,0 +1,185 @@
+"""Shrink MuseTalk inputs before they are uploaded to fal.ai.
+
+Instructors often upload 4K/60 fps avatar clips and uncompressed WAV
+narration, and sending those to fal can take longer than the inference.  This
+stage re-encodes the avatar to the resolution and frame rate MuseTalk works
+at, trims or loops it to the narration length, and transcodes the audio to
+mono AAC.  Results are cached under ``CACHE_DIR/media`` by input digest and
+settings, and only replace the original when they are actually smaller.  The
+cache is kept under ``MEDIA_CACHE_MAX_BYTES``, least recently used first.
+
+Everything here is best effort: without ``ffmpeg`` or on any encoding error
+the original files are used unchanged.
+"""
+
+from typing import Optional, Tuple
+
+import hashlib
+import json
+import logging
+import math
+import os
+import shutil
+import subprocess
+import threading
+import uuid
+
+try:  # package style
+    from app import disk_cache  # type: ignore
+    from app.hashing import sha256_file  # type: ignore
+    from app.upload_cache import CACHE_DIR  # type: ignore
+except ImportError:
+    import disk_cache  # type: ignore
+    from hashing import sha256_file  # type: ignore
+    from upload_cache import CACHE_DIR  # type: ignore
+
+log = logging.getLogger(__name__)
+
+
+MEDIA_CACHE_DIR = os.path.join(CACHE_DIR, "media")
+MEDIA_CACHE_MAX_BYTES = int(os.environ.get("MEDIA_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+MEDIA_NORMALIZE = os.environ.get("MEDIA_NORMALIZE", "1") != "0"
+AVATAR_MAX_HEIGHT = int(os.environ.get("AVATAR_MAX_HEIGHT", "512"))
+AVATAR_FPS = int(os.environ.get("AVATAR_FPS", "25"))
+AUDIO_BITRATE = os.environ.get("AUDIO_BITRATE", "64k")
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png"}
+
+_stats_lock = threading.Lock()
+_stats = {"normalized": 0, "cache_hits": 0, "failures": 0, "bytes_saved": 0, "evictions": 0}
+
+
+def ffmpeg_available() -> bool:
+    return shutil.which("ffmpeg") is not None and shutil.which("ffprobe") is not None
+
+
+def probe_duration(path: str) -> Optional[float]:
+    """Return the container duration of ``path`` in seconds, if known."""
+
+    try:
+        out = subprocess.run(
+            [
+                "ffprobe", "-v", "error",
+                "-show_entries", "format=duration",
+                "-of", "default=noprint_wrappers=1:nokey=1",
+                path,
+            ],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout.strip()
+        return float(out)
+    except (subprocess.CalledProcessError, OSError, ValueError):
+        # No ffprobe, or an unreadable file: the duration is simply unknown
+        return None
+
+
+def _cached_transcode(src: str, ext: str, settings: dict, args: list) -> Tuple[str, bool]:
+    """Run ``ffmpeg`` with ``args`` unless an identical result is cached.
+
+    ``args`` is the part of the command line between the input and the output
+    file.  Returns the output path and whether it was a cache hit.
+    """
+
+    key = hashlib.sha256(
+        json.dumps({"input": sha256_file(src), **settings}, sort_keys=True).encode()
+    ).hexdigest()
+    dst = os.path.join(MEDIA_CACHE_DIR, f"{key}{ext}")
+    if disk_cache.touch(dst):
+        return dst, True
+
+    os.makedirs(MEDIA_CACHE_DIR, exist_ok=True)
+    tmp = os.path.join(MEDIA_CACHE_DIR, f".{uuid.uuid4().hex}{ext}")
+    input_args = settings.get("input_args", [])
+    try:
+        subprocess.run(
+            ["ffmpeg", "-y", "-v", "error", *input_args, "-i", src, *args, tmp],
+            check=True,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+        )
+        os.replace(tmp, dst)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    evicted, _ = disk_cache.trim(MEDIA_CACHE_DIR, MEDIA_CACHE_MAX_BYTES, keep=dst)
+    with _stats_lock:
+        _stats["evictions"] += evicted
+    return dst, False
+
+
+def normalize_audio(path: str) -> Tuple[str, bool]:
+    settings = {"kind": "audio", "codec": "aac", "bitrate": AUDIO_BITRATE}
+    return _cached_transcode(
+        path, ".m4a", settings, ["-vn", "-ac", "1", "-c:a", "aac", "-b:a", AUDIO_BITRATE]
+    )
+
+
+def normalize_avatar(path: str, duration: Optional[float]) -> Tuple[str, bool]:
+    scale = f"scale=-2:'min(ih,{AVATAR_MAX_HEIGHT})'"
+    ext = os.path.splitext(path)[1].lower()
+    if ext in IMAGE_EXTENSIONS:
+        settings = {"kind": "image", "height": AVATAR_MAX_HEIGHT}
+        return _cached_transcode(path, ".jpg", settings, ["-vf", scale, "-q:v", "3"])
+
+    settings = {
+        "kind": "video",
+        "height": AVATAR_MAX_HEIGHT,
+        "fps": AVATAR_FPS,
+        # Rounded up so answers of similar length share one normalised avatar
+        "duration": math.ceil(duration) if duration else None,
+        "input_args": ["-stream_loop", "-1"] if duration else [],
+    }
+    args = [
+        "-vf", f"{scale},fps={AVATAR_FPS}",
+        "-an",
+        "-c:v", "libx264", "-preset", "veryfast", "-crf", "23",
+        "-pix_fmt", "yuv420p",
+        "-movflags", "+faststart",
+    ]
+    if duration:
+        args[:0] = ["-t", str(settings["duration"])]
+    return _cached_transcode(path, ".mp4", settings, args)
+
+
+def prepare_inputs(audio_path: str, media_path: str) -> Tuple[str, str, dict]:
+    """Return smaller equivalents of the MuseTalk inputs and a size report."""
+
+    report = {
+        "audio_bytes": os.path.getsize(audio_path),
+        "media_bytes": os.path.getsize(media_path),
+    }
+    if not MEDIA_NORMALIZE or not ffmpeg_available():
+        return audio_path, media_path, {**report, "bytes_saved": 0}
+
+    def attempt(label: str, original: str, fn, *args) -> str:
+        try:
+            result, hit = fn(original, *args)
+        except (subprocess.CalledProcessError, OSError) as exc:
+            log.warning("Could not normalize %s %s: %s", label, original, exc)
+            with _stats_lock:
+                _stats["failures"] += 1
+            return original
+        with _stats_lock:
+            _stats["cache_hits" if hit else "normalized"] += 1
+        return result if os.path.getsize(result) < os.path.getsize(original) else original
+
+    duration = probe_duration(audio_path)
+    new_audio = attempt("audio", audio_path, normalize_audio)
+    new_media = attempt("avatar", media_path, normalize_avatar, duration)
+
+    report["audio_bytes_normalized"] = os.path.getsize(new_audio)
+    report["media_bytes_normalized"] = os.path.getsize(new_media)
+    report["bytes_saved"] = (
+        report["audio_bytes"] + report["media_bytes"]
+        - report["audio_bytes_normalized"] - report["media_bytes_normalized"]
+    )
+    with _stats_lock:
+        _stats["bytes_saved"] += report["bytes_saved"]
+    log.info("Normalized MuseTalk inputs", extra={"bytes_saved": report["bytes_saved"]})
+    return new_audio, new_media, report
+
+
+def media_stats() -> dict:
+    with _stats_lock:
+        return dict(_stats)
@@ -0,0 +1,283 @@
+"""In-process metrics exported at ``GET /metrics``.
+
+A lecture goes through several slow stages -- ingesting the uploads,
+rasterizing the slides, uploading to fal, waiting in fal's queue, inference,
+downloading the result, LLM completion and TTS -- and a chat answer through
+some of them again.  Each stage is timed into :data:`STAGE_SECONDS` through
+the :func:`stage` context manager, so the exported histograms show where the
+time goes.  Bytes moved, jobs in flight and the avatar WebSocket frame rate
+are tracked alongside.
+
+Metrics are rendered in the Prometheus text format; there is deliberately no
+client library dependency for a handful of counters.
+"""
+
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import asyncio
+import math
+import threading
+import time
+
+
+# Seconds; covers sub-second cache hits up to ten-minute renders.
+DEFAULT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Iterable[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"{self.name} expects labels {self.label_names}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        # Unlabelled series are exported as 0 before their first update
+        self._values: Dict[Tuple[str, ...], float] = {} if self.label_names else {(): 0}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"
+            for key, value in items
+        ]
+
+
+class Gauge(Counter):
+    """A value that goes up and down, or is read from ``fn`` at export time."""
+
+    kind = "gauge"
+
+    def __init__(self, *args, fn: Optional[Callable[[], float]] = None, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.fn = fn
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def samples(self) -> List[str]:
+        if self.fn is not None:
+            return [f"{self.name} {_format_value(self.fn())}"]
+        return super().samples()
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: Iterable[float] = DEFAULT_BUCKETS, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # label values -> [bucket counts..., sum, count]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            data = self._values.get(key)
+            if data is None:
+                data = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    data[i] += 1
+            data[-2] += value
+            data[-1] += 1
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            data = self._values.get(self._key(labels))
+            return int(data[-1]) if data else 0
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, list(data)) for key, data in self._values.items())
+        lines = []
+        for key, data in items:
+            for bound, hits in zip(self.buckets, data):
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, le)} {hits}")
+            labels = _format_labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(round(data[-2], 6))}")
+            lines.append(f"{self.name}_count{labels} {int(data[-1])}")
+        return lines
+
+
+class RateMeter:
+    """Events per second over a sliding window of ``window`` seconds."""
+
+    def __init__(self, window: float = 10.0) -> None:
+        self.window = window
+        self._lock = threading.Lock()
+        self._events: deque = deque()
+
+    def mark(self, n: int = 1) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self._events.append((now, n))
+            self._trim(now)
+
+    def _trim(self, now: float) -> None:
+        while self._events and self._events[0][0] < now - self.window:
+            self._events.popleft()
+
+    def rate(self) -> float:
+        now = time.monotonic()
+        with self._lock:
+            self._trim(now)
+            return round(sum(n for _, n in self._events) / self.window, 3)
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help: str, labels: Iterable[str] = ()) -> Counter:
+        return self.register(Counter(name, help, labels))
+
+    def gauge(self, name: str, help: str, labels: Iterable[str] = (), fn=None) -> Gauge:
+        return self.register(Gauge(name, help, labels, fn=fn))
+
+    def histogram(self, name: str, help: str, labels: Iterable[str] = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labels, buckets=buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.header())
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# Stages timed by :func:`stage`: ingest, rasterize, fal_upload, queue_wait,
+# inference, download, llm, tts (plus a few finer ones such as normalize).
+STAGE_SECONDS = REGISTRY.histogram(
+    "lecture_stage_seconds", "Time spent in each processing stage.", ("stage",)
+)
+STAGE_ERRORS = REGISTRY.counter(
+    "lecture_stage_errors_total", "Stage runs that raised an exception.", ("stage",)
+)
+BYTES_TRANSFERRED = REGISTRY.counter(
+    "lecture_bytes_total",
+    "Bytes moved, by direction (in/out) and what was transferred.",
+    ("direction", "kind"),
+)
+JOBS_IN_FLIGHT = REGISTRY.gauge("lecture_jobs_in_flight", "Render jobs currently running.")
+JOBS_FINISHED = REGISTRY.counter(
+    "lecture_jobs_total", "Render jobs finished, by final status.", ("status",)
+)
+WS_FRAMES = REGISTRY.counter(
+    "lecture_ws_frames_total",
+    "Avatar frames received from fal (received) and sent to viewers (sent).",
+    ("direction",),
+)
+WS_FRAMES_DROPPED = REGISTRY.counter(
+    "lecture_ws_frames_dropped_total", "Frames dropped for viewers that fell behind."
+)
+ws_frame_rate = RateMeter()
+REGISTRY.gauge(
+    "lecture_ws_frames_per_second",
+    "Frames sent to avatar WebSocket viewers per second, over the last 10s.",
+    fn=ws_frame_rate.rate,
+)
+
+
+# How late ``asyncio.sleep`` wakes up; anything blocking the loop shows here.
+LOOP_LAG = REGISTRY.histogram(
+    "lecture_event_loop_lag_seconds",
+    "Delay of event loop wake-ups beyond the requested sleep.",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+
+
+async def monitor_event_loop(interval: float) -> None:
+    """Sample event loop lag into :data:`LOOP_LAG` every ``interval`` seconds."""
+
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        LOOP_LAG.observe(max(0.0, loop.time() - start - interval))
+
+
+def observe_stage(name: str, seconds: float) -> None:
+    STAGE_SECONDS.observe(seconds, stage=name)
+
+
+@contextmanager
+def stage(name: str):
+    """Time the enclosed block into ``lecture_stage_seconds{stage=name}``."""
+
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.inc(stage=name)
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=name)
+
+
+def count_bytes(direction: str, kind: str, amount: int) -> None:
+    if amount:
+        BYTES_TRANSFERRED.inc(amount, direction=direction, kind=kind)
+
+
+def render() -> str:
+    return REGISTRY.render()
@@ -3,27 +3,457 @@
 The previous codebase executed the MuseTalk model locally which required a
 heavy environment and large downloads.  This module replaces that behaviour by
 leveraging the hosted model available on `fal.ai`.  The ``run_musetalk``
-function uploads the required audio and video files, invokes the remote model
+coroutine uploads the required audio and video files, invokes the remote model
 and stores the resulting video in the given ``output_path``.
+
+Requests go through fal's async queue API (submit, then poll the status) on
+the event loop rather than a blocking ``subscribe`` in a worker thread, so a
+render waiting minutes in fal's queue holds no thread.  All fal requests share
+one concurrency limit (``FAL_CONCURRENCY``) and rate limit (``FAL_RATE``
+requests per second), transient errors are retried with jittered backoff and
+each endpoint has a circuit breaker, so a dead fallback endpoint is skipped
+instead of being probed after every failure.
 """
 
-from typing import Callable, Optional
+from typing import Awaitable, Callable, Dict, Optional
 
+import asyncio
+import hashlib
+import json
+import logging
 import os
+import shutil
+import threading
+import time
+
+try:  # package style
+    from app.hashing import sha256_file  # type: ignore
+    from app.media import prepare_inputs  # type: ignore
+    from app.metrics import REGISTRY, count_bytes, observe_stage, stage  # type: ignore
+    from app.resilience import (  # type: ignore
+        CircuitBreaker, CircuitOpenError, RateLimiter, is_transient, retry,
+    )
+    from app.services import get_fal_client, get_fal_realtime, get_requests  # type: ignore
+    from app.upload_cache import CACHE_DIR, upload_cache  # type: ignore
+except ImportError:
+    from hashing import sha256_file  # type: ignore
+    from media import prepare_inputs  # type: ignore
+    from metrics import REGISTRY, count_bytes, observe_stage, stage  # type: ignore
+    from resilience import (  # type: ignore
+        CircuitBreaker, CircuitOpenError, RateLimiter, is_transient, retry,
+    )
+    from services import get_fal_client, get_fal_realtime, get_requests  # type: ignore
+    from upload_cache import CACHE_DIR, upload_cache  # type: ignore
+
+log = logging.getLogger(__name__)
+
+MUSETALK_ENDPOINT = "fal-ai/musetalk"
+FALLBACK_ENDPOINT = "110602490/musetalk"
+
+RENDER_CACHE_DIR = os.path.join(CACHE_DIR, "renders")
+RENDER_CACHE_MAX_BYTES = int(os.environ.get("RENDER_CACHE_MAX_BYTES", str(5 * 1024 ** 3)))
+
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+DOWNLOAD_RETRIES = int(os.environ.get("DOWNLOAD_RETRIES", "4"))
+
+FAL_CONCURRENCY = int(os.environ.get("FAL_CONCURRENCY", "16"))
+FAL_RATE = float(os.environ.get("FAL_RATE", "10"))
+FAL_BURST = int(os.environ.get("FAL_BURST", "20"))
+FAL_RETRIES = int(os.environ.get("FAL_RETRIES", "4"))
+FAL_POLL_INTERVAL = float(os.environ.get("FAL_POLL_INTERVAL", "1.0"))
+# Longest a queued request may take, queue wait included, before it is cancelled
+FAL_REQUEST_TIMEOUT = float(os.environ.get("FAL_REQUEST_TIMEOUT", "1800"))
+FAL_BREAKER_FAILURES = int(os.environ.get("FAL_BREAKER_FAILURES", "5"))
+FAL_BREAKER_RESET = float(os.environ.get("FAL_BREAKER_RESET", "60"))
+
+# One slot per fal request in flight, held from submit until the result is in
+_fal_slots = asyncio.Semaphore(FAL_CONCURRENCY)
+_fal_rate = RateLimiter(FAL_RATE, FAL_BURST)
+_breakers: Dict[str, CircuitBreaker] = {
+    endpoint: CircuitBreaker(endpoint, FAL_BREAKER_FAILURES, FAL_BREAKER_RESET)
+    for endpoint in (MUSETALK_ENDPOINT, FALLBACK_ENDPOINT)
+}
+
+FAL_IN_FLIGHT = REGISTRY.gauge("lecture_fal_requests_in_flight", "fal queue requests in flight.")
+FAL_RETRIES_TOTAL = REGISTRY.counter(
+    "lecture_fal_retries_total", "fal API calls retried after a transient error.", ("call",)
+)
+FAL_CIRCUIT_OPEN = REGISTRY.gauge(
+    "lecture_fal_circuit_open", "1 while an endpoint's circuit breaker is open.", ("endpoint",)
+)
+for _endpoint in _breakers:
+    FAL_CIRCUIT_OPEN.set(0, endpoint=_endpoint)
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def _http_session():
+    """Process-wide keep-alive ``requests.Session`` shared by all downloads."""
+
+    global _session
+    requests = get_requests()
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=16)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+        return _session
+
+
+def download_file(url: str, output_path: str) -> dict:
+    """Stream ``url`` into ``output_path`` and return transfer statistics.
+
+    Data is written in chunks to ``<output_path>.part`` and renamed into place
+    once complete, so readers never observe a half-written file.  A dropped
+    connection is resumed with an HTTP ``Range`` request from the bytes already
+    on disk.  Only connection errors, timeouts, 429 and 5xx responses are
+    retried; any other failure (a 404, an expired signed URL) is final.
+    """
+
+    requests = get_requests()
+    resumable = (
+        requests.exceptions.ConnectionError,
+        requests.exceptions.Timeout,
+        requests.exceptions.ChunkedEncodingError,
+    )
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    part = f"{output_path}.part"
+    if os.path.exists(part):
+        os.remove(part)
+
+    session = _http_session()
+    start = time.perf_counter()
+    resumes = 0
+    for attempt in range(1, DOWNLOAD_RETRIES + 1):
+        offset = os.path.getsize(part) if os.path.exists(part) else 0
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+        try:
+            with session.get(url, stream=True, timeout=(10, 120), headers=headers) as resp:
+                if offset and resp.status_code == 416:
+                    # Everything was already received before the drop
+                    break
+                resp.raise_for_status()
+                if offset and resp.status_code != 206:
+                    # Server ignored the range; start over
+                    offset = 0
+                length = resp.headers.get("Content-Length")
+                expected = offset + int(length) if length else None
+                with open(part, "ab" if offset else "wb") as f:
+                    for chunk in resp.iter_content(DOWNLOAD_CHUNK_SIZE):
+                        f.write(chunk)
+            if expected is not None and os.path.getsize(part) < expected:
+                raise requests.exceptions.ConnectionError(
+                    f"connection closed after {os.path.getsize(part)} of {expected} bytes"
+                )
+            break
+        except requests.exceptions.RequestException as e:
+            if attempt == DOWNLOAD_RETRIES or not (isinstance(e, resumable) or is_transient(e)):
+                raise RuntimeError(f"Failed to download video: {e}") from e
+            resumes += 1
+            log.warning("Download interrupted (%s); resuming (attempt %d)", e, attempt + 1)
+            time.sleep(min(2 ** attempt, 10))
+
+    size = os.path.getsize(part) if os.path.exists(part) else 0
+    if size == 0:
+        raise RuntimeError("Downloaded video is empty")
+    os.replace(part, output_path)
+
+    elapsed = time.perf_counter() - start
+    observe_stage("download", elapsed)
+    count_bytes("in", "download", size)
+    return {
+        "bytes": size,
+        "seconds": round(elapsed, 3),
+        "bytes_per_second": round(size / elapsed) if elapsed > 0 else None,
+        "resumes": resumes,
+    }
+
+
+def _upload_file(path: str) -> str:
+    """Upload ``path`` to fal storage unless identical content is cached."""
+
+    return upload_cache.get_or_upload(path, get_fal_client().upload_file)
+
+
+def _place(src: str, dst: str) -> None:
+    """Atomically make ``dst`` a hardlink to (or copy of) ``src``."""
+
+    if os.path.exists(dst) and os.path.samefile(src, dst):
+        # rename() is a no-op between links to the same inode
+        return
+    os.makedirs(os.path.dirname(dst) or ".", exist_ok=True)
+    tmp = f"{dst}.tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    try:
+        os.link(src, tmp)
+    except OSError:
+        # Different filesystem or no hardlink support
+        shutil.copyfile(src, tmp)
+    os.replace(tmp, dst)
+
+
+class RenderCache:
+    """Size-bounded LRU cache of finished MuseTalk videos.
+
+    Entries are named by a digest of the input file contents, the endpoint
+    and the API arguments, so byte-identical requests are served from disk.
+    Recency is tracked through the file modification time, which is bumped on
+    every hit.  Concurrent requests for the same key wait for the single
+    render that is already in flight instead of starting their own.
+    """
+
+    def __init__(self, directory: str, max_bytes: int) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, asyncio.Event] = {}
+        self.hits = 0
+        self.misses = 0
+        self.collapsed = 0
+        self.evictions = 0
+
+    def key(self, audio_path: str, media_path: str, endpoint: str, arguments: dict) -> str:
+        payload = json.dumps(
+            {
+                "audio": sha256_file(audio_path),
+                "media": sha256_file(media_path),
+                "endpoint": endpoint,
+                "arguments": arguments,
+            },
+            sort_keys=True,
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.mp4")
+
+    def fetch(self, key: str, output_path: str) -> bool:
+        cached = self._path(key)
+        try:
+            os.utime(cached)
+        except FileNotFoundError:
+            return False
+        _place(cached, output_path)
+        with self._lock:
+            self.hits += 1
+        return True
+
+    def store(self, key: str, output_path: str) -> None:
+        if self.max_bytes <= 0:
+            return
+        _place(output_path, self._path(key))
+        self._evict(keep=self._path(key))
+
+    def _evict(self, keep: str) -> None:
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".mp4"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            with self._lock:
+                self.evictions += 1
+
+    async def get_or_render(self, key: str, output_path: str,
+                            render: Callable[[], Awaitable[dict]]) -> Optional[dict]:
+        """Serve ``key`` from the cache or await ``render`` to produce it.
+
+        Returns whatever ``render`` returned, or ``None`` on a cache hit.
+        """
+
+        while True:
+            if await asyncio.to_thread(self.fetch, key, output_path):
+                log.info("Render cache hit", extra={"output": output_path})
+                return None
+            with self._lock:
+                event = self._inflight.get(key)
+                owner = event is None
+                if owner:
+                    event = self._inflight[key] = asyncio.Event()
+                    self.misses += 1
+                else:
+                    self.collapsed += 1
+            if not owner:
+                # Someone else is rendering the same inputs; if they fail we
+                # loop round and try ourselves.
+                await event.wait()
+                continue
+            try:
+                result = await render()
+                await asyncio.to_thread(self.store, key, output_path)
+            finally:
+                with self._lock:
+                    del self._inflight[key]
+                event.set()
+            return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "collapsed": self.collapsed,
+                "evictions": self.evictions,
+                "in_flight": len(self._inflight),
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+render_cache = RenderCache(RENDER_CACHE_DIR, RENDER_CACHE_MAX_BYTES)
+
+
+class _timed_updates:
+    """``on_queue_update`` wrapper splitting the fal call into queue wait and
+    inference time for the ``queue_wait`` and ``inference`` stages."""
+
+    def __init__(self, on_update: Optional[Callable] = None) -> None:
+        self.on_update = on_update
+        self.submitted = time.perf_counter()
+        self.started: Optional[float] = None
+        self.completed: Optional[float] = None
 
-import requests
-import fal_client
-from fal_client.client import FalClientError
+    def __call__(self, update) -> None:
+        kind = type(update).__name__
+        now = time.perf_counter()
+        if kind in ("InProgress", "Completed") and self.started is None:
+            self.started = now
+            observe_stage("queue_wait", now - self.submitted)
+        if kind == "Completed" and self.completed is None:
+            self.completed = now
+            observe_stage("inference", now - self.started)
+        log.debug("fal queue update: %s", kind)
+        if self.on_update is not None:
+            self.on_update(update)
 
-try:
-    from fal_client import realtime
-except Exception:  # fallback if realtime submodule missing
-    realtime = None
+    def finish(self) -> None:
+        """Close the stages for calls that returned without a ``Completed``."""
 
+        now = time.perf_counter()
+        if self.started is None:
+            self.started = self.submitted
+            observe_stage("queue_wait", 0.0)
+        if self.completed is None:
+            self.completed = now
+            observe_stage("inference", now - self.started)
 
-def run_musetalk(audio_path: str, source_media_path: str, output_path: str,
 
-                 on_update: Optional[Callable] = None) -> None:
+def _media_key(source_media_path: str) -> str:
+    ext = os.path.splitext(source_media_path)[1].lower()
+    return "source_image_url" if ext in {".jpg", ".jpeg", ".png"} else "source_video_url"
+
+
+async def _fal_request(call: str, factory: Callable[[], Awaitable]):
+    """One fal API call under the shared rate limit, retried if transient."""
+
+    return await retry(
+        factory,
+        FAL_RETRIES,
+        limiter=_fal_rate,
+        on_retry=lambda exc, attempt: FAL_RETRIES_TOTAL.inc(call=call),
+    )
+
+
+async def _call_endpoint(endpoint: str, arguments: dict, on_update: Callable) -> dict:
+    """Submit to ``endpoint``'s queue and poll until the result is ready.
+
+    A request still unfinished after ``FAL_REQUEST_TIMEOUT`` seconds, or
+    whose caller is cancelled, is cancelled on fal too so it stops using
+    capacity there.
+    """
+
+    fal_client = get_fal_client()
+    handle = await _fal_request(
+        "submit", lambda: fal_client.submit_async(endpoint, arguments=arguments)
+    )
+    deadline = time.monotonic() + FAL_REQUEST_TIMEOUT
+    completed = False
+    try:
+        while True:
+            status = await _fal_request("status", lambda: handle.status(with_logs=True))
+            on_update(status)
+            if type(status).__name__ == "Completed":
+                completed = True
+                break
+            if time.monotonic() >= deadline:
+                raise TimeoutError(
+                    f"{endpoint} request not finished after {FAL_REQUEST_TIMEOUT:.0f}s"
+                )
+            await asyncio.sleep(FAL_POLL_INTERVAL)
+    finally:
+        if not completed:
+            try:
+                await handle.cancel()
+            except Exception as exc:
+                log.debug("Cancelling %s request failed: %s", endpoint, exc)
+    return await _fal_request("result", handle.get)
+
+
+async def _subscribe(arguments: dict, on_update: Callable) -> dict:
+    """Run MuseTalk on the first endpoint whose circuit is closed.
+
+    The primary endpoint is tried first and the fallback only when it fails
+    or its circuit is open.  If both fail the primary's error is raised.
+    """
+
+    errors = []
+    async with _fal_slots:
+        FAL_IN_FLIGHT.inc()
+        try:
+            for endpoint in (MUSETALK_ENDPOINT, FALLBACK_ENDPOINT):
+                breaker = _breakers[endpoint]
+                try:
+                    result = await breaker.call(
+                        lambda: _call_endpoint(endpoint, arguments, on_update)
+                    )
+                except CircuitOpenError as exc:
+                    log.debug("Skipping %s: %s", endpoint, exc)
+                    errors.append(exc)
+                    continue
+                except Exception as exc:
+                    log.warning("Endpoint %s failed: %s", endpoint, exc)
+                    errors.append(exc)
+                    continue
+                finally:
+                    FAL_CIRCUIT_OPEN.set(int(breaker.state == "open"), endpoint=endpoint)
+                if endpoint != MUSETALK_ENDPOINT:
+                    log.info("Using alternative endpoint: %s", endpoint)
+                return result
+        finally:
+            FAL_IN_FLIGHT.dec()
+    raise next((e for e in errors if not isinstance(e, CircuitOpenError)), errors[0])
+
+
+def fal_stats() -> dict:
+    return {
+        "in_flight": int(FAL_IN_FLIGHT.value()),
+        "concurrency": FAL_CONCURRENCY,
+        "rate_limited_seconds": round(_fal_rate.waited, 3),
+        "breakers": {endpoint: breaker.stats() for endpoint, breaker in _breakers.items()},
+    }
+
+
+async def run_musetalk(audio_path: str, source_media_path: str, output_path: str,
+                       on_update: Optional[Callable] = None) -> dict:
     """Generate a talking-head video using the fal.ai MuseTalk API.
 
     Parameters
@@ -37,6 +467,13 @@ def run_musetalk(audio_path: str, source_media_path: str, output_path: str,
         Where to save the resulting video file.
     on_update: Optional[Callable]
         Optional callback for queue updates produced by ``fal_client``.
+
+    Returns
+    -------
+    dict
+        ``{"cached": True}`` when the video came from the render cache,
+        otherwise the download statistics from :func:`download_file` with
+        ``"cached": False``.
     """
 
     # Validate input files
@@ -54,26 +491,59 @@ def run_musetalk(audio_path: str, source_media_path: str, output_path: str,
     if media_size == 0:
         raise RuntimeError(f"Source media file is empty: {source_media_path}")
     
-    print(f"Input validation passed:")
-    print(f"  Audio file: {audio_path} ({audio_size} bytes)")
-    print(f"  Source media: {source_media_path} ({media_size} bytes)")
-    
+    log.debug(
+        "Input validation passed",
+        extra={"audio": audio_path, "audio_bytes": audio_size,
+               "media": source_media_path, "media_bytes": media_size},
+    )
+
     # Check file extensions
     audio_ext = os.path.splitext(audio_path)[1].lower()
     if audio_ext not in ['.wav', '.mp3', '.m4a', '.aac']:
-        print(f"Warning: Audio file has unusual extension: {audio_ext}")
+        log.warning("Audio file has unusual extension: %s", audio_ext)
+
+    # Identical inputs produce identical videos; reuse an earlier render.
+    os.makedirs(RENDER_CACHE_DIR, exist_ok=True)
+    key = await asyncio.to_thread(
+        render_cache.key,
+        audio_path,
+        source_media_path,
+        MUSETALK_ENDPOINT,
+        {"media_key": _media_key(source_media_path)},
+    )
+    stats = await render_cache.get_or_render(
+        key,
+        output_path,
+        lambda: _render_musetalk(audio_path, source_media_path, output_path, on_update),
+    )
+    if stats is None:
+        return {"cached": True}
+    return {"cached": False, **stats}
+
+
+async def _render_musetalk(audio_path: str, source_media_path: str, output_path: str,
+                           on_update: Optional[Callable] = None) -> dict:
+    """Upload the inputs, call the remote model and download the result."""
+
+    fal_client = await asyncio.to_thread(get_fal_client)
+    FalClientError = fal_client.client.FalClientError
 
     # Upload input files to fal's temporary storage
     if not os.environ.get("FAL_KEY"):
         raise RuntimeError("FAL_KEY environment variable not set")
 
-    print(f"Uploading audio file: {audio_path}")
-    audio_url = fal_client.upload_file(audio_path)
-    print(f"Audio uploaded to: {audio_url}")
-    
-    print(f"Uploading media file: {source_media_path}")
-    media_url = fal_client.upload_file(source_media_path)
-    print(f"Media uploaded to: {media_url}")
+    # Re-encode to what MuseTalk needs so the uploads are as small as possible
+    with stage("normalize"):
+        audio_path, source_media_path, normalize_report = await asyncio.to_thread(
+            prepare_inputs, audio_path, source_media_path
+        )
+
+    # The upload cache is synchronous; both files go up side by side
+    audio_url, media_url = await asyncio.gather(
+        asyncio.to_thread(_upload_file, audio_path),
+        asyncio.to_thread(_upload_file, source_media_path),
+    )
+    log.debug("Inputs uploaded", extra={"audio_url": audio_url, "media_url": media_url})
 
     ext = os.path.splitext(source_media_path)[1].lower()
     # Handle cases where extension might be empty or missing
@@ -82,11 +552,9 @@ def run_musetalk(audio_path: str, source_media_path: str, output_path: str,
         if os.path.exists(source_media_path):
             # Default to video if no extension found
             ext = ".mp4"
-            print(f"Warning: No extension found for {source_media_path}, defaulting to .mp4")
+            log.warning("No extension found for %s, defaulting to .mp4", source_media_path)
     
     media_key = "source_image_url" if ext in {".jpg", ".jpeg", ".png"} else "source_video_url"
-    
-    print(f"Debug: source_media_path={source_media_path}, ext={ext}, media_key={media_key}")
 
     # Ensure we're passing the correct parameters to the API
     # For image avatars, only include source_image_url
@@ -101,94 +569,38 @@ def run_musetalk(audio_path: str, source_media_path: str, output_path: str,
             "audio_url": audio_url,
             "source_video_url": media_url
         }
-    
-    print(f"Debug: API arguments={api_arguments}")
-    print(f"Debug: Using media key: {media_key}")
 
     try:
-        print(f"Calling fal.ai MuseTalk API with arguments: {api_arguments}")
-        print("Starting API call... This may take several minutes for video processing.")
-        
-        # Add a progress callback if none provided
-        def default_progress_update(update):
-            print(f"API Progress: {update}")
-        
-        progress_callback = on_update or default_progress_update
-        
-        # Try different API endpoint variations
-        try:
-            result = fal_client.subscribe(
-                "fal-ai/musetalk",
-                arguments=api_arguments,
-                with_logs=True,  # Always enable logs for debugging
-                on_queue_update=progress_callback,
-            )
-        except FalClientError as endpoint_error:
-            print(f"First endpoint failed: {endpoint_error}")
-            # Try alternative endpoint
-            try:
-                result = fal_client.subscribe(
-                    "110602490/musetalk",
-                    arguments=api_arguments,
-                    with_logs=True,
-                    on_queue_update=progress_callback,
-                )
-                print("Using alternative endpoint: 110602490/musetalk")
-            except FalClientError as alt_error:
-                print(f"Alternative endpoint also failed: {alt_error}")
-                raise endpoint_error  # Re-raise the original error
-        print(f"API call successful, result keys: {list(result.keys()) if result else 'None'}")
-        print(f"Full result: {result}")
-        print(f"Result type: {type(result)}")
-        
+        log.info("Calling fal.ai MuseTalk", extra={"arguments": api_arguments})
+        progress_callback = _timed_updates(on_update)
+        result = await _subscribe(api_arguments, progress_callback)
+        progress_callback.finish()
+        # The full result can be large; only build the message when asked for
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("MuseTalk result: %r", result)
+
         # Check if result is None or empty
         if not result:
             raise RuntimeError("API returned empty result")
-        
-        # Additional debugging for the result
-        if isinstance(result, dict):
-            for key, value in result.items():
-                print(f"Result key '{key}': {type(value)} = {value}")
-        else:
-            print(f"Result is not a dict, it's a {type(result)}")
-            print(f"Result dir: {dir(result)}")
-            if hasattr(result, '__dict__'):
-                print(f"Result __dict__: {result.__dict__}")
-            
+
     except FalClientError as exc:
-        print(f"FalClientError details: {exc}")
-        print(f"FalClientError type: {type(exc)}")
-        # Try to get more details about the error
-        if hasattr(exc, 'response'):
-            print(f"Error response: {exc.response}")
-            if hasattr(exc.response, 'text'):
-                print(f"Error response text: {exc.response.text}")
-        if hasattr(exc, 'status_code'):
-            print(f"Error status code: {exc.status_code}")
-        if hasattr(exc, 'args'):
-            print(f"Error args: {exc.args}")
-        # Try to get the full error details
-        try:
-            import json
-            if hasattr(exc, 'response') and hasattr(exc.response, 'json'):
-                error_json = exc.response.json()
-                print(f"Error JSON: {json.dumps(error_json, indent=2)}")
-        except:
-            pass
+        if log.isEnabledFor(logging.DEBUG):
+            response = getattr(exc, "response", None)
+            log.debug(
+                "FalClientError details",
+                extra={
+                    "status_code": getattr(exc, "status_code", None),
+                    "response": getattr(response, "text", response),
+                },
+            )
         raise RuntimeError(f"MuseTalk API error: {exc}") from exc
+    except CircuitOpenError as exc:
+        raise RuntimeError(f"MuseTalk API unavailable: {exc}") from exc
     except Exception as exc:
-        print(f"Unexpected error: {exc}")
-        print(f"Error type: {type(exc)}")
-        import traceback
-        print(f"Traceback: {traceback.format_exc()}")
+        log.exception("Unexpected error calling MuseTalk")
         raise RuntimeError(f"Unexpected error calling MuseTalk API: {exc}") from exc
 
 
-    # Download the produced video
-    print("Processing API response...")
-    print(f"Result type: {type(result)}")
-    print(f"Result content: {result}")
-    
     # Handle different possible response formats
     video_info = None
     if isinstance(result, dict):
@@ -196,58 +608,44 @@ def run_musetalk(audio_path: str, source_media_path: str, output_path: str,
     elif hasattr(result, 'get'):
         video_info = result.get("video")
     else:
-        print(f"Unexpected result type: {type(result)}")
         raise RuntimeError(f"Unexpected result type from API: {type(result)}")
     
     if not video_info:
-        print(f"No video info in result. Full result: {result}")
-        print(f"Available keys: {list(result.keys()) if isinstance(result, dict) else 'Not a dict'}")
+        log.error("No video info in MuseTalk result: %r", result)
         raise RuntimeError("No video information in API response")
     
     if "url" not in video_info:
-        print(f"No URL in video info. Video info: {video_info}")
-        print(f"Video info keys: {list(video_info.keys()) if isinstance(video_info, dict) else 'Not a dict'}")
+        log.error("No URL in MuseTalk video info: %r", video_info)
         raise RuntimeError("No video URL in API response")
 
-    print(f"Downloading video from: {video_info['url']}")
-    try:
-        resp = requests.get(video_info["url"], timeout=120)  # Increased timeout
-        resp.raise_for_status()
-    except requests.exceptions.RequestException as e:
-        print(f"Failed to download video: {e}")
-        raise RuntimeError(f"Failed to download video: {e}")
-
-    print(f"Downloaded {len(resp.content)} bytes")
-    if len(resp.content) == 0:
-        raise RuntimeError("Downloaded video is empty")
-    
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    with open(output_path, "wb") as f:
-        f.write(resp.content)
-    print(f"Video saved to: {output_path}")
+    # Download the produced video
+    stats = await asyncio.to_thread(download_file, video_info["url"], output_path)
+    log.info("Video saved", extra={"output": output_path, **stats})
+    return {**stats, "normalize": normalize_report}
 
 
 async def stream_musetalk(audio_path: str, source_media_path: str, output_path: Optional[str] = None):
 
     """Stream MuseTalk frames via fal.ai realtime API.
 
-    Yields base64-encoded JPEG frames as strings. Falls back to regular
+    Yields base64-encoded JPEG frames as strings (``broadcast.decode_frame``
+    turns them into bytes for the WebSocket). Falls back to regular
     generation if realtime is unavailable.
     """
+    realtime = get_fal_realtime()
     if realtime is None:
         # Realtime not supported; run normal inference and yield the result once
         tmp = output_path or os.path.join(os.path.dirname(audio_path), "_tmp.mp4")
-        run_musetalk(audio_path, source_media_path, tmp)
-        yield f"RESULT::{os.path.basename(tmp)}"
+        await run_musetalk(audio_path, source_media_path, tmp)
+        # Path of the video relative to the app root, e.g. outputs/{uid}/stream.mp4
+        yield "RESULT::" + tmp.replace(os.sep, "/")
         return
 
-    print(f"Uploading audio file (stream): {audio_path}")
-    audio_url = fal_client.upload_file(audio_path)
-    print(f"Audio uploaded to (stream): {audio_url}")
-    
-    print(f"Uploading media file (stream): {source_media_path}")
-    media_url = fal_client.upload_file(source_media_path)
-    print(f"Media uploaded to (stream): {media_url}")
+    audio_url, media_url = await asyncio.gather(
+        asyncio.to_thread(_upload_file, audio_path),
+        asyncio.to_thread(_upload_file, source_media_path),
+    )
+    log.debug("Inputs uploaded (stream)", extra={"audio_url": audio_url, "media_url": media_url})
 
     ext = os.path.splitext(source_media_path)[1].lower()
     # Handle cases where extension might be empty or missing
@@ -256,11 +654,9 @@ async def stream_musetalk(audio_path: str, source_media_path: str, output_path:
         if os.path.exists(source_media_path):
             # Default to video if no extension found
             ext = ".mp4"
-            print(f"Warning (stream): No extension found for {source_media_path}, defaulting to .mp4")
+            log.warning("No extension found for %s, defaulting to .mp4", source_media_path)
     
     media_key = "source_image_url" if ext in {".jpg", ".jpeg", ".png"} else "source_video_url"
-    
-    print(f"Debug (stream): source_media_path={source_media_path}, ext={ext}, media_key={media_key}")
 
     # Ensure we're passing the correct parameters to the API
     # For image avatars, only include source_image_url
@@ -275,12 +671,10 @@ async def stream_musetalk(audio_path: str, source_media_path: str, output_path:
             "audio_url": audio_url,
             "source_video_url": media_url
         }
-    
-    print(f"Debug (stream): API arguments={api_arguments}")
-    print(f"Debug (stream): Using media key: {media_key}")
 
+    log.debug("Starting realtime MuseTalk session", extra={"arguments": api_arguments})
     session = await realtime.connect(
-        "fal-ai/musetalk",
+        MUSETALK_ENDPOINT,
         arguments=api_arguments,
     )
 
@@ -0,0 +1,189 @@
+"""Rate limiting, retries and circuit breaking for remote APIs.
+
+Renders and chat answers call fal.ai from many coroutines at once.  Without a
+common throttle a burst of requests trips fal's rate limits, a transient
+``503`` fails a render that would have succeeded a second later, and a
+dead endpoint is probed again on every call.  The helpers here are used by
+``musetalk_runner`` around each fal request:
+
+* :class:`RateLimiter` -- a token bucket shared by all callers;
+* :func:`retry` -- re-runs an awaitable factory on transient errors with
+  exponential backoff and full jitter;
+* :class:`CircuitBreaker` -- stops calling an endpoint after repeated
+  transient failures and lets a single trial request through once it has
+  cooled down.  Client errors (a ``422`` for a bad avatar, say) say nothing
+  about the endpoint's health and are not counted.
+"""
+
+from typing import Awaitable, Callable, Optional, TypeVar
+
+import asyncio
+import logging
+import random
+import time
+
+log = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Statuses worth retrying: timeouts, rate limiting and server-side failures.
+TRANSIENT_STATUS = {408, 425, 429, 500, 502, 503, 504}
+
+
+def _status_code(exc: BaseException) -> Optional[int]:
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def is_transient(exc: BaseException) -> bool:
+    """Whether ``exc`` is worth retrying (network error, 429 or 5xx)."""
+
+    status = _status_code(exc)
+    if status is not None:
+        return status in TRANSIENT_STATUS
+    if isinstance(exc, (ConnectionError, TimeoutError, asyncio.TimeoutError)):
+        return True
+    # httpx connection and read failures, without importing httpx here
+    return any(cls.__name__ == "TransportError" for cls in type(exc).__mro__)
+
+
+class RateLimiter:
+    """Token bucket allowing ``rate`` calls per second with bursts of ``burst``."""
+
+    def __init__(self, rate: float, burst: int = 1) -> None:
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+        self.waited = 0.0
+
+    async def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                delay = (1 - self._tokens) / self.rate
+                self.waited += delay
+                await asyncio.sleep(delay)
+
+
+async def retry(factory: Callable[[], Awaitable[T]], attempts: int, base_delay: float = 0.5,
+                max_delay: float = 30.0, limiter: Optional[RateLimiter] = None,
+                on_retry: Optional[Callable[[BaseException, int], None]] = None) -> T:
+    """Await ``factory()`` until it succeeds, retrying transient errors.
+
+    The delay before attempt ``n`` is drawn uniformly from
+    ``[0, min(max_delay, base_delay * 2 ** n))`` ("full jitter") so callers
+    that failed together do not retry together.
+    """
+
+    attempt = 0
+    while True:
+        if limiter is not None:
+            await limiter.acquire()
+        try:
+            return await factory()
+        except Exception as exc:
+            attempt += 1
+            if attempt >= attempts or not is_transient(exc):
+                raise
+            if on_retry is not None:
+                on_retry(exc, attempt)
+            delay = random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+            log.warning("Transient error (%s); retrying in %.2fs (attempt %d)", exc, delay, attempt + 1)
+            await asyncio.sleep(delay)
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling an endpoint whose breaker is open."""
+
+
+class CircuitBreaker:
+    """Per-endpoint breaker: closed, open after ``failures`` consecutive
+    transient errors, then half-open after ``reset_after`` seconds, when one trial call
+    decides whether it closes again."""
+
+    def __init__(self, name: str, failures: int = 5, reset_after: float = 60.0) -> None:
+        self.name = name
+        self.failures = max(1, failures)
+        self.reset_after = reset_after
+        self._consecutive = 0
+        self._opened_at: Optional[float] = None
+        self._trial = False
+        self.opened = 0
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.reset_after:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        """Whether a call may go ahead now; claims the trial when half-open."""
+
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._trial:
+            self._trial = True
+            return True
+        self.rejected += 1
+        return False
+
+    def record_success(self) -> None:
+        if self._opened_at is not None:
+            log.info("Circuit for %s closed", self.name)
+        self._consecutive = 0
+        self._opened_at = None
+        self._trial = False
+
+    def record_failure(self) -> None:
+        self._consecutive += 1
+        if self._trial or self._consecutive >= self.failures:
+            if self._opened_at is None or self._trial:
+                self.opened += 1
+                log.warning(
+                    "Circuit for %s opened after %d failures; skipping it for %.0fs",
+                    self.name, self._consecutive, self.reset_after,
+                )
+            self._opened_at = time.monotonic()
+        self._trial = False
+
+    async def call(self, factory: Callable[[], Awaitable[T]]) -> T:
+        if not self.allow():
+            raise CircuitOpenError(f"{self.name} is unavailable (circuit open)")
+        try:
+            result = await factory()
+        except Exception as exc:
+            if is_transient(exc):
+                self.record_failure()
+            else:
+                # The endpoint answered; the request was at fault
+                self._trial = False
+            raise
+        except BaseException:
+            # Cancelled: no verdict, but let the next caller have the trial
+            self._trial = False
+            raise
+        self.record_success()
+        return result
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self._consecutive,
+            "opened": self.opened,
+            "rejected": self.rejected,
+        }
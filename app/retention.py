@@ -0,0 +1,271 @@
+"""Disk-budget retention for class storage.
+
+Every ``/chat`` answer and every realtime preview leaves a video in
+``outputs/{uid}/`` and every upload keeps its PDF and slide images, so without
+a cleanup the disk eventually fills up.  :class:`RetentionManager` runs in the
+background and, in small batches so request handling never waits on it:
+
+* removes classes nobody has opened for ``RETENTION_CLASS_TTL`` seconds
+  (disabled by default), except classes with a render, warm-up or ingest
+  still queued or running;
+* while the indexed files plus the caches in :attr:`RetentionManager.caches`
+  (rendered videos, TTS audio, normalised media) exceed
+  ``RETENTION_MAX_BYTES``, deletes least recently used cache files first,
+  then generated media -- Q&A clips and preview streams, then pre-generated
+  answers, then the per-slide segments of lectures that already have their
+  joined video -- least recently accessed first.
+
+Only bytes that actually leave the disk are counted: a cache file hard-linked
+into a class is counted with the class, and deleting one of two links frees
+nothing until the other goes too.  Cache files used in the last
+``CACHE_MIN_AGE`` seconds are left alone, as a render may still be reading
+them.
+
+Lecture videos, their HLS renditions and the uploaded inputs are never
+evicted to meet the budget; if they alone exceed it a warning is logged.
+Access times are collected in memory (manifest loads, ``/outputs`` hits) and
+written to the storage index once per sweep.
+"""
+
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import asyncio
+import logging
+import os
+import stat
+import threading
+import time
+
+try:  # package style
+    from app.storage import ClassStorage, storage  # type: ignore
+    from app.manifest import drop_media  # type: ignore
+    from app import metrics  # type: ignore
+except ImportError:
+    from storage import ClassStorage, storage  # type: ignore
+    from manifest import drop_media  # type: ignore
+    import metrics  # type: ignore
+
+log = logging.getLogger(__name__)
+
+RETENTION_MAX_BYTES = int(os.environ.get("RETENTION_MAX_BYTES", str(20 * 1024 ** 3)))
+RETENTION_CLASS_TTL = float(os.environ.get("RETENTION_CLASS_TTL", "0"))
+RETENTION_INTERVAL = float(os.environ.get("RETENTION_INTERVAL", "60"))
+RETENTION_BATCH = int(os.environ.get("RETENTION_BATCH", "50"))
+CACHE_MIN_AGE = 600
+
+# Evicted in this order; later tiers are only touched once earlier ones are
+# gone.  Each tier names the artifact a class must still have for its files to
+# be evictable: segments are the only copy of a lecture until they are joined.
+EVICTION_TIERS: Tuple[Tuple[Tuple[str, ...], Optional[str]], ...] = (
+    (("qa_clip", "stream"), None),
+    (("warm_clip",), None),
+    (("segment",), "video"),
+)
+
+RECLAIMED_BYTES = metrics.REGISTRY.counter(
+    "lecture_retention_reclaimed_bytes_total",
+    "Bytes deleted by the retention manager, by reason (budget/ttl).",
+    ("reason",),
+)
+EVICTIONS = metrics.REGISTRY.counter(
+    "lecture_retention_evictions_total",
+    "Artifacts (or whole classes, kind=class) deleted by the retention manager.",
+    ("kind", "reason"),
+)
+STORAGE_BYTES = metrics.REGISTRY.gauge(
+    "lecture_storage_bytes", "Size of all indexed class files at the last sweep."
+)
+
+
+class RetentionManager:
+    """Keeps class storage within a byte budget and expires idle classes."""
+
+    def __init__(self, store: ClassStorage, max_bytes: int = RETENTION_MAX_BYTES,
+                 class_ttl: float = RETENTION_CLASS_TTL, batch: int = RETENTION_BATCH,
+                 keep: Iterable[str] = ()) -> None:
+        self.store = store
+        self.max_bytes = max_bytes
+        self.class_ttl = class_ttl
+        self.batch = batch
+        self.keep = set(keep)
+        # Callables returning the uids with work in progress; never expired
+        self.in_use: List[Callable[[], Iterable[str]]] = []
+        # Directories of content-addressed files that can be recreated
+        self.caches: List[str] = []
+        self._lock = threading.Lock()
+        self._classes: Dict[str, float] = {}
+        self._paths: Dict[Tuple[str, str], float] = {}
+        self.sweeps = 0
+        self.last_sweep: Optional[dict] = None
+
+    # -- access tracking ----------------------------------------------------
+
+    def touch(self, uid: str, path: Optional[str] = None) -> None:
+        """Note that ``uid`` (and optionally one of its files) was used."""
+
+        now = time.time()
+        with self._lock:
+            self._classes[uid] = now
+            if path is not None:
+                self._paths[(uid, path)] = now
+
+    def touch_output(self, name: str) -> None:
+        """Hook for the ``/outputs`` mount; ``name`` is relative to it.
+
+        Files inside a class subdirectory (the HLS segments) count as a use
+        of the directory, which is what the index records.
+        """
+
+        parts = [part for part in name.replace(os.sep, "/").split("/") if part]
+        if not parts:
+            return
+        self.touch(parts[0], os.path.join(self.store.output_dir, *parts[:2]))
+
+    def _flush(self) -> None:
+        with self._lock:
+            classes, self._classes = self._classes, {}
+            paths, self._paths = self._paths, {}
+        if classes or paths:
+            self.store.record_access(classes, paths)
+
+    # -- eviction -------------------------------------------------------------
+
+    def _expire_classes(self, budget: int) -> Tuple[int, int]:
+        if self.class_ttl <= 0 or budget <= 0:
+            return 0, 0
+        cutoff = time.time() - self.class_ttl
+        skip = set(self.keep)
+        for busy in self.in_use:
+            skip.update(busy())
+        count = freed = 0
+        # Fetch a few extra so skipped classes do not use up the batch
+        for uid in self.store.idle_classes(cutoff, budget + len(skip)):
+            if uid in skip:
+                continue
+            if count >= budget:
+                break
+            size = self.store.remove_class(uid)
+            RECLAIMED_BYTES.inc(size, reason="ttl")
+            EVICTIONS.inc(kind="class", reason="ttl")
+            log.info("Expired idle class %s", uid, extra={"bytes": size})
+            count += 1
+            freed += size
+        return count, freed
+
+    def _cache_files(self) -> List[Tuple[float, int, str]]:
+        """``(mtime, size, path)`` of cache files whose bytes only the cache
+        holds, in-progress temporary files excluded."""
+
+        files = []
+        for directory in self.caches:
+            try:
+                names = os.listdir(directory)
+            except FileNotFoundError:
+                continue
+            for name in names:
+                if name.startswith(".") or ".tmp" in name:
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                if stat.S_ISREG(st.st_mode) and st.st_nlink == 1:
+                    files.append((st.st_mtime, st.st_size, path))
+        return files
+
+    def _evict_caches(self, excess: int, budget: int) -> Tuple[int, int]:
+        count = freed = 0
+        cutoff = time.time() - CACHE_MIN_AGE
+        for mtime, size, path in sorted(self._cache_files()):
+            if freed >= excess or count >= budget or mtime > cutoff:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            RECLAIMED_BYTES.inc(size, reason="budget")
+            EVICTIONS.inc(kind="cache", reason="budget")
+            count += 1
+            freed += size
+        return count, freed
+
+    def _evict_to_budget(self, total: int, budget: int) -> Tuple[int, int]:
+        count, freed = self._evict_caches(total - self.max_bytes, budget)
+        touched: Dict[str, set] = {}
+        for kinds, requires in EVICTION_TIERS:
+            while total - freed > self.max_bytes and count < budget:
+                entries = self.store.least_recent(kinds, budget - count, requires)
+                if not entries:
+                    break
+                for entry in entries:
+                    if total - freed <= self.max_bytes:
+                        break
+                    size = self.store.remove(entry)
+                    touched.setdefault(entry["uid"], set()).add(self.store.url(entry["path"]))
+                    RECLAIMED_BYTES.inc(size, reason="budget")
+                    EVICTIONS.inc(kind=entry["kind"], reason="budget")
+                    count += 1
+                    freed += size
+        for uid, urls in touched.items():
+            drop_media(uid, urls)
+        if touched and total - freed > self.max_bytes:
+            # Clips that shared their bytes with a cached render left the
+            # cache copy as the only link
+            more, more_freed = self._evict_caches(total - freed - self.max_bytes, budget - count)
+            count += more
+            freed += more_freed
+        if total - freed > self.max_bytes and count < budget:
+            log.warning(
+                "Storage over budget with nothing left to evict",
+                extra={"bytes": total - freed, "max_bytes": self.max_bytes},
+            )
+        return count, freed
+
+    def sweep(self) -> dict:
+        """One bounded pass: flush access times, expire, then evict."""
+
+        start = time.perf_counter()
+        self._flush()
+        expired, expired_bytes = self._expire_classes(self.batch)
+        total = self.store.total_size() + sum(size for _, size, _ in self._cache_files())
+        evicted, evicted_bytes = 0, 0
+        if self.max_bytes > 0 and total > self.max_bytes:
+            evicted, evicted_bytes = self._evict_to_budget(total, self.batch - expired)
+        report = {
+            "expired_classes": expired,
+            "evicted": evicted,
+            "reclaimed_bytes": expired_bytes + evicted_bytes,
+            "storage_bytes": total - evicted_bytes,
+            "seconds": round(time.perf_counter() - start, 3),
+        }
+        STORAGE_BYTES.set(report["storage_bytes"])
+        self.sweeps += 1
+        self.last_sweep = report
+        if expired or evicted:
+            log.info("Retention sweep", extra=report)
+        return report
+
+    async def run(self, interval: float = RETENTION_INTERVAL) -> None:
+        """Sweep every ``interval`` seconds off the event loop."""
+
+        while True:
+            try:
+                await asyncio.to_thread(self.sweep)
+            except Exception as exc:
+                log.warning("Retention sweep failed: %s", exc)
+            await asyncio.sleep(interval)
+
+    def stats(self) -> dict:
+        return {
+            "max_bytes": self.max_bytes,
+            "class_ttl": self.class_ttl,
+            "sweeps": self.sweeps,
+            "reclaimed_bytes": sum(
+                RECLAIMED_BYTES.value(reason=reason) for reason in ("budget", "ttl")
+            ),
+            "last_sweep": self.last_sweep,
+        }
+
+
+retention = RetentionManager(storage)
@@ -0,0 +1,159 @@
+"""Render long lectures as independent per-slide segments.
+
+A full lecture sent to MuseTalk as one audio file is one long remote job that
+succeeds or fails as a whole, and nothing can be played until it is done.  In
+segmented mode the narration is cut at the slide boundaries from
+the class's ``timestamps.json``, the pieces are rendered concurrently with a bounded
+fan-out, failed pieces are retried on their own, and the finished clips are
+joined with an ``ffmpeg`` stream-copy concat.  Each segment is published as
+soon as it is ready so the player can start on slide 1 straight away.  A piece
+that fails after its retries cancels the pieces still rendering.
+"""
+
+from typing import Awaitable, Callable, List, Optional
+
+import asyncio
+import logging
+import os
+import random
+import subprocess
+
+try:  # package style
+    from app.musetalk_runner import run_musetalk  # type: ignore
+except ImportError:
+    from musetalk_runner import run_musetalk  # type: ignore
+
+log = logging.getLogger(__name__)
+
+SEGMENT_CONCURRENCY = int(os.environ.get("SEGMENT_CONCURRENCY", "3"))
+SEGMENT_RETRIES = int(os.environ.get("SEGMENT_RETRIES", "2"))
+
+# Slices shorter than this (e.g. a trailing end-of-lecture timestamp) are
+# merged into the previous segment instead of being rendered on their own, so
+# players should map slides to segments by time rather than by index.
+MIN_SEGMENT_SECONDS = 0.5
+
+
+def plan_segments(timestamps: List[float], duration: Optional[float]) -> List[dict]:
+    """Turn slide start times into ``{"index", "start", "end"}`` slices.
+
+    The first slice always starts at zero and the last one runs to the end of
+    the audio (``end`` is ``None`` when the duration is unknown).
+    """
+
+    starts = sorted(float(t) for t in timestamps) or [0.0]
+    starts[0] = 0.0
+    segments: List[dict] = []
+    for i, start in enumerate(starts):
+        end = starts[i + 1] if i + 1 < len(starts) else duration
+        if segments and end is not None and end - start < MIN_SEGMENT_SECONDS:
+            segments[-1]["end"] = end
+            continue
+        segments.append({"index": len(segments), "start": start, "end": end})
+    return segments
+
+
+def split_audio(audio_path: str, segment: dict, out_path: str) -> None:
+    cmd = ["ffmpeg", "-y", "-v", "error", "-i", audio_path, "-ss", str(segment["start"])]
+    if segment["end"] is not None:
+        cmd += ["-to", str(segment["end"])]
+    subprocess.run([*cmd, out_path], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+
+
+def concat_videos(paths: List[str], output_path: str) -> None:
+    """Join ``paths`` into ``output_path`` without re-encoding."""
+
+    list_path = f"{output_path}.txt"
+    tmp = f"{output_path}.concat.mp4"
+    with open(list_path, "w") as f:
+        for path in paths:
+            f.write(f"file '{os.path.abspath(path)}'\n")
+    try:
+        subprocess.run(
+            [
+                "ffmpeg", "-y", "-v", "error",
+                "-f", "concat", "-safe", "0", "-i", list_path,
+                "-c", "copy", "-movflags", "+faststart",
+                tmp,
+            ],
+            check=True,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+        )
+        os.replace(tmp, output_path)
+    finally:
+        for path in (list_path, tmp):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+async def render_segments(
+    uid: str,
+    audio_path: str,
+    avatar_path: str,
+    timestamps: List[float],
+    output_path: str,
+    publish: Callable[[List[dict]], Awaitable[None]],
+    duration: Optional[float] = None,
+    concurrency: int = SEGMENT_CONCURRENCY,
+) -> List[dict]:
+    """Render ``uid`` segment by segment and concat the result.
+
+    ``publish`` receives the full list of segment records whenever one of
+    them changes state, so callers can expose partial progress.
+    """
+
+    segments = plan_segments(timestamps, duration)
+    for seg in segments:
+        seg.update(status="queued", video=None, attempts=0)
+    await publish(segments)
+
+    semaphore = asyncio.Semaphore(concurrency)
+    out_dir = os.path.dirname(output_path) or "."
+    work_dir = os.path.dirname(audio_path) or "."
+
+    async def render(seg: dict) -> None:
+        seg_video = os.path.join(out_dir, f"seg_{seg['index'] + 1}.mp4")
+        seg_audio = os.path.join(work_dir, f"seg_{seg['index'] + 1}.wav")
+        async with semaphore:
+            try:
+                await asyncio.to_thread(split_audio, audio_path, seg, seg_audio)
+                for attempt in range(1, SEGMENT_RETRIES + 2):
+                    seg.update(status="rendering", attempts=attempt)
+                    await publish(segments)
+                    try:
+                        await run_musetalk(seg_audio, avatar_path, seg_video)
+                        break
+                    except Exception as exc:
+                        if attempt > SEGMENT_RETRIES:
+                            seg.update(status="failed", error=str(exc))
+                            await publish(segments)
+                            raise
+                        log.warning("Segment %d of %s failed (%s); retrying", seg["index"] + 1, uid, exc)
+                        await asyncio.sleep(2 ** attempt + random.random())
+            finally:
+                await asyncio.to_thread(_remove, seg_audio)
+        seg.update(status="done", video=seg_video)
+        await publish(segments)
+
+    # One failed segment fails the lecture: stop the others rather than
+    # keep paying for renders nobody will see
+    tasks = [asyncio.create_task(render(seg)) for seg in segments]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+    await asyncio.to_thread(
+        concat_videos, [seg["video"] for seg in segments], output_path
+    )
+    return segments
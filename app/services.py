@@ -0,0 +1,79 @@
+"""Lazy accessors for heavy third-party clients.
+
+``openai``, ``requests`` and ``fal_client`` (with its realtime submodule) are
+slow to import and many instances never need all of them, e.g. one that only
+serves the static player.  They are imported on first use through these
+accessors, which also record the import time in the startup profile.
+:func:`warm_up` imports them ahead of time from a background thread so the
+first request that needs one does not pay for it.
+"""
+
+from types import ModuleType
+from typing import Optional
+
+import importlib
+import logging
+import threading
+import time
+
+try:  # package style
+    from app.startup import startup_profile  # type: ignore
+except ImportError:
+    from startup import startup_profile  # type: ignore
+
+log = logging.getLogger(__name__)
+
+
+_lock = threading.Lock()
+_missing = object()
+_modules: dict = {}
+
+
+def _load(name: str, optional: bool = False) -> Optional[ModuleType]:
+    module = _modules.get(name, _missing)
+    if module is not _missing:
+        return module
+    with _lock:
+        module = _modules.get(name, _missing)
+        if module is _missing:
+            start = time.perf_counter()
+            try:
+                module = importlib.import_module(name)
+            except Exception:
+                if not optional:
+                    raise
+                module = None
+            startup_profile.record(f"import {name}", time.perf_counter() - start)
+            _modules[name] = module
+    return module
+
+
+def get_fal_client() -> ModuleType:
+    return _load("fal_client")
+
+
+def get_fal_realtime():
+    """``fal_client.realtime`` as ``from fal_client import realtime`` resolves
+    it (submodule or attribute), or ``None`` if unavailable."""
+
+    fal_client = get_fal_client()
+    module = _load("fal_client.realtime", optional=True)
+    return module if module is not None else getattr(fal_client, "realtime", None)
+
+
+def get_openai() -> ModuleType:
+    return _load("openai")
+
+
+def get_requests() -> ModuleType:
+    return _load("requests")
+
+
+def warm_up() -> None:
+    """Import every heavy dependency; meant to run off the event loop."""
+
+    for loader in (get_requests, get_openai, get_fal_client, get_fal_realtime):
+        try:
+            loader()
+        except Exception as exc:  # best-effort
+            log.warning("Background import failed: %s", exc)
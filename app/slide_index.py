@@ -0,0 +1,187 @@
+"""Slide text per class and a BM25 index over it for chat prompts.
+
+Chat answers used to see only the ``slide_text`` the browser sent: nothing
+for PDF uploads, and whole decks' worth for some clients, which slows the
+completion down.  The text of every page is now extracted once at upload
+(``slides_text.json`` in the class directory) and split into short passages
+with a BM25 index.  A chat prompt gets the current slide's text, cut to
+``CHAT_SLIDE_CHARS``, plus the ``CHAT_CONTEXT_K`` passages from other slides
+that best match the question, each at most ``CHAT_PASSAGE_CHARS``.  Its size
+therefore stays bounded whatever the deck or client sends.  Indexes of the
+``SLIDE_INDEX_CACHE_SIZE`` most recently chatted-with classes stay in memory.
+"""
+
+from collections import Counter, OrderedDict
+from typing import List, Optional, Tuple
+
+import json
+import logging
+import math
+import os
+import re
+import threading
+
+try:  # package style
+    from app.slides import extract_text  # type: ignore
+    from app.storage import ClassStorage, storage  # type: ignore
+except ImportError:
+    from slides import extract_text  # type: ignore
+    from storage import ClassStorage, storage  # type: ignore
+
+log = logging.getLogger(__name__)
+
+CHAT_SLIDE_CHARS = int(os.environ.get("CHAT_SLIDE_CHARS", "1500"))
+CHAT_CONTEXT_K = int(os.environ.get("CHAT_CONTEXT_K", "3"))
+CHAT_PASSAGE_CHARS = int(os.environ.get("CHAT_PASSAGE_CHARS", "400"))
+PASSAGE_WORDS = 60
+SLIDE_INDEX_CACHE_SIZE = int(os.environ.get("SLIDE_INDEX_CACHE_SIZE", "256"))
+
+_TOKEN = re.compile(r"\w+")
+_STOPWORDS = frozenset(
+    "a an and are as at be but by can could do does for from how i in is it its me my "
+    "of on or please slide that the this to was what when where which who why will "
+    "with would you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN.findall(text.lower()) if t not in _STOPWORDS]
+
+
+def _truncate(text: str, limit: int) -> str:
+    if len(text) <= limit:
+        return text
+    cut = text[:limit].rsplit(" ", 1)[0]
+    return cut + " ..."
+
+
+class BM25:
+    """Okapi BM25 over pre-tokenized documents."""
+
+    def __init__(self, docs: List[List[str]], k1: float = 1.5, b: float = 0.75) -> None:
+        self.k1 = k1
+        self.b = b
+        self.tf = [Counter(doc) for doc in docs]
+        self.lengths = [len(doc) for doc in docs]
+        self.avg_length = sum(self.lengths) / len(docs) if docs else 0.0
+        df: Counter = Counter()
+        for counts in self.tf:
+            df.update(counts.keys())
+        n = len(docs)
+        self.idf = {term: math.log(1 + (n - f + 0.5) / (f + 0.5)) for term, f in df.items()}
+
+    def scores(self, query: List[str]) -> List[float]:
+        terms = [t for t in set(query) if t in self.idf]
+        result = []
+        for counts, length in zip(self.tf, self.lengths):
+            norm = self.k1 * (1 - self.b + self.b * length / (self.avg_length or 1))
+            score = 0.0
+            for term in terms:
+                f = counts.get(term)
+                if f:
+                    score += self.idf[term] * f * (self.k1 + 1) / (f + norm)
+            result.append(score)
+        return result
+
+
+class SlideIndex:
+    """The pages of one deck, split into passages of ``PASSAGE_WORDS`` words."""
+
+    def __init__(self, pages: List[str], passage_words: int = PASSAGE_WORDS) -> None:
+        self.pages = pages
+        self.passages: List[Tuple[int, str]] = []
+        for number, text in enumerate(pages, start=1):
+            words = text.split()
+            for i in range(0, len(words), passage_words):
+                self.passages.append((number, " ".join(words[i:i + passage_words])))
+        self._bm25 = BM25([tokenize(text) for _, text in self.passages])
+
+    def page(self, number: int) -> str:
+        return self.pages[number - 1] if 1 <= number <= len(self.pages) else ""
+
+    def search(self, query: str, k: int, exclude_page: Optional[int] = None) -> List[Tuple[int, str]]:
+        """The ``k`` best passages for ``query`` as ``(page, text)``, best
+        first, at most one per page."""
+
+        scores = self._bm25.scores(tokenize(query))
+        ranked = sorted(range(len(scores)), key=scores.__getitem__, reverse=True)
+        hits = []
+        seen = {exclude_page}
+        for i in ranked:
+            if len(hits) >= k or scores[i] <= 0:
+                break
+            page = self.passages[i][0]
+            if page not in seen:
+                seen.add(page)
+                hits.append(self.passages[i])
+        return hits
+
+
+class SlideTexts:
+    """Extracted slide text of every class, indexed on first use."""
+
+    def __init__(self, store: ClassStorage, max_entries: int = SLIDE_INDEX_CACHE_SIZE) -> None:
+        self.store = store
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._indexes: "OrderedDict[str, Tuple[float, SlideIndex]]" = OrderedDict()
+
+    def build(self, uid: str, pdf_path: str) -> str:
+        """Extract the text of ``pdf_path`` for ``uid``; returns the JSON path."""
+
+        pages = extract_text(pdf_path)
+        path = self.store.input_path(uid, "slides_text.json")
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(pages, f)
+        os.replace(tmp, path)
+        self.store.register(uid, "slides_text", path)
+        log.info("Extracted text of %d slides", len(pages), extra={"uid": uid})
+        return path
+
+    def index(self, uid: str) -> Optional[SlideIndex]:
+        entry = self.store.find(uid, "slides_text")
+        if entry is None:
+            return None
+        try:
+            mtime = os.path.getmtime(entry["path"])
+        except OSError:
+            return None
+        with self._lock:
+            cached = self._indexes.get(uid)
+            if cached is not None and cached[0] == mtime:
+                self._indexes.move_to_end(uid)
+                return cached[1]
+        with open(entry["path"]) as f:
+            index = SlideIndex(json.load(f))
+        with self._lock:
+            self._indexes[uid] = (mtime, index)
+            self._indexes.move_to_end(uid)
+            while len(self._indexes) > self.max_entries:
+                self._indexes.popitem(last=False)
+        return index
+
+    def context(self, uid: str, slide_index: int, question: str,
+                client_text: Optional[str] = None) -> Tuple[str, List[Tuple[int, str]]]:
+        """Bounded prompt context: the current slide's text and related passages.
+
+        The extracted text wins over ``client_text``, which is only used (cut
+        to the same limit) for classes without a PDF.
+        """
+
+        index = self.index(uid)
+        current = (index.page(slide_index) if index else "") or client_text or ""
+        related: List[Tuple[int, str]] = []
+        if index is not None and CHAT_CONTEXT_K > 0:
+            # Generic questions ("explain this again") match nothing; fall
+            # back to passages about what the current slide covers.
+            related = index.search(question, CHAT_CONTEXT_K, exclude_page=slide_index)
+            if not related and current:
+                related = index.search(current, CHAT_CONTEXT_K, exclude_page=slide_index)
+        return (
+            _truncate(current, CHAT_SLIDE_CHARS),
+            [(page, _truncate(text, CHAT_PASSAGE_CHARS)) for page, text in related],
+        )
+
+
+slide_texts = SlideTexts(storage)
@@ -0,0 +1,254 @@
+"""Parallel rasterization and text extraction of slide PDFs.
+
+``pdf2image.convert_from_path`` on a whole deck decodes every page into an
+in-memory PIL image on a single core.  Here each page is rendered by its own
+``pdftoppm`` call straight into a scratch folder on disk, with a pool of
+threads keeping one poppler process per core busy.  Finished pages are renamed
+to ``slide_{n}.png`` in the class directory so nothing is held in memory.
+The text of every page comes from a single ``pdftotext`` run.
+
+A 200 DPI PNG is several hundred kilobytes, which a classroom of phones on
+one access point downloads for every slide.  Each page is therefore also
+encoded, by the same worker, to WebP and AVIF at the ``SLIDE_WIDTHS`` that
+fit the page plus a ``SLIDE_THUMB_WIDTH`` thumbnail.  Variant names carry a
+hash of their content (``slide_3_960w.0123456789ab.webp``) so they can be
+served as immutable and a re-rendered slide gets new URLs.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+import hashlib
+import logging
+import os
+import re
+import shutil
+import tempfile
+import time
+
+try:  # package style
+    from app.metrics import observe_stage  # type: ignore
+except ImportError:
+    from metrics import observe_stage  # type: ignore
+
+log = logging.getLogger(__name__)
+
+SLIDE_DPI = int(os.environ.get("SLIDE_DPI", "200"))
+SLIDE_MAX_PAGES = int(os.environ.get("SLIDE_MAX_PAGES", "300"))
+SLIDE_WORKERS = int(os.environ.get("SLIDE_WORKERS", str(os.cpu_count() or 2)))
+SLIDE_WIDTHS = tuple(
+    int(w) for w in os.environ.get("SLIDE_WIDTHS", "480,960,1600").split(",") if w.strip()
+)
+SLIDE_THUMB_WIDTH = int(os.environ.get("SLIDE_THUMB_WIDTH", "240"))
+SLIDE_FORMATS = tuple(
+    f.strip() for f in os.environ.get("SLIDE_FORMATS", "avif,webp").split(",") if f.strip()
+)
+# Encoder settings per format; AVIF reaches the same look at a lower
+# quality, and speed 8 encodes about 3x faster than the default for ~10% more bytes.
+_SAVE_OPTIONS = {"webp": {"quality": 80}, "avif": {"quality": 60, "speed": 8}}
+
+
+class SlideConversionError(RuntimeError):
+    """Raised when a slide deck cannot be rendered to images."""
+
+VARIANT_NAME = re.compile(r"^slide_(\d+)_(\d+w|thumb)\.([0-9a-f]{12})\.(webp|avif)$")
+
+
+def slide_filename(page: int) -> str:
+    return f"slide_{page}.png"
+
+
+def _supported_formats() -> tuple:
+    from PIL import features
+
+    return tuple(f for f in SLIDE_FORMATS if f in _SAVE_OPTIONS and features.check(f))
+
+
+def encode_variants(png_path: str, page: int, out_dir: str) -> List[dict]:
+    """Write the resized WebP/AVIF copies and thumbnail of one slide.
+
+    Returns one ``{"path", "width", "format", "thumb"}`` record per file.
+    Widths wider than the page are skipped (the page's own width is used
+    instead) and older variants of the page are deleted.
+    """
+
+    from PIL import Image
+
+    start = time.perf_counter()
+    formats = _supported_formats()
+    with Image.open(png_path) as src:
+        img = src.convert("RGB")
+    widths = {w for w in SLIDE_WIDTHS if w < img.width} | {min(img.width, max(SLIDE_WIDTHS))}
+    jobs = [(w, fmt, False) for w in sorted(widths, reverse=True) for fmt in formats]
+    if formats:
+        # One thumbnail is enough; every browser with AVIF also has WebP
+        jobs.append((min(SLIDE_THUMB_WIDTH, img.width), "webp" if "webp" in formats else formats[0], True))
+
+    results = []
+    resized = img
+    for width, fmt, thumb in jobs:
+        # Widest first, each size scaled down from the previous one
+        if width != resized.width:
+            resized = resized.resize(
+                (width, max(1, round(img.height * width / img.width))), Image.LANCZOS
+            )
+        tmp = os.path.join(out_dir, f".slide_{page}_{width}.{fmt}.tmp")
+        resized.save(tmp, fmt.upper(), **_SAVE_OPTIONS[fmt])
+        with open(tmp, "rb") as f:
+            digest = hashlib.sha256(f.read()).hexdigest()[:12]
+        label = "thumb" if thumb else f"{width}w"
+        path = os.path.join(out_dir, f"slide_{page}_{label}.{digest}.{fmt}")
+        os.replace(tmp, path)
+        results.append({"path": path, "width": width, "format": fmt, "thumb": thumb})
+
+    keep = {os.path.basename(r["path"]) for r in results}
+    for name in os.listdir(out_dir):
+        match = VARIANT_NAME.match(name)
+        if match and int(match.group(1)) == page and name not in keep:
+            os.remove(os.path.join(out_dir, name))
+    observe_stage("encode_variants", time.perf_counter() - start)
+    return results
+
+
+def parse_variant(name: str) -> Optional[dict]:
+    """``{"page", "width", "format", "thumb"}`` from a variant file name."""
+
+    match = VARIANT_NAME.match(name)
+    if match is None:
+        return None
+    label = match.group(2)
+    return {
+        "page": int(match.group(1)),
+        "width": None if label == "thumb" else int(label[:-1]),
+        "format": match.group(4),
+        "thumb": label == "thumb",
+    }
+
+
+def rasterize_pdf(
+    pdf_path: str,
+    out_dir: str,
+    dpi: int = SLIDE_DPI,
+    max_pages: int = SLIDE_MAX_PAGES,
+    workers: Optional[int] = None,
+) -> List[dict]:
+    """Render the pages of ``pdf_path`` to PNG files in ``out_dir``.
+
+    Returns one ``{"page", "path", "variants", "seconds"}`` record per
+    rendered page, in page order, ``variants`` as from
+    :func:`encode_variants`.  At most ``max_pages`` pages are rendered.
+    """
+
+    from pdf2image import convert_from_path, pdfinfo_from_path
+
+    pages = int(pdfinfo_from_path(pdf_path)["Pages"])
+    if pages > max_pages:
+        log.warning("%s has %d pages; rendering the first %d", pdf_path, pages, max_pages)
+        pages = max_pages
+
+    os.makedirs(out_dir, exist_ok=True)
+    scratch = tempfile.mkdtemp(prefix=".slides_", dir=out_dir)
+
+    def render(page: int) -> dict:
+        start = time.perf_counter()
+        # pdf2image returns every file in the folder whose name starts with
+        # ``output_file``, so pages must not share a folder (page_1 would
+        # also pick up page_10 ... page_19)
+        (tmp_path,) = convert_from_path(
+            pdf_path,
+            dpi=dpi,
+            first_page=page,
+            last_page=page,
+            fmt="png",
+            output_folder=tempfile.mkdtemp(dir=scratch),
+            output_file=f"page_{page}",
+            single_file=True,
+            paths_only=True,
+        )
+        path = os.path.join(out_dir, slide_filename(page))
+        os.replace(tmp_path, path)
+        try:
+            variants = encode_variants(path, page, out_dir)
+        except Exception as exc:
+            # The PNG still works; players fall back to it
+            log.warning("Encoding variants of page %d failed: %s", page, exc)
+            variants = []
+        return {
+            "page": page,
+            "path": path,
+            "variants": variants,
+            "seconds": round(time.perf_counter() - start, 3),
+        }
+
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=workers or SLIDE_WORKERS) as pool:
+            results = list(pool.map(render, range(1, pages + 1)))
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    elapsed = time.perf_counter() - start
+    observe_stage("rasterize", elapsed)
+    log.info(
+        "Rasterized %d pages of %s",
+        len(results),
+        pdf_path,
+        extra={
+            "dpi": dpi,
+            "seconds": round(elapsed, 3),
+            "slowest_page": max((r["seconds"] for r in results), default=0.0),
+        },
+    )
+    return results
+
+
+def extract_text(pdf_path: str, max_pages: int = SLIDE_MAX_PAGES) -> List[str]:
+    """Return the text of each page of ``pdf_path``, whitespace collapsed.
+
+    ``pdftotext`` ends every page with a form feed, so one run over the deck
+    splits back into pages; a page without text gives an empty string.
+    """
+
+    import subprocess
+
+    start = time.perf_counter()
+    out = subprocess.run(
+        ["pdftotext", "-enc", "UTF-8", "-l", str(max_pages), pdf_path, "-"],
+        check=True,
+        capture_output=True,
+    ).stdout.decode("utf-8", "replace")
+    pages = out.split("\f")
+    if out.endswith("\f"):
+        pages.pop()
+    observe_stage("extract_text", time.perf_counter() - start)
+    return [" ".join(page.split()) for page in pages]
+
+
+# Seeks per ffmpeg process when grabbing slide frames from a video.
+FRAME_BATCH = 16
+
+
+def extract_frames(video_path: str, times: List[float], out_paths: List[str],
+                   workers: Optional[int] = None) -> None:
+    """Grab one frame per timestamp from ``video_path``.
+
+    Frames are taken in batches: a single ``ffmpeg`` process opens the video
+    once per timestamp with a fast input seek and writes every frame of its
+    batch, and batches run on a bounded thread pool.
+    """
+
+    import subprocess
+
+    pairs = list(zip(times, out_paths))
+    batches = [pairs[i:i + FRAME_BATCH] for i in range(0, len(pairs), FRAME_BATCH)]
+
+    def run(batch: list) -> None:
+        cmd = ["ffmpeg", "-y", "-v", "error"]
+        for t, _ in batch:
+            cmd += ["-ss", str(t), "-i", video_path]
+        for i, (_, path) in enumerate(batch):
+            cmd += ["-map", f"{i}:v:0", "-frames:v", "1", path]
+        subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    with ThreadPoolExecutor(max_workers=workers or SLIDE_WORKERS) as pool:
+        list(pool.map(run, batches))
@@ -0,0 +1,67 @@
+"""Cold-start profile of the app.
+
+On scale-to-zero platforms every second spent importing modules or running
+startup hooks lands on the first request.  :data:`startup_profile` collects
+how long each phase took (module imports, app initialisation, individual
+startup hooks and lazily imported dependencies) so the numbers can be logged
+at startup, read from ``GET /startup`` and compared between releases.
+"""
+
+from contextlib import contextmanager
+from typing import Dict
+
+import functools
+import threading
+import time
+
+# Taken when the app package is first imported, i.e. close to process start.
+PROCESS_START = time.perf_counter()
+
+
+class StartupProfile:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.entries: Dict[str, float] = {}
+        self.ready_after = None
+
+    def record(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self.entries[name] = round(seconds, 4)
+
+    @contextmanager
+    def measure(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def timed(self, name: str):
+        """Decorator recording how long an async startup hook takes."""
+
+        def decorator(fn):
+            @functools.wraps(fn)
+            async def wrapper(*args, **kwargs):
+                with self.measure(name):
+                    return await fn(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def mark_ready(self, since: float = PROCESS_START) -> None:
+        """Record the time to readiness, counted from ``since``."""
+
+        self.ready_after = round(time.perf_counter() - since, 4)
+
+    def report(self) -> dict:
+        with self._lock:
+            return {"ready_after": self.ready_after, "phases": dict(self.entries)}
+
+    def summary(self) -> str:
+        report = self.report()
+        phases = ", ".join(f"{name} {secs:.3f}s" for name, secs in report["phases"].items())
+        return f"Startup ready after {report['ready_after']}s ({phases})"
+
+
+startup_profile = StartupProfile()
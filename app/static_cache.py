@@ -0,0 +1,36 @@
+"""``StaticFiles`` mount that adds a ``Cache-Control`` header.
+
+Starlette already answers conditional requests (``ETag`` and
+``Last-Modified``); this only tells browsers and CDNs how long they may
+reuse a response without asking again.  ``cache_control`` may be a function
+of the path, for mounts mixing content-hashed and mutable files.  An optional
+``on_access`` callback is told the path of every file served, e.g. to track
+what is still in use.
+"""
+
+from typing import Callable, Optional, Union
+
+from starlette.staticfiles import StaticFiles
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+# Reusable, but only after checking the ETag with the server.
+REVALIDATE = "no-cache"
+
+
+class CachedStaticFiles(StaticFiles):
+    def __init__(self, *args, cache_control: Union[str, Callable[[str], str]] = IMMUTABLE,
+                 on_access: Optional[Callable[[str], None]] = None, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.cache_control = cache_control
+        self.on_access = on_access
+
+    async def get_response(self, path: str, scope):
+        response = await super().get_response(path, scope)
+        if response.status_code in (200, 206, 304):
+            cache_control = self.cache_control
+            response.headers["Cache-Control"] = (
+                cache_control if isinstance(cache_control, str) else cache_control(path)
+            )
+            if self.on_access is not None:
+                self.on_access(path)
+        return response
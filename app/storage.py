@@ -0,0 +1,464 @@
+"""Per-class storage layout with a SQLite metadata index.
+
+Every artifact of a class lives in one of two directories:
+
+* ``uploads/{uid}/`` -- the uploaded inputs (``audio.wav``, ``avatar.*``,
+  ``timestamps.json``, ``slides.pdf``, ``slides_id.txt``), the rasterized
+  ``slide_{n}.png`` images and their content-hashed WebP/AVIF variants, the
+  extracted ``slides_text.json`` and ``manifest.json``;
+* ``outputs/{uid}/`` -- rendered media (``lecture.mp4`` and its
+  ``lecture_hls/`` rendition, ``qa_*.mp4`` answers, ``warm_*.mp4``
+  pre-generated answers, ``seg_{n}.mp4`` pieces of a segmented render),
+  cached by clients as described in ``delivery``.
+
+Each artifact is recorded in ``STORAGE_DB`` with its kind, media type, size
+and SHA-256, so a question such as "where is this class's avatar" is a single
+indexed query instead of an ``os.path.exists`` per candidate name.
+
+Classes created before this layout used flat ``uploads/{uid}_*`` and
+``outputs/{uid}*`` names.  They are moved into their directories and indexed
+the first time they are looked up.
+"""
+
+from typing import Dict, List, Optional, Tuple
+
+import logging
+import mimetypes
+import os
+import re
+import shutil
+import sqlite3
+import threading
+import time
+
+try:  # package style
+    from app.hashing import sha256_file  # type: ignore
+except ImportError:
+    from hashing import sha256_file  # type: ignore
+
+log = logging.getLogger(__name__)
+
+UPLOAD_DIR = "uploads"
+OUTPUT_DIR = "outputs"
+STORAGE_DB = os.environ.get("STORAGE_DB", "classes.db")
+
+LECTURE_VIDEO = "lecture.mp4"
+
+_UID = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS classes (
+    uid TEXT PRIMARY KEY,
+    created_at REAL NOT NULL,
+    last_access REAL
+);
+CREATE TABLE IF NOT EXISTS artifacts (
+    uid TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    path TEXT NOT NULL,
+    position INTEGER,
+    media_type TEXT,
+    size INTEGER NOT NULL,
+    sha256 TEXT,
+    created_at REAL NOT NULL,
+    last_access REAL,
+    PRIMARY KEY (uid, path)
+);
+CREATE INDEX IF NOT EXISTS artifacts_by_kind ON artifacts (uid, kind, position);
+"""
+
+# Columns added after the first release of the schema.
+_MIGRATIONS = [
+    ("classes", "last_access", "REAL"),
+    ("artifacts", "last_access", "REAL"),
+]
+
+# File names in a class directory that the index knows about, and their kind;
+# a captured number is the artifact's position (slide or segment number).
+# Anything else (manifest, scratch files) is not indexed.
+_INPUT_NAMES: List[Tuple[re.Pattern, str]] = [
+    (re.compile(r"^audio\.\w+$"), "audio"),
+    (re.compile(r"^avatar\.\w+$"), "avatar"),
+    (re.compile(r"^timestamps\.json$"), "timestamps"),
+    (re.compile(r"^slides\.pdf$"), "slides_pdf"),
+    (re.compile(r"^slides_id\.txt$"), "slides_id"),
+    (re.compile(r"^slides_text\.json$"), "slides_text"),
+    (re.compile(r"^slide_(\d+)\.png$"), "slide"),
+    (re.compile(r"^slide_(\d+)_(?:\d+w|thumb)\.[0-9a-f]{12}\.(?:webp|avif)$"), "slide_variant"),
+]
+_OUTPUT_NAMES: List[Tuple[re.Pattern, str]] = [
+    (re.compile(r"^lecture\.mp4$"), "video"),
+    (re.compile(r"^lecture_hls$"), "hls"),
+    (re.compile(r"^qa_\w+\.mp4$"), "qa_clip"),
+    (re.compile(r"^warm_\w+\.mp4$"), "warm_clip"),
+    (re.compile(r"^seg_(\d+)\.mp4$"), "segment"),
+    (re.compile(r"^stream\.mp4$"), "stream"),
+]
+# Files of the old layout that are moved but not indexed.
+_INPUT_EXTRA = {"manifest.json", "prepare.json"}
+_OUTPUT_EXTRA: set = set()
+
+
+def _classify(name: str, patterns) -> Optional[Tuple[str, Optional[int]]]:
+    for pattern, kind in patterns:
+        match = pattern.match(name)
+        if match:
+            return kind, int(match.group(1)) if match.groups() else None
+    return None
+
+
+def _size(path: str) -> int:
+    if os.path.isdir(path):
+        return sum(
+            os.path.getsize(os.path.join(root, name))
+            for root, _, names in os.walk(path)
+            for name in names
+        )
+    return os.path.getsize(path)
+
+
+def _unshared_size(path: str) -> int:
+    """Bytes deleting ``path`` gives back: files with other hard links (a
+    render cache entry, a file shared by a bulk ingest) stay on disk."""
+
+    if os.path.isdir(path):
+        files = [os.path.join(root, name) for root, _, names in os.walk(path) for name in names]
+    else:
+        files = [path]
+    total = 0
+    for name in files:
+        try:
+            st = os.lstat(name)
+        except FileNotFoundError:
+            continue
+        if st.st_nlink == 1:
+            total += st.st_size
+    return total
+
+
+class ClassStorage:
+    """Paths and artifact index for every class."""
+
+    def __init__(self, db_path: str = STORAGE_DB, upload_dir: str = UPLOAD_DIR,
+                 output_dir: str = OUTPUT_DIR) -> None:
+        self.db_path = db_path
+        self.upload_dir = upload_dir
+        self.output_dir = output_dir
+        self._local = threading.local()
+        self._adopt_lock = threading.Lock()
+
+    # -- database -------------------------------------------------------
+
+    def _db(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            for table, column, decl in _MIGRATIONS:
+                columns = {row["name"] for row in conn.execute(f"PRAGMA table_info({table})")}
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+            self._local.conn = conn
+        return conn
+
+    # -- layout ---------------------------------------------------------
+
+    @staticmethod
+    def valid_uid(uid: str) -> bool:
+        return bool(_UID.match(uid))
+
+    def class_dir(self, uid: str) -> str:
+        return os.path.join(self.upload_dir, uid)
+
+    def media_dir(self, uid: str) -> str:
+        return os.path.join(self.output_dir, uid)
+
+    def input_path(self, uid: str, name: str) -> str:
+        os.makedirs(self.class_dir(uid), exist_ok=True)
+        return os.path.join(self.class_dir(uid), name)
+
+    def output_path(self, uid: str, name: str) -> str:
+        os.makedirs(self.media_dir(uid), exist_ok=True)
+        return os.path.join(self.media_dir(uid), name)
+
+    @staticmethod
+    def url(path: str) -> str:
+        """URL under which the static mounts serve ``path``."""
+
+        return "/" + path.replace(os.sep, "/")
+
+    def output_name(self, path: str) -> str:
+        """``path`` relative to ``/outputs``, as sent to the player."""
+
+        return os.path.relpath(path, self.output_dir).replace(os.sep, "/")
+
+    # -- index ----------------------------------------------------------
+
+    def create_class(self, uid: str) -> None:
+        now = time.time()
+        self._db().execute(
+            "INSERT OR IGNORE INTO classes (uid, created_at, last_access) VALUES (?, ?, ?)",
+            (uid, now, now),
+        )
+
+    def has_class(self, uid: str) -> bool:
+        row = self._db().execute("SELECT 1 FROM classes WHERE uid = ?", (uid,)).fetchone()
+        return row is not None
+
+    def register(self, uid: str, kind: str, path: str, sha256: Optional[str] = None,
+                 position: Optional[int] = None, media_type: Optional[str] = None) -> dict:
+        """Record ``path`` as an artifact of ``uid``; replaces an earlier entry.
+
+        The file is hashed unless ``sha256`` is given (directories are not),
+        so call this off the event loop for large files.
+        """
+
+        if sha256 is None and os.path.isfile(path):
+            sha256 = sha256_file(path)
+        entry = {
+            "uid": uid,
+            "kind": kind,
+            "path": path,
+            "position": position,
+            "media_type": media_type or mimetypes.guess_type(path)[0],
+            "size": _size(path),
+            "sha256": sha256,
+            "created_at": time.time(),
+        }
+        entry["last_access"] = entry["created_at"]
+        db = self._db()
+        db.execute(
+            "INSERT OR IGNORE INTO classes (uid, created_at, last_access) VALUES (?, ?, ?)",
+            (uid, entry["created_at"], entry["created_at"]),
+        )
+        db.execute(
+            "INSERT OR REPLACE INTO artifacts"
+            " (uid, kind, path, position, media_type, size, sha256, created_at, last_access)"
+            " VALUES (:uid, :kind, :path, :position, :media_type, :size, :sha256,"
+            " :created_at, :last_access)",
+            entry,
+        )
+        return entry
+
+    def unregister(self, uid: str, path: str) -> None:
+        self._db().execute("DELETE FROM artifacts WHERE uid = ? AND path = ?", (uid, path))
+
+    def find(self, uid: str, kind: str) -> Optional[dict]:
+        """The most recent artifact of ``kind`` for ``uid``, or ``None``."""
+
+        if not self._ensure(uid):
+            return None
+        row = self._db().execute(
+            "SELECT * FROM artifacts WHERE uid = ? AND kind = ?"
+            " ORDER BY created_at DESC LIMIT 1",
+            (uid, kind),
+        ).fetchone()
+        return dict(row) if row else None
+
+    def list(self, uid: str, kind: Optional[str] = None) -> List[dict]:
+        """Artifacts of ``uid`` (optionally of one ``kind``) in position order."""
+
+        if not self._ensure(uid):
+            return []
+        query = "SELECT * FROM artifacts WHERE uid = ?"
+        args: tuple = (uid,)
+        if kind is not None:
+            query += " AND kind = ?"
+            args += (kind,)
+        query += " ORDER BY kind, position, created_at"
+        return [dict(row) for row in self._db().execute(query, args)]
+
+    # -- retention --------------------------------------------------------
+
+    def record_access(self, classes: Dict[str, float],
+                      paths: Dict[Tuple[str, str], float]) -> None:
+        """Store access times collected since the last call in one transaction.
+
+        ``paths`` is keyed by ``(uid, path)``, the artifacts' primary key.
+        """
+
+        db = self._db()
+        with db:
+            db.execute("BEGIN")
+            db.executemany(
+                "UPDATE classes SET last_access = MAX(COALESCE(last_access, 0), ?) WHERE uid = ?",
+                [(at, uid) for uid, at in classes.items()],
+            )
+            db.executemany(
+                "UPDATE artifacts SET last_access = MAX(COALESCE(last_access, 0), ?)"
+                " WHERE uid = ? AND path = ?",
+                [(at, uid, path) for (uid, path), at in paths.items()],
+            )
+
+    def total_size(self) -> int:
+        row = self._db().execute("SELECT COALESCE(SUM(size), 0) FROM artifacts").fetchone()
+        return int(row[0])
+
+    def least_recent(self, kinds: Tuple[str, ...], limit: int,
+                     requires: Optional[str] = None) -> List[dict]:
+        """Artifacts of ``kinds`` across all classes, least recently used first.
+
+        With ``requires``, only classes that also have an artifact of that
+        kind are considered.
+        """
+
+        marks = ",".join("?" for _ in kinds)
+        query = f"SELECT * FROM artifacts WHERE kind IN ({marks})"
+        args: tuple = kinds
+        if requires is not None:
+            query += (
+                " AND EXISTS (SELECT 1 FROM artifacts AS other"
+                " WHERE other.uid = artifacts.uid AND other.kind = ?)"
+            )
+            args += (requires,)
+        rows = self._db().execute(
+            query + " ORDER BY COALESCE(last_access, created_at) LIMIT ?", (*args, limit)
+        )
+        return [dict(row) for row in rows]
+
+    def idle_classes(self, before: float, limit: int) -> List[str]:
+        """Classes not accessed since ``before``, oldest first."""
+
+        rows = self._db().execute(
+            "SELECT uid FROM classes WHERE COALESCE(last_access, created_at) < ?"
+            " ORDER BY COALESCE(last_access, created_at) LIMIT ?",
+            (before, limit),
+        )
+        return [row["uid"] for row in rows]
+
+    def remove(self, entry: dict) -> int:
+        """Delete an artifact's file and index entry; returns the bytes freed."""
+
+        path = entry["path"]
+        freed = _unshared_size(path)
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        self.unregister(entry["uid"], path)
+        return freed
+
+    def remove_class(self, uid: str) -> int:
+        """Delete both directories of ``uid`` and its index entries; returns
+        the bytes freed."""
+
+        db = self._db()
+        freed = 0
+        for directory in (self.class_dir(uid), self.media_dir(uid)):
+            freed += _unshared_size(directory)
+            shutil.rmtree(directory, ignore_errors=True)
+        with db:
+            db.execute("BEGIN")
+            db.execute("DELETE FROM artifacts WHERE uid = ?", (uid,))
+            db.execute("DELETE FROM classes WHERE uid = ?", (uid,))
+        return freed
+
+    # -- classes from older layouts ----------------------------------------
+
+    def _ensure(self, uid: str) -> bool:
+        if not self.valid_uid(uid):
+            return False
+        if self.has_class(uid):
+            return True
+        self.adopt_legacy(uid)
+        return self.has_class(uid)
+
+    def adopt_legacy(self, uid: str) -> Dict[str, str]:
+        """Move flat ``{uid}_*`` files into the class directories and index
+        everything found there.  Returns the old -> new path of moved files."""
+
+        moved: Dict[str, str] = {}
+        if not self.valid_uid(uid) or not self._has_files(uid):
+            return moved
+        with self._adopt_lock:
+            for root, to_name in (
+                (self.upload_dir, self._legacy_input_name),
+                (self.output_dir, self._legacy_output_name),
+            ):
+                try:
+                    names = [n for n in os.listdir(root) if n.startswith(uid)]
+                except FileNotFoundError:
+                    continue
+                for name in names:
+                    new_name = to_name(uid, name)
+                    if new_name is None:
+                        continue
+                    old = os.path.join(root, name)
+                    new = os.path.join(root, uid, new_name)
+                    os.makedirs(os.path.dirname(new), exist_ok=True)
+                    if new_name == "manifest.json":
+                        # Holds the old URLs; it is rebuilt from the index
+                        os.remove(old)
+                        continue
+                    if os.path.isdir(new):
+                        shutil.rmtree(new)
+                    os.replace(old, new)
+                    moved[old] = new
+            self.scan(uid)
+        if moved:
+            log.info("Moved %d files of class %s into its directories", len(moved), uid)
+        return moved
+
+    def _has_files(self, uid: str) -> bool:
+        # Cheap checks first so unknown ids never list the flat directories
+        return any(
+            os.path.exists(path)
+            for path in (
+                os.path.join(self.upload_dir, f"{uid}_timestamps.json"),
+                os.path.join(self.upload_dir, f"{uid}_audio.wav"),
+                os.path.join(self.output_dir, f"{uid}.mp4"),
+                self.class_dir(uid),
+                self.media_dir(uid),
+            )
+        )
+
+    @staticmethod
+    def _legacy_input_name(uid: str, name: str) -> Optional[str]:
+        prefix = f"{uid}_"
+        if not name.startswith(prefix):
+            return None
+        rest = name[len(prefix):]
+        return rest if rest in _INPUT_EXTRA or _classify(rest, _INPUT_NAMES) else None
+
+    @staticmethod
+    def _legacy_output_name(uid: str, name: str) -> Optional[str]:
+        if name == f"{uid}.mp4":
+            return LECTURE_VIDEO
+        if name == f"{uid}_hls":
+            return "lecture_hls"
+        prefix = f"{uid}_"
+        if not name.startswith(prefix):
+            return None
+        rest = name[len(prefix):]
+        return rest if rest in _OUTPUT_EXTRA or _classify(rest, _OUTPUT_NAMES) else None
+
+    def scan(self, uid: str) -> int:
+        """Index the known files in ``uid``'s directories; returns the count."""
+
+        count = 0
+        for directory, patterns in (
+            (self.class_dir(uid), _INPUT_NAMES),
+            (self.media_dir(uid), _OUTPUT_NAMES),
+        ):
+            try:
+                names = sorted(os.listdir(directory))
+            except FileNotFoundError:
+                continue
+            for name in names:
+                match = _classify(name, patterns)
+                if match is None:
+                    continue
+                kind, position = match
+                self.register(uid, kind, os.path.join(directory, name), position=position)
+                count += 1
+        return count
+
+
+storage = ClassStorage()
@@ -0,0 +1,176 @@
+"""Text-to-speech service with pluggable engines and a content cache.
+
+Engines are plain blocking ``synthesize(text, path)`` implementations; the
+service runs them in a worker thread so the event loop keeps serving other
+requests.  Audio is stored under ``CACHE_DIR/tts`` named by a digest of the
+engine, voice and text, so every distinct answer gets its own file and a
+repeated answer is never synthesised twice.  The directory is kept under
+``TTS_CACHE_MAX_BYTES`` by dropping the least recently used audio.
+"""
+
+from typing import Dict, Type
+
+import asyncio
+import hashlib
+import os
+import shutil
+import subprocess
+import threading
+import uuid
+
+try:  # package style
+    from app import disk_cache  # type: ignore
+    from app.metrics import stage  # type: ignore
+    from app.upload_cache import CACHE_DIR  # type: ignore
+except ImportError:
+    import disk_cache  # type: ignore
+    from metrics import stage  # type: ignore
+    from upload_cache import CACHE_DIR  # type: ignore
+
+
+TTS_CACHE_DIR = os.path.join(CACHE_DIR, "tts")
+TTS_CACHE_MAX_BYTES = int(os.environ.get("TTS_CACHE_MAX_BYTES", str(1024 ** 3)))
+
+
+class TTSEngine:
+    """Base class for speech engines."""
+
+    name = "base"
+    extension = ".wav"
+
+    def __init__(self, voice: str = "") -> None:
+        self.voice = voice
+
+    def synthesize(self, text: str, path: str) -> None:
+        raise NotImplementedError
+
+
+class GTTSEngine(TTSEngine):
+    """Google Translate TTS (network, MP3 output)."""
+
+    name = "gtts"
+    extension = ".mp3"
+
+    def __init__(self, voice: str = "en") -> None:
+        super().__init__(voice or "en")
+
+    def synthesize(self, text: str, path: str) -> None:
+        from gtts import gTTS
+
+        gTTS(text, lang=self.voice).save(path)
+
+
+class EspeakEngine(TTSEngine):
+    """Local, offline synthesis through ``espeak-ng`` (or ``espeak``)."""
+
+    name = "espeak"
+    extension = ".wav"
+
+    def __init__(self, voice: str = "en") -> None:
+        super().__init__(voice or "en")
+        self.binary = shutil.which("espeak-ng") or shutil.which("espeak")
+
+    def synthesize(self, text: str, path: str) -> None:
+        if not self.binary:
+            raise RuntimeError("espeak-ng is not installed")
+        subprocess.run(
+            [self.binary, "-v", self.voice, "-w", path, text],
+            check=True,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+        )
+
+
+ENGINES: Dict[str, Type[TTSEngine]] = {
+    GTTSEngine.name: GTTSEngine,
+    EspeakEngine.name: EspeakEngine,
+}
+
+
+class TTSService:
+    def __init__(self, engine: TTSEngine, cache_dir: str = TTS_CACHE_DIR,
+                 max_bytes: int = TTS_CACHE_MAX_BYTES) -> None:
+        self.engine = engine
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _path(self, text: str) -> str:
+        key = hashlib.sha256(
+            f"{self.engine.name}\0{self.engine.voice}\0{text}".encode()
+        ).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}{self.engine.extension}")
+
+    def _synthesize(self, text: str, path: str) -> None:
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp = f"{path}.{uuid.uuid4().hex}.tmp{self.engine.extension}"
+        try:
+            self.engine.synthesize(text, tmp)
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        evicted, _ = disk_cache.trim(self.cache_dir, self.max_bytes, keep=path)
+        with self._lock:
+            self.evictions += evicted
+
+    async def synthesize(self, text: str) -> str:
+        """Return the path of an audio file speaking ``text``."""
+
+        path = self._path(text)
+        while True:
+            if disk_cache.touch(path):
+                self.hits += 1
+                return path
+            pending = self._inflight.get(path)
+            if pending is None:
+                break
+            # Same text already being synthesised for another request
+            try:
+                result = await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    raise  # we were cancelled ourselves
+                # The request doing the work went away; try again ourselves
+                continue
+            self.hits += 1
+            return result
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[path] = future
+        try:
+            with stage("tts"):
+                await asyncio.to_thread(self._synthesize, text, path)
+        except asyncio.CancelledError:
+            # Not a synthesis failure; waiters take over rather than fail
+            future.cancel()
+            raise
+        except BaseException as exc:
+            future.set_exception(exc)
+            future.exception()  # mark retrieved when nobody else is waiting
+            raise
+        else:
+            future.set_result(path)
+        finally:
+            del self._inflight[path]
+        return path
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "engine": self.engine.name,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+tts_service = TTSService(
+    ENGINES[os.environ.get("TTS_ENGINE", GTTSEngine.name)](os.environ.get("TTS_VOICE", ""))
+)
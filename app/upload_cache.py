@@ -0,0 +1,126 @@
+"""Content-addressed cache of files already uploaded to fal.ai storage.
+
+Every MuseTalk call needs public URLs for its audio and avatar.  The same
+avatar is used for the lecture render, every chat answer and every WebSocket
+preview, so the URL returned by ``fal_client.upload_file`` is remembered under
+the SHA-256 of the file and reused until it expires.  Identical files uploaded
+for different classes therefore only travel to fal once.
+
+The index is a small JSON document in ``CACHE_DIR`` so it survives restarts.
+"""
+
+from typing import Callable, Dict, Optional
+
+import json
+import logging
+import os
+import threading
+import time
+
+try:  # package style
+    from app.hashing import sha256_file  # type: ignore
+    from app.metrics import count_bytes, stage  # type: ignore
+except ImportError:
+    from hashing import sha256_file  # type: ignore
+    from metrics import count_bytes, stage  # type: ignore
+
+log = logging.getLogger(__name__)
+
+
+CACHE_DIR = os.environ.get("CACHE_DIR", "cache")
+
+# fal storage URLs are temporary; re-upload well before they stop resolving.
+UPLOAD_TTL = float(os.environ.get("FAL_UPLOAD_TTL", str(6 * 60 * 60)))
+
+
+class UploadCache:
+    """Map file digests to fal storage URLs with a time-to-live."""
+
+    def __init__(self, path: str, ttl: float = UPLOAD_TTL) -> None:
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: Optional[Dict[str, dict]] = None
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.bytes_saved = 0
+        self.bytes_uploaded = 0
+
+    def _load(self) -> Dict[str, dict]:
+        if self._entries is None:
+            try:
+                with open(self.path) as f:
+                    self._entries = json.load(f)
+            except (OSError, ValueError):
+                self._entries = {}
+        return self._entries
+
+    def _save(self) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self._entries, f)
+        os.replace(tmp, self.path)
+
+    def _prune(self, now: float) -> None:
+        entries = self._load()
+        for digest in [d for d, e in entries.items() if e["expires_at"] <= now]:
+            del entries[digest]
+
+    def lookup(self, digest: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            entry = self._load().get(digest)
+            if entry is None:
+                return None
+            if entry["expires_at"] <= now:
+                self.expired += 1
+                return None
+            return entry["url"]
+
+    def get_or_upload(self, file_path: str, upload: Callable[[str], str]) -> str:
+        """Return a fal URL for ``file_path``, calling ``upload`` on a miss."""
+
+        digest = sha256_file(file_path)
+        size = os.path.getsize(file_path)
+        url = self.lookup(digest)
+        if url:
+            with self._lock:
+                self.hits += 1
+                self.bytes_saved += size
+            log.debug("Upload cache hit", extra={"file": file_path, "bytes": size})
+            return url
+
+        with stage("fal_upload"):
+            url = upload(file_path)
+        count_bytes("out", "fal_upload", size)
+        now = time.time()
+        with self._lock:
+            self.misses += 1
+            self.bytes_uploaded += size
+            self._prune(now)
+            self._load()[digest] = {
+                "url": url,
+                "size": size,
+                "uploaded_at": now,
+                "expires_at": now + self.ttl,
+            }
+            self._save()
+        return url
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._load()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "expired": self.expired,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "bytes_saved": self.bytes_saved,
+                "bytes_uploaded": self.bytes_uploaded,
+            }
+
+
+upload_cache = UploadCache(os.path.join(CACHE_DIR, "fal_uploads.json"))
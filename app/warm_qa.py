@@ -0,0 +1,242 @@
+"""Pre-generated answer clips for the questions students ask on every slide.
+
+"Can you explain this slide again?" and "Can you summarize this slide?" come
+up on nearly every slide of every class, and each costs an LLM call, TTS and
+a MuseTalk render when asked live.  With ``WARM_QA=1`` a class is queued here
+once its lecture has rendered; a single background worker then answers
+``WARM_QA_QUESTIONS`` for each slide, in slide order, and renders the answer
+clips.  It only starts a clip while no render job and no other fal request is
+running, and stops after ``WARM_QA_MAX_CLIPS`` clips per class.  Slides
+without extracted text are skipped: the answer would only be a guess.
+
+``/chat`` and ``/ws/chat`` first look the question up here: a question whose
+content words are close enough to a pre-generated one on the same slide
+(Dice coefficient of at least ``WARM_QA_MATCH``) is answered with the ready
+clip straight away.  For a class with no extracted text at all, a request
+carrying its own ``slide_text`` always goes to the LLM instead, since any
+clip left over for it was made without that text.  Entries are kept in
+``warm_qa.json`` in the class directory; a clip removed by the retention sweep
+simply stops matching.
+"""
+
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+import asyncio
+import json
+import logging
+import os
+import threading
+
+try:  # package style
+    from app.answer_cache import normalize_question  # type: ignore
+    from app.manifest import load_manifest  # type: ignore
+    from app.slide_index import SlideTexts, slide_texts  # type: ignore
+    from app.storage import ClassStorage, storage  # type: ignore
+except ImportError:
+    from answer_cache import normalize_question  # type: ignore
+    from manifest import load_manifest  # type: ignore
+    from slide_index import SlideTexts, slide_texts  # type: ignore
+    from storage import ClassStorage, storage  # type: ignore
+
+log = logging.getLogger(__name__)
+
+WARM_QA = os.environ.get("WARM_QA", "0") == "1"
+DEFAULT_QUESTIONS = (
+    "Can you explain this slide again?",
+    "Can you summarize this slide?",
+)
+WARM_QA_QUESTIONS = tuple(
+    q.strip() for q in os.environ.get("WARM_QA_QUESTIONS", "|".join(DEFAULT_QUESTIONS)).split("|")
+    if q.strip()
+)
+WARM_QA_MAX_CLIPS = int(os.environ.get("WARM_QA_MAX_CLIPS", "20"))
+WARM_QA_MATCH = float(os.environ.get("WARM_QA_MATCH", "0.75"))
+WARM_QA_IDLE_POLL = float(os.environ.get("WARM_QA_IDLE_POLL", "2"))
+
+# Words that say nothing about what is being asked.
+_STOPWORDS = {
+    "a", "again", "an", "and", "are", "can", "could", "do", "does", "for", "i", "is",
+    "it", "me", "my", "of", "on", "one", "please", "the", "this", "that", "to", "what",
+    "would", "you",
+}
+
+
+def _terms(question: str) -> frozenset:
+    return frozenset(w for w in normalize_question(question).split() if w not in _STOPWORDS)
+
+
+def similarity(a: str, b: str) -> float:
+    """Dice coefficient of the content words of two questions."""
+
+    ta, tb = _terms(a), _terms(b)
+    if not ta or not tb:
+        return 1.0 if normalize_question(a) == normalize_question(b) else 0.0
+    return 2 * len(ta & tb) / (len(ta) + len(tb))
+
+
+class WarmAnswers:
+    """Per-class store of pre-generated answers and the worker filling it."""
+
+    def __init__(self, store: ClassStorage, questions=WARM_QA_QUESTIONS,
+                 max_clips: int = WARM_QA_MAX_CLIPS, threshold: float = WARM_QA_MATCH,
+                 texts: Optional[SlideTexts] = None) -> None:
+        self.store = store
+        self.texts = texts if texts is not None else slide_texts
+        self.questions = tuple(questions)
+        self.max_clips = max_clips
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._entries: Dict[str, List[dict]] = {}
+        self._queue: "asyncio.Queue[str]" = asyncio.Queue()
+        self._scheduled: Set[str] = set()
+        self.hits = 0
+        self.misses = 0
+        self.generated = 0
+        self.failed = 0
+
+    def _path(self, uid: str) -> str:
+        return os.path.join(self.store.class_dir(uid), "warm_qa.json")
+
+    def _load(self, uid: str) -> List[dict]:
+        with self._lock:
+            entries = self._entries.get(uid)
+            if entries is None:
+                try:
+                    with open(self._path(uid)) as f:
+                        entries = json.load(f)
+                except (OSError, ValueError):
+                    entries = []
+                self._entries[uid] = entries
+            return entries
+
+    def _save(self, uid: str, entries: List[dict]) -> None:
+        path = self.store.input_path(uid, "warm_qa.json")
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(entries, f)
+        os.replace(tmp, path)
+        with self._lock:
+            self._entries[uid] = entries
+
+    def match(self, uid: str, slide_index: int, question: str,
+              client_text: Optional[str] = None) -> Optional[dict]:
+        """The pre-generated ``{"question", "answer", "video"}`` closest to
+        ``question`` on this slide, if it is close enough.
+
+        ``client_text`` is the slide text sent with the question; if the class
+        has none of its own, the question is left to the LLM.
+        """
+
+        if not self.store.valid_uid(uid):
+            return None
+        if client_text and self.texts.index(uid) is None:
+            return None
+        entries = self._load(uid)
+        best, score = None, 0.0
+        for entry in entries:
+            if entry["slide"] != slide_index:
+                continue
+            s = similarity(question, entry["question"])
+            if s > score:
+                best, score = entry, s
+        if best is None or score < self.threshold:
+            with self._lock:
+                self.misses += 1
+            return None
+        if not os.path.exists(os.path.join(self.store.output_dir, best["video"])):
+            # Evicted since; answer live from now on
+            self._save(uid, [e for e in entries if e is not best])
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return best
+
+    def schedule(self, uid: str) -> None:
+        with self._lock:
+            if uid in self._scheduled:
+                return
+            self._scheduled.add(uid)
+        self._queue.put_nowait(uid)
+
+    def active_uids(self) -> Set[str]:
+        """Classes queued for warm-up or being warmed."""
+
+        with self._lock:
+            return set(self._scheduled)
+
+    def _slide_count(self, uid: str) -> int:
+        body = load_manifest(uid)
+        if body is None:
+            return 0
+        manifest = json.loads(body)
+        return manifest.get("slide_count") or len(manifest.get("timestamps") or [])
+
+    async def _warm(self, uid: str, generate: Callable[[str, int, str], Awaitable[dict]],
+                    is_idle: Callable[[], bool]) -> None:
+        index = await asyncio.to_thread(self.texts.index, uid)
+        if index is None:
+            log.info("No slide text for %s; nothing to pre-generate", uid)
+            return
+        entries = list(await asyncio.to_thread(self._load, uid))
+        done = {(e["slide"], normalize_question(e["question"])) for e in entries}
+        slides = await asyncio.to_thread(self._slide_count, uid)
+        for slide in range(1, slides + 1):
+            if not index.page(slide).strip():
+                continue
+            for question in self.questions:
+                if len(entries) >= self.max_clips:
+                    return
+                if (slide, normalize_question(question)) in done:
+                    continue
+                while not is_idle():
+                    await asyncio.sleep(WARM_QA_IDLE_POLL)
+                try:
+                    clip = await generate(uid, slide, question)
+                except Exception as exc:
+                    log.warning("Pre-generating answer for %s slide %d failed: %s", uid, slide, exc)
+                    with self._lock:
+                        self.failed += 1
+                    continue
+                entries.append({"slide": slide, "question": question, **clip})
+                await asyncio.to_thread(self._save, uid, list(entries))
+                with self._lock:
+                    self.generated += 1
+
+    async def run(self, generate: Callable[[str, int, str], Awaitable[dict]],
+                  is_idle: Callable[[], bool]) -> None:
+        """Warm queued classes one at a time.
+
+        ``generate(uid, slide, question)`` returns ``{"answer", "video"}``
+        with ``video`` relative to ``/outputs``; ``is_idle`` says whether the
+        app has capacity to spare.
+        """
+
+        while True:
+            uid = await self._queue.get()
+            try:
+                await self._warm(uid, generate, is_idle)
+                log.info("Pre-generated answers ready for %s", uid)
+            except Exception as exc:
+                log.warning("Pre-generating answers for %s failed: %s", uid, exc)
+            finally:
+                with self._lock:
+                    self._scheduled.discard(uid)
+                self._queue.task_done()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": WARM_QA,
+                "queued": self._queue.qsize(),
+                "generated": self.generated,
+                "failed": self.failed,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+warm_answers = WarmAnswers(storage)
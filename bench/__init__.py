@@ -0,0 +1 @@
+"""Offline benchmarks; see :mod:`bench.run`."""
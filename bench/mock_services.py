@@ -0,0 +1,187 @@
+"""Local stand-ins for the fal.ai and OpenAI HTTP APIs.
+
+One FastAPI app serves everything the lecture app talks to during a
+benchmark:
+
+* ``/fal/*`` -- file uploads, a request queue whose jobs spend
+  ``MOCK_FAL_QUEUE_DELAY`` seconds queued and ``MOCK_FAL_INFERENCE_DELAY``
+  seconds in progress, results pointing at ``/files/result.mp4`` and a
+  realtime frame stream.  ``MOCK_FAL_ERROR_RATE`` of the status polls fail
+  with a ``503`` and the apps listed in ``MOCK_FAL_DOWN`` answer ``404``.  The ``fal_client`` stand-in in ``bench/stubs`` is
+  the client side of these routes.
+* ``/files/{name}`` -- the rendered video (``MOCK_VIDEO_BYTES`` bytes).
+* ``/v1/chat/completions`` -- an OpenAI compatible endpoint, streamed or not,
+  that answers after ``MOCK_LLM_FIRST_TOKEN`` seconds and then emits
+  ``MOCK_LLM_TOKENS`` tokens ``MOCK_LLM_TOKEN_DELAY`` seconds apart.
+
+Run with ``uvicorn bench.mock_services:app``; ``bench.run`` starts it for you.
+"""
+
+import asyncio
+import base64
+import itertools
+import json
+import os
+import random
+import tempfile
+import time
+import uuid
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import FileResponse, StreamingResponse
+
+
+FAL_QUEUE_DELAY = float(os.environ.get("MOCK_FAL_QUEUE_DELAY", "1.0"))
+FAL_INFERENCE_DELAY = float(os.environ.get("MOCK_FAL_INFERENCE_DELAY", "2.0"))
+FAL_ERROR_RATE = float(os.environ.get("MOCK_FAL_ERROR_RATE", "0"))
+FAL_DOWN = {app for app in os.environ.get("MOCK_FAL_DOWN", "").split(",") if app}
+FRAME_FPS = float(os.environ.get("MOCK_FRAME_FPS", "25"))
+FRAME_COUNT = int(os.environ.get("MOCK_FRAME_COUNT", "100"))
+FRAME_BYTES = int(os.environ.get("MOCK_FRAME_BYTES", str(20 * 1024)))
+VIDEO_BYTES = int(os.environ.get("MOCK_VIDEO_BYTES", str(2 * 1024 * 1024)))
+LLM_FIRST_TOKEN = float(os.environ.get("MOCK_LLM_FIRST_TOKEN", "0.3"))
+LLM_TOKEN_DELAY = float(os.environ.get("MOCK_LLM_TOKEN_DELAY", "0.02"))
+LLM_TOKENS = int(os.environ.get("MOCK_LLM_TOKENS", "60"))
+
+app = FastAPI()
+
+_requests: dict = {}
+_counter = itertools.count()
+_video_path = os.path.join(tempfile.mkdtemp(prefix="bench_mock_"), "result.mp4")
+with open(_video_path, "wb") as f:
+    f.write(os.urandom(VIDEO_BYTES))
+_frame = base64.b64encode(b"\xff\xd8" + os.urandom(FRAME_BYTES) + b"\xff\xd9").decode()
+
+
+def _base_url(request: Request) -> str:
+    return str(request.base_url).rstrip("/")
+
+
+@app.post("/fal/upload")
+async def fal_upload(request: Request):
+    size = 0
+    async for chunk in request.stream():
+        size += len(chunk)
+    return {"url": f"{_base_url(request)}/files/{uuid.uuid4().hex}", "size": size}
+
+
+@app.post("/fal/queue/{application:path}")
+async def fal_submit(application: str, request: Request):
+    if application in FAL_DOWN:
+        raise HTTPException(status_code=404, detail=f"Application {application} not found")
+    request_id = uuid.uuid4().hex
+    _requests[request_id] = {
+        "application": application,
+        "arguments": await request.json(),
+        "submitted_at": time.monotonic(),
+        "seq": next(_counter),
+    }
+    return {"request_id": request_id}
+
+
+def _state(request_id: str) -> dict:
+    job = _requests.get(request_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown request")
+    elapsed = time.monotonic() - job["submitted_at"]
+    if elapsed < FAL_QUEUE_DELAY:
+        ahead = sum(
+            1 for other in _requests.values()
+            if other["seq"] < job["seq"] and time.monotonic() - other["submitted_at"] < FAL_QUEUE_DELAY
+        )
+        return {"status": "IN_QUEUE", "queue_position": ahead}
+    if elapsed < FAL_QUEUE_DELAY + FAL_INFERENCE_DELAY:
+        return {"status": "IN_PROGRESS", "logs": []}
+    return {"status": "COMPLETED", "logs": [], "metrics": {"inference_time": FAL_INFERENCE_DELAY}}
+
+
+@app.get("/fal/requests/{request_id}/status")
+async def fal_status(request_id: str):
+    if random.random() < FAL_ERROR_RATE:
+        raise HTTPException(status_code=503, detail="Service temporarily unavailable")
+    return _state(request_id)
+
+
+@app.put("/fal/requests/{request_id}/cancel")
+async def fal_cancel(request_id: str):
+    _requests.pop(request_id, None)
+    return {"status": "CANCELLATION_REQUESTED"}
+
+
+@app.get("/fal/requests/{request_id}")
+async def fal_result(request_id: str, request: Request):
+    if _state(request_id)["status"] != "COMPLETED":
+        raise HTTPException(status_code=400, detail="Request is still in progress")
+    _requests.pop(request_id, None)
+    return {"video": {"url": f"{_base_url(request)}/files/result.mp4", "content_type": "video/mp4"}}
+
+
+@app.get("/fal/realtime/{application:path}")
+async def fal_realtime(application: str):
+    async def frames():
+        for _ in range(FRAME_COUNT):
+            yield json.dumps({"frame": _frame}) + "\n"
+            await asyncio.sleep(1 / FRAME_FPS)
+
+    return StreamingResponse(frames(), media_type="application/x-ndjson")
+
+
+@app.get("/files/{name}")
+async def files(name: str):
+    return FileResponse(_video_path, media_type="video/mp4")
+
+
+def _words():
+    words = "the slide explains how the model maps each input to a prediction".split()
+    for i in range(LLM_TOKENS):
+        word = words[i % len(words)]
+        yield (word.capitalize() if i == 0 else " " + word) + ("." if i % 12 == 11 else "")
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    model = body.get("model", "mock")
+    created = int(time.time())
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+    await asyncio.sleep(LLM_FIRST_TOKEN)
+
+    if not body.get("stream"):
+        await asyncio.sleep(LLM_TOKEN_DELAY * LLM_TOKENS)
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": "".join(_words())},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": 50, "completion_tokens": LLM_TOKENS, "total_tokens": 50 + LLM_TOKENS},
+        }
+
+    def chunk(delta: dict, finish=None) -> str:
+        data = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish}],
+        }
+        return f"data: {json.dumps(data)}\n\n"
+
+    async def events():
+        yield chunk({"role": "assistant", "content": ""})
+        for word in _words():
+            yield chunk({"content": word})
+            await asyncio.sleep(LLM_TOKEN_DELAY)
+        yield chunk({}, finish="stop")
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@app.get("/health")
+async def health():
+    return {"ok": True, "pending": len(_requests)}
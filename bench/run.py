@@ -0,0 +1,537 @@
+"""Offline load test of the lecture app.
+
+Starts ``bench.mock_services`` and the app (``uvicorn app.main:app``, with the
+stand-ins from ``bench/stubs`` shadowing ``fal_client`` and ``gtts``) in a
+scratch directory, then drives concurrent clients through these scenarios:
+
+* ``upload``: ``POST /upload`` followed by polling ``GET /jobs/{id}``.  It
+  reports the request latency and the end-to-end render time.
+* ``ingest``: one ``POST /ingest`` archive of ``--uploads`` classes sharing an
+  avatar, polled through ``GET /ingest/{id}`` until every class is rendered.
+* ``chat``: ``POST /chat`` against a class uploaded during setup.
+* ``ws``: viewers of ``/ws/avatar/{uid}``.  It reports the time to the first
+  frame and the frames per second each viewer received.
+
+Each scenario reports p50/p95/p99 latency, requests per second, errors and
+the app's event loop lag, read from ``/metrics``.  The run as a whole reports
+the peak RSS of the app process.  Results can be saved with ``--out`` and
+compared against an earlier run with ``--compare``::
+
+    python -m bench.run --out before.json
+    git checkout my-branch
+    python -m bench.run --compare before.json
+"""
+
+from typing import Dict, List, Optional
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+import httpx
+import websockets
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STUBS = os.path.join(ROOT, "bench", "stubs")
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _proc_status(pid: int, field: str) -> Optional[int]:
+    """``VmRSS``/``VmHWM`` of ``pid`` in bytes (Linux only)."""
+
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+class Server:
+    """A uvicorn subprocess that is ready once ``ready_path`` answers."""
+
+    def __init__(self, name: str, target: str, cwd: str, env: dict, log_dir: str) -> None:
+        self.name = name
+        self.port = _free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.log_path = os.path.join(log_dir, f"{name}.log")
+        self._log = open(self.log_path, "w")
+        self.proc = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", target, "--port", str(self.port),
+             "--log-level", "warning"],
+            cwd=cwd,
+            env=env,
+            stdout=self._log,
+            stderr=subprocess.STDOUT,
+        )
+
+    def wait_ready(self, path: str, timeout: float = 60) -> None:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.proc.poll() is not None:
+                break
+            try:
+                if httpx.get(self.url + path, timeout=1).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.1)
+        raise RuntimeError(f"{self.name} did not start; see {self.log_path}")
+
+    def stop(self) -> None:
+        self.proc.terminate()
+        try:
+            self.proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+        self._log.close()
+
+
+def summarize(samples: List[float]) -> dict:
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+    if len(ordered) > 1:
+        cuts = statistics.quantiles(ordered, n=100, method="inclusive")
+        p50, p95, p99 = cuts[49], cuts[94], cuts[98]
+    else:
+        p50 = p95 = p99 = ordered[0]
+    return {
+        "count": len(ordered),
+        "mean": round(statistics.fmean(ordered), 4),
+        "p50": round(p50, 4),
+        "p95": round(p95, 4),
+        "p99": round(p99, 4),
+        "max": round(ordered[-1], 4),
+    }
+
+
+def _loop_lag_buckets(metrics_text: str) -> Dict[str, float]:
+    buckets = {}
+    for line in metrics_text.splitlines():
+        if line.startswith("lecture_event_loop_lag_seconds"):
+            name, value = line.rsplit(" ", 1)
+            buckets[name] = float(value)
+    return buckets
+
+
+def loop_lag(before: Dict[str, float], after: Dict[str, float]) -> dict:
+    """Summarize the loop lag samples taken between two ``/metrics`` scrapes."""
+
+    delta = {k: v - before.get(k, 0.0) for k, v in after.items()}
+    count = delta.get("lecture_event_loop_lag_seconds_count", 0)
+    if not count:
+        return {"samples": 0}
+    bounds = sorted(
+        (float(k.split('le="')[1].rstrip('"}').replace("+Inf", "inf")), v)
+        for k, v in delta.items()
+        if "_bucket" in k
+    )
+
+    def quantile(q: float) -> float:
+        for bound, hits in bounds:
+            if hits >= q * count:
+                return bound
+        return float("inf")
+
+    return {
+        "samples": int(count),
+        "mean": round(delta["lecture_event_loop_lag_seconds_sum"] / count, 5),
+        "p50_le": quantile(0.5),
+        "p99_le": quantile(0.99),
+    }
+
+
+class Scenario:
+    """Latency samples and errors of one scenario."""
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors = 0
+        self.completed = 0
+        self.started = time.perf_counter()
+        self.finished = self.started
+
+    def record(self, metric: str, seconds: float) -> None:
+        self.latencies.setdefault(metric, []).append(seconds)
+
+    def report(self) -> dict:
+        wall = self.finished - self.started
+        return {
+            "completed": self.completed,
+            "errors": self.errors,
+            "seconds": round(wall, 3),
+            "rps": round(self.completed / wall, 3) if wall > 0 else None,
+            "latency": {name: summarize(s) for name, s in self.latencies.items()},
+        }
+
+
+async def _pool(concurrency: int, total: int, op) -> None:
+    remaining = iter(range(total))
+
+    async def worker() -> None:
+        for i in remaining:
+            await op(i)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+
+def _audio_bytes(seconds: float = 1.0, rate: int = 16000) -> bytes:
+    """A WAV file of noise; unique content so renders are never cache hits."""
+
+    import io
+    import wave
+
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(os.urandom(int(seconds * rate) * 2))
+    return buf.getvalue()
+
+
+def _avatar() -> tuple:
+    path = os.path.join(ROOT, "inputs", "avatar1.mp4")
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            return "avatar.mp4", f.read()
+    return "avatar.mp4", os.urandom(512 * 1024)
+
+
+async def upload_class(client: httpx.AsyncClient, scenario: Optional[Scenario],
+                       poll: float = 0.2) -> str:
+    name, avatar = _avatar()
+    files = {
+        "audio": ("audio.wav", _audio_bytes(), "audio/wav"),
+        "timestamps": ("timestamps.json", json.dumps([0, 0.5]), "application/json"),
+        "avatar": (name, avatar, "video/mp4"),
+    }
+    start = time.perf_counter()
+    resp = await client.post("/upload", files=files, data={"slides_id": "bench"})
+    resp.raise_for_status()
+    body = resp.json()
+    if scenario is not None:
+        scenario.record("upload_request", time.perf_counter() - start)
+    while True:
+        job = (await client.get(f"/jobs/{body['job_id']}")).json()
+        if job["status"] == "done":
+            break
+        if job["status"] == "failed":
+            raise RuntimeError(f"render failed: {job.get('error')}")
+        await asyncio.sleep(poll)
+    if scenario is not None:
+        scenario.record("render_end_to_end", time.perf_counter() - start)
+    return body["id"]
+
+
+async def bench_upload(client: httpx.AsyncClient, args) -> Scenario:
+    scenario = Scenario("upload")
+
+    async def op(_):
+        try:
+            await upload_class(client, scenario)
+            scenario.completed += 1
+        except Exception:
+            scenario.errors += 1
+
+    await _pool(args.concurrency, args.uploads, op)
+    scenario.finished = time.perf_counter()
+    return scenario
+
+
+def _archive(classes: int) -> bytes:
+    """A bulk-ingest zip of ``classes`` lectures sharing one avatar."""
+
+    import io
+    import zipfile
+
+    name, avatar = _avatar()
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as zf:
+        zf.writestr(name, avatar)
+        entries = []
+        for i in range(classes):
+            zf.writestr(f"lecture{i}/audio.wav", _audio_bytes())
+            zf.writestr(f"lecture{i}/timestamps.json", json.dumps([0, 0.5]))
+            entries.append({
+                "name": f"Lecture {i + 1}",
+                "audio": f"lecture{i}/audio.wav",
+                "timestamps": f"lecture{i}/timestamps.json",
+            })
+        zf.writestr("manifest.json", json.dumps({"shared": {"avatar": name}, "classes": entries}))
+    return buf.getvalue()
+
+
+async def bench_ingest(client: httpx.AsyncClient, args, poll: float = 0.2) -> Scenario:
+    scenario = Scenario("ingest")
+    archive = _archive(args.uploads)
+    start = time.perf_counter()
+    resp = await client.post("/ingest", files={"archive": ("course.zip", archive, "application/zip")})
+    resp.raise_for_status()
+    scenario.record("ingest_request", time.perf_counter() - start)
+    batch_id = resp.json()["id"]
+    seen = set()
+    while True:
+        report = (await client.get(f"/ingest/{batch_id}")).json()
+        for entry in report["classes"]:
+            if entry["status"] == "done" and entry["id"] not in seen:
+                seen.add(entry["id"])
+                scenario.record("class_end_to_end", time.perf_counter() - start)
+        if report["status"] == "done":
+            break
+        await asyncio.sleep(poll)
+    scenario.completed = report["counts"]["done"]
+    scenario.errors = report["counts"]["failed"]
+    scenario.finished = time.perf_counter()
+    return scenario
+
+
+async def bench_chat(client: httpx.AsyncClient, args, uid: str) -> Scenario:
+    scenario = Scenario("chat")
+    # Repeated questions exercise the answer cache
+    questions = [f"What does slide {i} show? ({uuid.uuid4().hex[:8]})" for i in range(args.chats)]
+
+    async def op(i):
+        if i and random.random() < args.repeat_ratio:
+            question = questions[random.randrange(i)]
+        else:
+            question = questions[i]
+        start = time.perf_counter()
+        try:
+            resp = await client.post(
+                "/chat", json={"uid": uid, "question": question, "slide_index": 1, "slide_text": ""}
+            )
+            resp.raise_for_status()
+            scenario.record("chat", time.perf_counter() - start)
+            scenario.completed += 1
+        except Exception:
+            scenario.errors += 1
+
+    await _pool(args.concurrency, args.chats, op)
+    scenario.finished = time.perf_counter()
+    return scenario
+
+
+async def bench_ws(base_url: str, args, uid: str) -> Scenario:
+    scenario = Scenario("ws")
+    url = base_url.replace("http://", "ws://") + f"/ws/avatar/{uid}"
+
+    async def viewer(_):
+        start = time.perf_counter()
+        first = last = None
+        frames = 0
+        try:
+            async with websockets.connect(url, max_size=None) as ws:
+                async for message in ws:
+                    if isinstance(message, bytes):
+                        last = time.perf_counter()
+                        if first is None:
+                            first = last
+                            scenario.record("first_frame", first - start)
+                        frames += 1
+                    elif message.startswith("ERROR"):
+                        raise RuntimeError(message)
+            scenario.completed += 1
+            if frames > 1 and last > first:
+                scenario.record("viewer_fps", (frames - 1) / (last - first))
+        except Exception:
+            scenario.errors += 1
+
+    await asyncio.gather(*(viewer(i) for i in range(args.viewers)))
+    scenario.finished = time.perf_counter()
+    return scenario
+
+
+async def run_scenarios(app_url: str, pid: int, args) -> dict:
+    results = {}
+    limits = httpx.Limits(max_connections=args.concurrency * 2)
+    async with httpx.AsyncClient(base_url=app_url, timeout=300, limits=limits) as client:
+        uid = None
+        if {"chat", "ws"} & set(args.scenarios):
+            uid = await upload_class(client, None)
+
+        for name in args.scenarios:
+            before = _loop_lag_buckets((await client.get("/metrics")).text)
+            if name == "upload":
+                scenario = await bench_upload(client, args)
+            elif name == "ingest":
+                scenario = await bench_ingest(client, args)
+            elif name == "chat":
+                scenario = await bench_chat(client, args, uid)
+            else:
+                scenario = await bench_ws(app_url, args, uid)
+            after = _loop_lag_buckets((await client.get("/metrics")).text)
+            results[name] = {
+                **scenario.report(),
+                "loop_lag": loop_lag(before, after),
+                "rss_bytes": _proc_status(pid, "VmRSS"),
+            }
+    return results
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True
+        ).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(baseline: dict, current: dict) -> List[str]:
+    lines = [f"Compared with {baseline.get('commit')} -> {current.get('commit')}"]
+    for name, result in current["scenarios"].items():
+        old = baseline.get("scenarios", {}).get(name)
+        if not old:
+            continue
+
+        def delta(a, b) -> str:
+            if a is None or b is None or not a:
+                return "n/a"
+            return f"{b:.4g} ({(b - a) / a:+.1%})"
+
+        lines.append(f"  {name}: rps {delta(old.get('rps'), result.get('rps'))}")
+        for metric, stats in result["latency"].items():
+            prev = old.get("latency", {}).get(metric, {})
+            lines.append(
+                f"    {metric}: "
+                + ", ".join(f"{q} {delta(prev.get(q), stats.get(q))}" for q in ("p50", "p95", "p99"))
+            )
+    rss = baseline.get("peak_rss_bytes"), current.get("peak_rss_bytes")
+    lines.append(f"  peak RSS: {delta(*rss) if all(rss) else 'n/a'}")
+    return lines
+
+
+def print_report(report: dict) -> None:
+    print(f"commit {report['commit']}, peak RSS {report['peak_rss_bytes']} bytes")
+    for name, result in report["scenarios"].items():
+        print(
+            f"{name}: {result['completed']} ok, {result['errors']} errors in "
+            f"{result['seconds']}s ({result['rps']} rps), loop lag {result['loop_lag']}"
+        )
+        for metric, stats in result["latency"].items():
+            print(f"  {metric}: {stats}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--scenarios", nargs="+", default=["upload", "chat", "ws"],
+                        choices=["upload", "ingest", "chat", "ws"])
+    parser.add_argument("--concurrency", type=int, default=4, help="concurrent HTTP clients")
+    parser.add_argument("--uploads", type=int, default=8)
+    parser.add_argument("--chats", type=int, default=16)
+    parser.add_argument("--repeat-ratio", type=float, default=0.25,
+                        help="share of chat questions repeating an earlier one")
+    parser.add_argument("--viewers", type=int, default=8, help="concurrent avatar WebSocket viewers")
+    parser.add_argument("--fal-queue-delay", type=float, default=0.2)
+    parser.add_argument("--fal-inference-delay", type=float, default=0.5)
+    parser.add_argument("--fal-error-rate", type=float, default=0.0,
+                        help="share of fal status polls answered with a 503")
+    parser.add_argument("--fal-down", default="",
+                        help="comma-separated fal apps that reject every request")
+    parser.add_argument("--llm-first-token", type=float, default=0.2)
+    parser.add_argument("--llm-token-delay", type=float, default=0.01)
+    parser.add_argument("--frames", type=int, default=50, help="realtime frames per session")
+    parser.add_argument("--fps", type=float, default=25)
+    parser.add_argument("--video-bytes", type=int, default=2 * 1024 * 1024)
+    parser.add_argument("--app-env", action="append", default=[], metavar="KEY=VALUE",
+                        help="extra environment for the app, e.g. RENDER_CONCURRENCY=4")
+    parser.add_argument("--out", help="write the JSON report here")
+    parser.add_argument("--compare", help="JSON report of an earlier run to compare with")
+    parser.add_argument("--keep", action="store_true", help="keep the scratch directory")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> dict:
+    args = parse_args(argv)
+    workdir = tempfile.mkdtemp(prefix="lecture_bench_")
+    for name in ("uploads", "outputs"):
+        os.makedirs(os.path.join(workdir, name))
+    os.symlink(os.path.join(ROOT, "static"), os.path.join(workdir, "static"))
+
+    mock_env = {
+        **os.environ,
+        "PYTHONPATH": ROOT,
+        "MOCK_FAL_QUEUE_DELAY": str(args.fal_queue_delay),
+        "MOCK_FAL_INFERENCE_DELAY": str(args.fal_inference_delay),
+        "MOCK_FAL_ERROR_RATE": str(args.fal_error_rate),
+        "MOCK_FAL_DOWN": args.fal_down,
+        "MOCK_LLM_FIRST_TOKEN": str(args.llm_first_token),
+        "MOCK_LLM_TOKEN_DELAY": str(args.llm_token_delay),
+        "MOCK_FRAME_COUNT": str(args.frames),
+        "MOCK_FRAME_FPS": str(args.fps),
+        "MOCK_VIDEO_BYTES": str(args.video_bytes),
+    }
+    mock = Server("mock", "bench.mock_services:app", ROOT, mock_env, workdir)
+    app_env = {
+        **os.environ,
+        "PYTHONPATH": os.pathsep.join([STUBS, ROOT]),
+        "MOCK_FAL_URL": mock.url,
+        "FAL_KEY": "bench",
+        "FAL_POLL_INTERVAL": "0.1",
+        "OPENAI_API_KEY": "bench",
+        "OPENAI_BASE_URL": f"{mock.url}/v1",
+        "CACHE_DIR": os.path.join(workdir, "cache"),
+        "JOBS_DIR": os.path.join(workdir, "jobs"),
+        "TTS_ENGINE": "gtts",
+        "LOG_LEVEL": "WARNING",
+    }
+    app_env.pop("ENABLE_DEFAULT_ASSETS", None)
+    for item in args.app_env:
+        key, _, value = item.partition("=")
+        app_env[key] = value
+
+    server = None
+    try:
+        mock.wait_ready("/health")
+        server = Server("app", "app.main:app", workdir, app_env, workdir)
+        server.wait_ready("/startup")
+        scenarios = asyncio.run(run_scenarios(server.url, server.proc.pid, args))
+        report = {
+            "commit": _git_commit(),
+            "timestamp": time.time(),
+            "config": vars(args),
+            "scenarios": scenarios,
+            "peak_rss_bytes": _proc_status(server.proc.pid, "VmHWM"),
+        }
+    finally:
+        if server is not None:
+            server.stop()
+        mock.stop()
+        if args.keep:
+            print(f"Scratch directory kept at {workdir}")
+        else:
+            import shutil
+
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print_report(report)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            print("\n".join(compare(json.load(f), report)))
+    return report
+
+
+if __name__ == "__main__":
+    main()
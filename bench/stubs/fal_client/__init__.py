@@ -0,0 +1,127 @@
+"""Benchmark stand-in for ``fal_client``.
+
+Implements the part of the ``fal_client`` API the app uses -- ``upload_file``,
+``submit``/``subscribe`` and their async ``submit_async`` counterpart with
+``Queued``/``InProgress``/``Completed`` updates, and ``realtime.connect`` --
+against ``bench.mock_services`` at
+``MOCK_FAL_URL``.  ``bench.run`` puts ``bench/stubs`` first on the app's
+``PYTHONPATH`` so this module shadows the real client.
+"""
+
+from typing import Callable, Optional
+
+import os
+import time
+
+import httpx
+
+from . import client, realtime
+from .client import Completed, FalClientError, FalClientHTTPError, InProgress, Queued
+
+MOCK_FAL_URL = os.environ.get("MOCK_FAL_URL", "http://127.0.0.1:8765").rstrip("/")
+POLL_INTERVAL = float(os.environ.get("MOCK_FAL_POLL_INTERVAL", "0.1"))
+
+_http = httpx.Client(base_url=MOCK_FAL_URL, timeout=60)
+_async_http: Optional[httpx.AsyncClient] = None
+
+
+def _check(resp: httpx.Response) -> dict:
+    if resp.status_code >= 400:
+        raise FalClientHTTPError(resp.text, resp.status_code)
+    return resp.json()
+
+
+def _client() -> httpx.AsyncClient:
+    global _async_http
+    if _async_http is None:
+        _async_http = httpx.AsyncClient(base_url=MOCK_FAL_URL, timeout=60)
+    return _async_http
+
+
+def _status(data: dict):
+    if data["status"] == "IN_QUEUE":
+        return Queued(position=data["queue_position"])
+    if data["status"] == "IN_PROGRESS":
+        return InProgress(logs=data.get("logs"))
+    return Completed(logs=data.get("logs"), metrics=data.get("metrics", {}))
+
+
+def upload_file(path: str) -> str:
+    with open(path, "rb") as f:
+        return _check(_http.post("/fal/upload", content=f.read()))["url"]
+
+
+class SyncRequestHandle:
+    def __init__(self, request_id: str) -> None:
+        self.request_id = request_id
+
+    def status(self, with_logs: bool = False):
+        return _status(_check(_http.get(f"/fal/requests/{self.request_id}/status")))
+
+    def iter_events(self, with_logs: bool = False, interval: float = POLL_INTERVAL):
+        while True:
+            status = self.status(with_logs=with_logs)
+            yield status
+            if isinstance(status, Completed):
+                return
+            time.sleep(interval)
+
+    def get(self) -> dict:
+        for _ in self.iter_events():
+            pass
+        return _check(_http.get(f"/fal/requests/{self.request_id}"))
+
+
+def submit(application: str, arguments: dict, **kwargs) -> SyncRequestHandle:
+    data = _check(_http.post(f"/fal/queue/{application}", json=arguments))
+    return SyncRequestHandle(data["request_id"])
+
+
+class AsyncRequestHandle:
+    def __init__(self, request_id: str) -> None:
+        self.request_id = request_id
+
+    async def status(self, with_logs: bool = False):
+        return _status(_check(await _client().get(f"/fal/requests/{self.request_id}/status")))
+
+    async def get(self) -> dict:
+        return _check(await _client().get(f"/fal/requests/{self.request_id}"))
+
+    async def cancel(self) -> None:
+        _check(await _client().put(f"/fal/requests/{self.request_id}/cancel"))
+
+
+async def submit_async(application: str, arguments: dict, **kwargs) -> AsyncRequestHandle:
+    data = _check(await _client().post(f"/fal/queue/{application}", json=arguments))
+    return AsyncRequestHandle(data["request_id"])
+
+
+def subscribe(
+    application: str,
+    arguments: dict,
+    with_logs: bool = False,
+    on_queue_update: Optional[Callable] = None,
+    **kwargs,
+) -> dict:
+    handle = submit(application, arguments)
+    for event in handle.iter_events(with_logs=with_logs):
+        if on_queue_update is not None:
+            on_queue_update(event)
+    return handle.get()
+
+
+__all__ = [
+    "AsyncRequestHandle",
+    "Completed",
+    "FalClientError",
+    "FalClientHTTPError",
+    "InProgress",
+    "Queued",
+    "SyncRequestHandle",
+    "client",
+    "realtime",
+    "submit",
+    "submit_async",
+    "subscribe",
+    "upload_file",
+]
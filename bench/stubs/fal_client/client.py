@@ -0,0 +1,31 @@
+"""Status classes and errors mirroring ``fal_client.client``."""
+
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+
+class FalClientError(Exception):
+    pass
+
+
+class FalClientHTTPError(FalClientError):
+    def __init__(self, message: str, status_code: int) -> None:
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+@dataclass
+class Queued:
+    position: int
+
+
+@dataclass
+class InProgress:
+    logs: Optional[List[Dict[str, Any]]] = field(default=None)
+
+
+@dataclass
+class Completed:
+    logs: Optional[List[Dict[str, Any]]] = field(default=None)
+    metrics: Dict[str, Any] = field(default_factory=dict)
@@ -0,0 +1,29 @@
+"""Realtime frame stream from ``bench.mock_services`` (newline-delimited JSON)."""
+
+import json
+import os
+
+import httpx
+
+
+class RealtimeSession:
+    def __init__(self, client: httpx.AsyncClient, response: httpx.Response) -> None:
+        self._client = client
+        self._response = response
+
+    async def __aiter__(self):
+        async for line in self._response.aiter_lines():
+            if line:
+                yield json.loads(line)
+
+    async def aclose(self) -> None:
+        await self._response.aclose()
+        await self._client.aclose()
+
+
+async def connect(application: str, arguments: dict) -> RealtimeSession:
+    base = os.environ.get("MOCK_FAL_URL", "http://127.0.0.1:8765").rstrip("/")
+    client = httpx.AsyncClient(base_url=base, timeout=None)
+    request = client.build_request("GET", f"/fal/realtime/{application}", params=arguments)
+    response = await client.send(request, stream=True)
+    return RealtimeSession(client, response)
@@ -0,0 +1,15 @@
+"""Benchmark stand-in for ``gtts``: writes a small deterministic file instead
+of calling Google's TTS service."""
+
+import hashlib
+
+
+class gTTS:
+    def __init__(self, text: str, lang: str = "en", **kwargs) -> None:
+        self.text = text
+        self.lang = lang
+
+    def save(self, path: str) -> None:
+        digest = hashlib.sha256(f"{self.lang}\0{self.text}".encode()).digest()
+        with open(path, "wb") as f:
+            f.write(b"ID3" + digest * 256)
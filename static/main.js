@@ -1,5 +1,7 @@
 const outputVideo = document.getElementById('outputVideo');
 const slideImg = document.getElementById('slideImg');
+const slideAvif = document.getElementById('slideAvif');
+const slideWebp = document.getElementById('slideWebp');
 const slideInfo = document.getElementById('slideInfo');
 const avatarFrame = document.getElementById('avatarFrame');
 const playPauseBtn = document.getElementById('playPauseBtn');
@@ -16,26 +18,38 @@ let slides = [];
 let slideIndex = 0;
 let segmentEnd = null;
 let currentId = null;
+// Per-slide clips of a lecture rendered in segmented mode; used until the
+// full video is available.
+let renderSegments = [];
+let segmentedPlayback = false;
+let waitingForSegment = false;
 
 function startStreaming() {
   if (!currentId) return;
   const wsProtocol = location.protocol === 'https:' ? 'wss' : 'ws';
   const ws = new WebSocket(`${wsProtocol}://${location.host}/ws/avatar/${currentId}`);
+  ws.binaryType = 'blob';
   let seenFrame = false;
+  let frameUrl = null;
 
   ws.onmessage = ev => {
-    if (ev.data.startsWith('RESULT::')) {
-      outputVideo.src = `${location.origin}/outputs/${ev.data.substring(8)}`;
-      outputVideo.style.display = 'block';
-      avatarFrame.style.display = 'none';
-      outputVideo.play();
-    } else {
+    if (typeof ev.data !== 'string') {
+      // Binary JPEG frame
       if (!seenFrame) {
         avatarFrame.style.display = 'block';
         outputVideo.style.display = 'none';
         seenFrame = true;
       }
-      avatarFrame.src = 'data:image/jpeg;base64,' + ev.data;
+      if (frameUrl) URL.revokeObjectURL(frameUrl);
+      frameUrl = URL.createObjectURL(ev.data);
+      avatarFrame.src = frameUrl;
+    } else if (ev.data.startsWith('ERROR')) {
+      console.error(ev.data);
+    } else if (ev.data.startsWith('RESULT::')) {
+      outputVideo.src = `${location.origin}/${ev.data.substring(8)}`;
+      outputVideo.style.display = 'block';
+      avatarFrame.style.display = 'none';
+      outputVideo.play();
     }
   };
   ws.onclose = () => {
@@ -82,7 +96,7 @@ async function loadSlides(presentationId) {
 async function loadLocalSlides(id) {
   slides = [];
   for (let i = 1; i < 100; i++) {
-    const url = `${location.origin}/uploads/${id}_slide_${i}.png`;
+    const url = `${location.origin}/uploads/${id}/slide_${i}.png`;
     try {
       const resp = await fetch(url);
       if (!resp.ok) break;
@@ -94,40 +108,119 @@ async function loadLocalSlides(id) {
   return slides.length > 0;
 }
 
+function renderSegmentFor(time) {
+  return renderSegments.find(seg => seg.start <= time && (seg.end == null || time < seg.end));
+}
+
+function slideEnd(idx) {
+  const end = timestamps[idx + 1];
+  if (segmentedPlayback) {
+    const seg = renderSegmentFor(timestamps[idx] || 0);
+    return end !== undefined && seg ? end - seg.start : Infinity;
+  }
+  return end || outputVideo.duration || Infinity;
+}
+
+function showSegmentedSlide(idx) {
+  const start = timestamps[idx] || 0;
+  const seg = renderSegmentFor(start);
+  if (!seg || !seg.video) {
+    waitingForSegment = true;
+    slideInfo.textContent = `Slide ${idx + 1} (still rendering...)`;
+    outputVideo.pause();
+    return;
+  }
+  waitingForSegment = false;
+  const url = `${location.origin}${seg.video}`;
+  const seek = () => {
+    outputVideo.currentTime = start - seg.start;
+    outputVideo.play().catch(()=>{});
+  };
+  if (outputVideo.src !== url) {
+    outputVideo.onloadedmetadata = seek;
+    outputVideo.src = url;
+  } else {
+    seek();
+  }
+}
+
 function showSlide(idx) {
   if (!slides.length) return;
   slideIndex = idx;
+  // The browser picks the smallest AVIF/WebP variant that fits; the PNG
+  // is only fetched by browsers supporting neither
+  const srcset = slides[idx].srcset || {};
+  slideAvif.srcset = srcset.avif || '';
+  slideWebp.srcset = srcset.webp || '';
   slideImg.src = slides[idx].thumb;
   slideInfo.textContent = `Slide ${idx + 1}`;
-  const start = timestamps[idx] || 0;
-  const end = timestamps[idx + 1] || outputVideo.duration || Infinity;
-  segmentEnd = end;
-  outputVideo.currentTime = start;
-  outputVideo.play().catch(()=>{});
+  segmentEnd = slideEnd(idx);
   playPauseBtn.textContent = 'Pause';
+  if (segmentedPlayback) {
+    showSegmentedSlide(idx);
+    return;
+  }
+  outputVideo.currentTime = timestamps[idx] || 0;
+  outputVideo.play().catch(()=>{});
 }
 
-async function loadInitial() {
-  const params = new URLSearchParams(window.location.search);
-  currentId = params.get('id') || 'default';
+async function watchSegments() {
+  while (renderSegments.some(seg => !seg.video)) {
+    await new Promise(resolve => setTimeout(resolve, 5000));
+    const manifest = await loadManifest(currentId);
+    if (manifest) renderSegments = manifest.segments || [];
+    if (waitingForSegment) showSlide(slideIndex);
+  }
+}
 
-  outputVideo.src = `${location.origin}/outputs/${currentId}.mp4`;
+async function loadManifest(id) {
   try {
-    const res = await fetch(`${location.origin}/uploads/${currentId}_timestamps.json`);
-    timestamps = await res.json();
+    const res = await fetch(`${location.origin}/classes/${id}/manifest`);
+    if (!res.ok) return null;
+    return await res.json();
   } catch {
-    timestamps = [];
+    return null;
   }
+}
+
+async function loadInitial() {
+  const params = new URLSearchParams(window.location.search);
+  currentId = params.get('id') || 'default';
+
+  const manifest = await loadManifest(currentId);
   let slidesId = '';
-  try {
-    slidesId = await (await fetch(`${location.origin}/uploads/${currentId}_slides_id.txt`)).text();
-    slidesId = slidesId.trim();
-  } catch {}
-  let loaded = false;
-  if (slidesId && slidesId !== 'presentation-id-placeholder') {
+  if (manifest) {
+    // Prefer HLS where the browser plays it natively (Safari, iOS)
+    const useHls = manifest.hls && outputVideo.canPlayType('application/vnd.apple.mpegurl');
+    outputVideo.src = `${location.origin}${useHls ? manifest.hls : manifest.output_video}`;
+    timestamps = manifest.timestamps;
+    slidesId = manifest.slides_id;
+    const images = manifest.slide_images || [];
+    slides = manifest.slides.map((url, i) => ({
+      thumb: `${location.origin}${url}`,
+      srcset: (images[i] || {}).srcset,
+      text: ''
+    }));
+    renderSegments = manifest.segments || [];
+  } else {
+    // Classes without a manifest: probe the individual files
+    outputVideo.src = `${location.origin}/outputs/${currentId}/lecture.mp4`;
+    try {
+      const res = await fetch(`${location.origin}/uploads/${currentId}/timestamps.json`);
+      timestamps = await res.json();
+    } catch {
+      timestamps = [];
+    }
+    try {
+      slidesId = await (await fetch(`${location.origin}/uploads/${currentId}/slides_id.txt`)).text();
+      slidesId = slidesId.trim();
+    } catch {}
+  }
+  let loaded = slides.length > 0;
+  if (!loaded && slidesId && slidesId !== 'presentation-id-placeholder') {
     loaded = await loadSlides(slidesId);
   }
-  if (!loaded) {
+  if (!loaded && !manifest) {
     await loadLocalSlides(currentId);
 
   }
@@ -139,6 +232,14 @@ async function loadInitial() {
       showSlide(0);
     }
   };
+  outputVideo.onerror = () => {
+    // The full lecture is not rendered yet; play the finished segments
+    if (!segmentedPlayback && renderSegments.length) {
+      segmentedPlayback = true;
+      showSlide(slideIndex);
+      watchSegments();
+    }
+  };
   startStreaming();
 }
 
@@ -147,8 +248,7 @@ window.addEventListener('load', loadInitial);
 
 playPauseBtn.onclick = () => {
   if (outputVideo.paused) {
-    const end = timestamps[slideIndex + 1] || outputVideo.duration || Infinity;
-    segmentEnd = end;
+    segmentEnd = slideEnd(slideIndex);
     outputVideo.play();
     playPauseBtn.textContent = 'Pause';
   } else {
@@ -179,6 +279,55 @@ outputVideo.ontimeupdate = () => {
 
 };
 
+function askStreaming(payload) {
+  // Clips arrive one sentence at a time; play them back to back while the
+  // rest of the answer is still being generated.
+  return new Promise((resolve, reject) => {
+    const wsProtocol = location.protocol === 'https:' ? 'wss' : 'ws';
+    const ws = new WebSocket(`${wsProtocol}://${location.host}/ws/chat/${currentId}`);
+    const clips = [];
+    let playing = false;
+    let finished = false;
+
+    function playNext() {
+      if (!clips.length) {
+        playing = false;
+        if (finished) {
+          ws.close();
+          resolve();
+        }
+        return;
+      }
+      playing = true;
+      outputVideo.style.display = 'none';
+      chatVideo.src = `/outputs/${clips.shift()}`;
+      chatVideo.style.display = 'block';
+      chatVideo.onended = playNext;
+      chatVideo.play();
+    }
+
+    chatAnswer.textContent = '';
+    ws.onopen = () => ws.send(JSON.stringify(payload));
+    ws.onmessage = ev => {
+      const msg = JSON.parse(ev.data);
+      if (msg.type === 'token') {
+        chatAnswer.textContent += msg.text;
+      } else if (msg.type === 'clip') {
+        clips.push(msg.video);
+        if (!playing) playNext();
+      } else if (msg.type === 'done') {
+        chatAnswer.textContent = msg.answer;
+        finished = true;
+        if (!playing) playNext();
+      } else if (msg.type === 'error') {
+        ws.close();
+        reject(new Error(msg.detail));
+      }
+    };
+    ws.onerror = () => reject(new Error('connection failed'));
+  });
+}
+
 chatBtn.onclick = async () => {
   if (!currentId || chatBtn.disabled) {
     return;
@@ -193,37 +342,20 @@ chatBtn.onclick = async () => {
 
   const slideText = slides[slideIndex] ? slides[slideIndex].text : '';
   const payload = {
-    uid: currentId,
     question: question,
     slide_index: slideIndex + 1,
     slide_text: slideText
   };
 
   try {
-    const res = await fetch('/chat', {
-      method: 'POST',
-      headers: { 'Content-Type': 'application/json' },
-      body: JSON.stringify(payload)
-    });
-    const data = await res.json();
-    if (!res.ok) throw new Error(data.detail || 'Error');
-    chatAnswer.textContent = data.answer;
-    outputVideo.style.display = 'none';
-    chatVideo.src = `/outputs/${data.video}`;
-    chatVideo.style.display = 'block';
-    chatVideo.play();
-    chatVideo.onended = () => {
-      chatVideo.style.display = 'none';
-      outputVideo.style.display = 'block';
-      showSlide(slideIndex); // resume current slide
-      chatBtn.disabled = false;
-    };
+    await askStreaming(payload);
   } catch (err) {
     alert('Chat failed: ' + err.message);
-    outputVideo.style.display = 'block';
-    showSlide(slideIndex);
-    chatBtn.disabled = false;
   }
+  chatVideo.style.display = 'none';
+  outputVideo.style.display = 'block';
+  showSlide(slideIndex); // resume current slide
+  chatBtn.disabled = false;
 };
 
 uploadBtn.onclick = () => {
@@ -1,5 +1,21 @@
 const status = document.getElementById('status');
 
+async function waitForJob(jobId) {
+  while (true) {
+    const res = await fetch(`/jobs/${jobId}`);
+    const job = await res.json();
+    if (!res.ok) throw new Error(job.detail || 'Job lookup failed');
+    if (job.status === 'done') return job;
+    // Segmented renders can be watched as soon as the first slide is ready
+    if ((job.segments || []).some(seg => seg.status === 'done')) return job;
+    if (job.status === 'failed') throw new Error(job.error || 'Generation failed');
+    status.textContent = job.position != null
+      ? `Generating avatar (${job.status}, position ${job.position})...`
+      : `Generating avatar (${job.status})...`;
+    await new Promise(resolve => setTimeout(resolve, 3000));
+  }
+}
+
 document.getElementById('uploadBtn').onclick = async () => {
   const slidesId = document.getElementById('slidesId').value.trim();
   const slidesFile = document.getElementById('slidesFile').files[0];
@@ -21,6 +37,7 @@ document.getElementById('uploadBtn').onclick = async () => {
   formData.append('audio', audioFile);
   formData.append('timestamps', timeFile);
   formData.append('avatar', avatarFile);
+  formData.append('mode', document.getElementById('segmented').checked ? 'segmented' : 'full');
 
   status.textContent = 'Uploading...';
 
@@ -28,6 +45,7 @@ document.getElementById('uploadBtn').onclick = async () => {
     const res = await fetch('/upload', { method: 'POST', body: formData });
     const data = await res.json();
     if (!res.ok) throw new Error(data.detail || 'Upload failed');
+    await waitForJob(data.job_id);
     status.textContent = 'Success! Redirecting...';
     window.location.href = `/?id=${data.id}`;
   } catch (err) {
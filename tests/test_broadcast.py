@@ -0,0 +1,49 @@
+import asyncio
+
+from app.broadcast import Broadcaster
+
+
+def _source(opened: list):
+    def source():
+        async def frames():
+            opened.append(1)
+            while True:
+                yield b"jpeg"
+                await asyncio.sleep(0.01)
+
+        return frames()
+
+    return source
+
+
+def test_viewers_share_one_upstream_session():
+    async def scenario():
+        opened: list = []
+        broadcaster = Broadcaster()
+        stream, first = broadcaster.join("c1", _source(opened))
+        same, second = broadcaster.join("c1", _source(opened))
+        assert same is stream
+        await asyncio.sleep(0.03)
+        assert len(opened) == 1
+        assert not first.queue.empty() and not second.queue.empty()
+
+    asyncio.run(scenario())
+
+
+def test_rejoin_after_last_viewer_left_keeps_new_stream():
+    async def scenario():
+        opened: list = []
+        broadcaster = Broadcaster()
+        old, sub = broadcaster.join("c1", _source(opened))
+        await asyncio.sleep(0.02)
+        old.unsubscribe(sub)
+        # Rejoin before the cancelled pump has run its cleanup
+        new, _ = broadcaster.join("c1", _source(opened))
+        assert new is not old
+        await asyncio.sleep(0.03)
+        third, _ = broadcaster.join("c1", _source(opened))
+        assert third is new
+        assert len(opened) == 2
+        assert broadcaster.stats()["c1"]["viewers"] == 2
+
+    asyncio.run(scenario())
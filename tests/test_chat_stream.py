@@ -0,0 +1,44 @@
+import asyncio
+
+from app import chat_stream
+from app.chat_stream import ClipPipeline, SentenceSplitter
+
+
+def test_splitter_releases_sentences_as_they_complete():
+    splitter = SentenceSplitter(min_chars=10)
+    assert splitter.feed("The gradient points uphill") == []
+    assert splitter.feed(". So we step the oth") == ["The gradient points uphill."]
+    assert splitter.feed("er way.") == []
+    assert splitter.flush() == ["So we step the other way."]
+
+
+def test_splitter_merges_short_sentences():
+    splitter = SentenceSplitter(min_chars=20)
+    assert splitter.feed("Sure. Here is the idea behind it. ") == ["Sure. Here is the idea behind it."]
+    assert splitter.flush() == []
+
+
+def test_pipeline_delivers_clips_in_sentence_order(monkeypatch):
+    async def synthesize(text):
+        return f"{text}.wav"
+
+    async def render_clip(uid, audio_path, avatar_path):
+        # Later sentences finish first
+        await asyncio.sleep(0.01 * (3 - int(audio_path[0])))
+        return f"{uid}/{audio_path}.mp4"
+
+    monkeypatch.setattr(chat_stream.tts_service, "synthesize", synthesize)
+    monkeypatch.setattr(chat_stream, "render_clip", render_clip)
+
+    async def scenario():
+        pipeline = ClipPipeline("c1", "avatar.png")
+        for text in ("1", "2", "3"):
+            pipeline.submit(text)
+        pipeline.close()
+        return [item async for item in pipeline.results()]
+
+    assert asyncio.run(scenario()) == [
+        (0, "1", "c1/1.wav.mp4"),
+        (1, "2", "c1/2.wav.mp4"),
+        (2, "3", "c1/3.wav.mp4"),
+    ]
@@ -0,0 +1,57 @@
+import pytest
+import requests
+
+from app import musetalk_runner
+
+
+class Response:
+    def __init__(self, status, body=b""):
+        self.status_code = status
+        self.body = body
+        self.headers = {"Content-Length": str(len(body))}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code}", response=self)
+
+    def iter_content(self, size):
+        yield self.body
+
+
+class Session:
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.calls = 0
+
+    def get(self, url, **kwargs):
+        self.calls += 1
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+def _download(tmp_path, monkeypatch, session):
+    monkeypatch.setattr(musetalk_runner, "_http_session", lambda: session)
+    monkeypatch.setattr(musetalk_runner.time, "sleep", lambda seconds: None)
+    return musetalk_runner.download_file("https://example.invalid/v.mp4", str(tmp_path / "v.mp4"))
+
+
+def test_permanent_http_errors_fail_at_once(tmp_path, monkeypatch):
+    session = Session(Response(404), Response(200, b"video"))
+    with pytest.raises(RuntimeError):
+        _download(tmp_path, monkeypatch, session)
+    assert session.calls == 1
+
+
+def test_server_errors_and_dropped_connections_are_retried(tmp_path, monkeypatch):
+    session = Session(Response(503), requests.ConnectionError("reset"), Response(200, b"video"))
+    _download(tmp_path, monkeypatch, session)
+    assert session.calls == 3
+    assert (tmp_path / "v.mp4").read_bytes() == b"video"
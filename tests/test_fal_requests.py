@@ -0,0 +1,60 @@
+import asyncio
+
+import pytest
+
+from app import musetalk_runner
+
+
+class Queued:
+    pass
+
+
+class Handle:
+    def __init__(self) -> None:
+        self.cancelled = False
+
+    async def status(self, with_logs: bool = False):
+        return Queued()
+
+    async def get(self) -> dict:
+        return {}
+
+    async def cancel(self) -> None:
+        self.cancelled = True
+
+
+class Client:
+    def __init__(self) -> None:
+        self.handle = Handle()
+
+    async def submit_async(self, endpoint: str, arguments: dict) -> Handle:
+        return self.handle
+
+
+@pytest.fixture
+def client(monkeypatch):
+    fake = Client()
+    monkeypatch.setattr(musetalk_runner, "get_fal_client", lambda: fake)
+    monkeypatch.setattr(musetalk_runner, "FAL_POLL_INTERVAL", 0.01)
+    return fake
+
+
+def test_request_past_deadline_is_cancelled(client, monkeypatch):
+    monkeypatch.setattr(musetalk_runner, "FAL_REQUEST_TIMEOUT", 0.05)
+    with pytest.raises(TimeoutError):
+        asyncio.run(musetalk_runner._call_endpoint("fal-ai/musetalk", {}, lambda s: None))
+    assert client.handle.cancelled
+
+
+def test_cancelled_caller_cancels_request(client):
+    async def scenario():
+        task = asyncio.create_task(
+            musetalk_runner._call_endpoint("fal-ai/musetalk", {}, lambda s: None)
+        )
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(scenario())
+    assert client.handle.cancelled
@@ -0,0 +1,24 @@
+import hashlib
+from collections import OrderedDict
+
+from app import hashing
+
+
+def test_memo_keeps_most_recently_used_digests(tmp_path, monkeypatch):
+    monkeypatch.setattr(hashing, "HASH_MEMO_SIZE", 2)
+    monkeypatch.setattr(hashing, "_memo", OrderedDict())
+    paths = []
+    for name in ("a", "b", "c"):
+        path = tmp_path / name
+        path.write_bytes(name.encode())
+        paths.append(str(path))
+
+    assert hashing.sha256_file(paths[0]) == hashlib.sha256(b"a").hexdigest()
+    hashing.sha256_file(paths[1])
+    hashing.sha256_file(paths[0])
+    hashing.sha256_file(paths[2])
+
+    memoised = {key[0] for key in hashing._memo}
+    assert len(memoised) == 2
+    assert str((tmp_path / "a").resolve()) in memoised
+    assert str((tmp_path / "b").resolve()) not in memoised
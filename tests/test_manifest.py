@@ -0,0 +1,26 @@
+import json
+
+from app import manifest
+from app.storage import ClassStorage
+
+
+def test_rebuild_keeps_published_clips_and_segments(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    store = ClassStorage("index.db", "uploads", "outputs")
+    monkeypatch.setattr(manifest, "storage", store)
+    timestamps = store.input_path("c1", "timestamps.json")
+    with open(timestamps, "w") as f:
+        json.dump([0, 5], f)
+    store.register("c1", "timestamps", timestamps)
+    manifest.write_manifest("c1")
+
+    warm = store.output_path("c1", "warm_" + "a" * 32 + ".mp4")
+    open(warm, "wb").close()
+    manifest.add_clip("c1", store.output_name(warm))
+    manifest.add_clip("c1", "c1/qa_gone.mp4")
+    manifest.set_segments("c1", [{"start": 0, "end": 5, "video": store.output_path("c1", "seg_1.mp4")}])
+
+    rebuilt = manifest.write_manifest("c1")
+
+    assert rebuilt["qa_clips"] == [store.url(warm)]
+    assert rebuilt["segments"] == [{"start": 0, "end": 5, "video": "/outputs/c1/seg_1.mp4"}]
@@ -0,0 +1,35 @@
+import os
+
+from app import media
+
+
+def test_transcode_cache_hit_refreshes_and_miss_trims(tmp_path, monkeypatch):
+    monkeypatch.setattr(media, "MEDIA_CACHE_DIR", str(tmp_path / "media"))
+    monkeypatch.setattr(media, "MEDIA_CACHE_MAX_BYTES", 150)
+
+    def run(cmd, **kwargs):
+        with open(cmd[-1], "wb") as f:
+            f.write(b"x" * 100)
+
+    monkeypatch.setattr(media.subprocess, "run", run)
+    sources = []
+    for name in ("a", "b"):
+        path = tmp_path / f"{name}.wav"
+        path.write_bytes(name.encode())
+        sources.append(str(path))
+
+    first, hit = media.normalize_audio(sources[0])
+    assert not hit
+    os.utime(first, (1, 1))
+    assert media.normalize_audio(sources[0]) == (first, True)
+    assert os.stat(first).st_mtime > 1
+
+    second, _ = media.normalize_audio(sources[1])
+    assert os.path.exists(second)
+    assert not os.path.exists(first)
+    assert media.media_stats()["evictions"] >= 1
+
+
+def test_probe_duration_without_ffprobe_is_unknown(tmp_path, monkeypatch):
+    monkeypatch.setenv("PATH", str(tmp_path))
+    assert media.probe_duration(str(tmp_path / "audio.wav")) is None
@@ -0,0 +1,52 @@
+import asyncio
+import os
+
+from app.musetalk_runner import RenderCache
+
+
+def _render(tmp_path, name):
+    path = tmp_path / "out" / name
+    path.parent.mkdir(exist_ok=True)
+    path.write_bytes(b"x" * 100)
+    return str(path)
+
+
+def test_store_evicts_least_recently_used(tmp_path):
+    cache = RenderCache(str(tmp_path / "renders"), max_bytes=250)
+    os.makedirs(cache.directory)
+    cache.store("a", _render(tmp_path, "a.mp4"))
+    os.utime(cache._path("a"), (1, 1))
+    cache.store("b", _render(tmp_path, "b.mp4"))
+    os.utime(cache._path("b"), (2, 2))
+
+    assert cache.fetch("a", str(tmp_path / "copy.mp4"))  # bumps "a"
+    cache.store("c", _render(tmp_path, "c.mp4"))
+
+    assert os.path.exists(cache._path("a"))
+    assert not os.path.exists(cache._path("b"))
+    assert os.path.exists(cache._path("c"))
+    assert cache.stats()["evictions"] == 1
+
+
+def test_concurrent_misses_share_one_render(tmp_path):
+    cache = RenderCache(str(tmp_path / "renders"), max_bytes=10_000)
+    os.makedirs(cache.directory)
+    renders = []
+
+    async def scenario():
+        async def render(output):
+            renders.append(output)
+            await asyncio.sleep(0.01)
+            _render(tmp_path, os.path.basename(output))
+            return {"rendered": True}
+
+        outputs = [str(tmp_path / "out" / f"{i}.mp4") for i in range(3)]
+        return await asyncio.gather(*(
+            cache.get_or_render("k", output, lambda output=output: render(output))
+            for output in outputs
+        ))
+
+    results = asyncio.run(scenario())
+    assert len(renders) == 1
+    assert results.count(None) == 2
+    assert cache.stats()["collapsed"] == 2
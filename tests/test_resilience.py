@@ -0,0 +1,123 @@
+import asyncio
+
+import pytest
+
+from app import resilience
+from app.resilience import CircuitBreaker, CircuitOpenError, is_transient, retry
+
+
+class HTTPError(Exception):
+    def __init__(self, status_code: int) -> None:
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+def _failing(exc: Exception):
+    async def call():
+        raise exc
+
+    return call
+
+
+async def _ok():
+    return "ok"
+
+
+def test_is_transient():
+    assert is_transient(HTTPError(503))
+    assert is_transient(HTTPError(429))
+    assert is_transient(ConnectionError())
+    assert not is_transient(HTTPError(422))
+    assert not is_transient(ValueError("bad input"))
+
+
+def test_breaker_opens_after_transient_failures():
+    async def scenario():
+        breaker = CircuitBreaker("fal", failures=2, reset_after=60)
+        for _ in range(2):
+            with pytest.raises(HTTPError):
+                await breaker.call(_failing(HTTPError(503)))
+        assert breaker.state == "open"
+        with pytest.raises(CircuitOpenError):
+            await breaker.call(_ok)
+        assert breaker.rejected == 1
+
+    asyncio.run(scenario())
+
+
+def test_breaker_ignores_client_errors():
+    async def scenario():
+        breaker = CircuitBreaker("fal", failures=2, reset_after=60)
+        for _ in range(5):
+            with pytest.raises(HTTPError):
+                await breaker.call(_failing(HTTPError(422)))
+        assert breaker.state == "closed"
+        assert await breaker.call(_ok) == "ok"
+
+    asyncio.run(scenario())
+
+
+def test_half_open_trial_decides(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(resilience.time, "monotonic", lambda: now[0])
+
+    async def scenario():
+        breaker = CircuitBreaker("fal", failures=1, reset_after=10)
+        with pytest.raises(HTTPError):
+            await breaker.call(_failing(HTTPError(502)))
+        assert breaker.state == "open"
+        now[0] += 10
+        assert breaker.state == "half_open"
+        # A client error during the trial gives no verdict and frees the trial
+        with pytest.raises(HTTPError):
+            await breaker.call(_failing(HTTPError(400)))
+        assert breaker.state == "half_open"
+        assert await breaker.call(_ok) == "ok"
+        assert breaker.state == "closed"
+
+    asyncio.run(scenario())
+
+
+def test_failed_trial_reopens(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(resilience.time, "monotonic", lambda: now[0])
+
+    async def scenario():
+        breaker = CircuitBreaker("fal", failures=1, reset_after=10)
+        with pytest.raises(HTTPError):
+            await breaker.call(_failing(HTTPError(503)))
+        now[0] += 10
+        with pytest.raises(HTTPError):
+            await breaker.call(_failing(HTTPError(503)))
+        assert breaker.state == "open"
+        assert breaker.opened == 2
+
+    asyncio.run(scenario())
+
+
+def test_retry_transient_then_succeeds(monkeypatch):
+    monkeypatch.setattr(resilience.random, "uniform", lambda a, b: 0)
+    calls = []
+
+    async def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise HTTPError(503)
+        return "done"
+
+    retried = []
+    result = asyncio.run(retry(flaky, attempts=4, on_retry=lambda exc, n: retried.append(n)))
+    assert result == "done"
+    assert retried == [1, 2]
+
+
+def test_retry_gives_up_on_client_error():
+    calls = []
+
+    async def bad():
+        calls.append(1)
+        raise HTTPError(422)
+
+    with pytest.raises(HTTPError):
+        asyncio.run(retry(bad, attempts=4))
+    assert len(calls) == 1
@@ -0,0 +1,85 @@
+import os
+import time
+
+from app.retention import RetentionManager
+from app.storage import ClassStorage
+
+
+def _store(tmp_path):
+    return ClassStorage(str(tmp_path / "index.db"), str(tmp_path / "uploads"), str(tmp_path / "outputs"))
+
+
+def _write(path, size, age=0.0):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(b"x" * size)
+    if age:
+        then = time.time() - age
+        os.utime(path, (then, then))
+    return path
+
+
+def test_ttl_skips_classes_with_work_in_progress(tmp_path):
+    store = _store(tmp_path)
+    for uid in ("idle", "busy"):
+        store.register(uid, "pdf", _write(store.input_path(uid, "slides.pdf"), 10))
+    manager = RetentionManager(store, max_bytes=0, class_ttl=0.01)
+    manager.in_use.append(lambda: {"busy"})
+    time.sleep(0.05)
+
+    assert manager.sweep()["expired_classes"] == 1
+    assert not os.path.exists(store.class_dir("idle"))
+    assert os.path.exists(store.class_dir("busy"))
+
+
+def test_caches_count_towards_budget_and_go_first(tmp_path):
+    store = _store(tmp_path)
+    cache = tmp_path / "cache"
+    old = _write(str(cache / "old.wav"), 400, age=3600)
+    _write(str(cache / ".partial.mp4"), 400, age=3600)
+    clip = _write(store.output_path("c1", "qa_" + "a" * 32 + ".mp4"), 400)
+    store.register("c1", "qa_clip", clip)
+    manager = RetentionManager(store, max_bytes=500, class_ttl=0)
+    manager.caches.append(str(cache))
+
+    report = manager.sweep()
+    assert report["evicted"] == 1
+    assert not os.path.exists(old)
+    assert os.path.exists(clip)
+
+
+def test_hard_linked_clip_frees_nothing_until_cache_copy_goes(tmp_path):
+    store = _store(tmp_path)
+    cache = tmp_path / "cache"
+    cached = _write(str(cache / "render.mp4"), 400, age=3600)
+    clip = store.output_path("c1", "qa_" + "b" * 32 + ".mp4")
+    os.link(cached, clip)
+    store.register("c1", "qa_clip", clip)
+    manager = RetentionManager(store, max_bytes=100, class_ttl=0)
+    manager.caches.append(str(cache))
+
+    report = manager.sweep()
+    assert not os.path.exists(clip)
+    assert not os.path.exists(cached)
+    assert report["reclaimed_bytes"] == 400
+
+
+def test_hls_segment_hits_touch_the_registered_directory(tmp_path):
+    store = _store(tmp_path)
+    hls = os.path.join(store.media_dir("c1"), "lecture_hls")
+    _write(os.path.join(hls, "seg_0000.0123456789ab.ts"), 10)
+    store.register("c1", "hls", hls)
+    manager = RetentionManager(store, max_bytes=0, class_ttl=0)
+
+    manager.touch_output("c1/lecture_hls/seg_0000.0123456789ab.ts")
+    manager.sweep()
+
+    assert store.find("c1", "hls")["last_access"] is not None
+
+
+def test_access_updates_use_the_primary_key(tmp_path):
+    plan = _store(tmp_path)._db().execute(
+        "EXPLAIN QUERY PLAN UPDATE artifacts SET last_access = 1 WHERE uid = ? AND path = ?",
+        ("c1", "p"),
+    ).fetchall()
+    assert "USING INDEX" in " ".join(row[-1] for row in plan)
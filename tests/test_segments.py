@@ -0,0 +1,62 @@
+import asyncio
+import os
+
+from app import segments
+from app.segments import plan_segments
+
+
+def test_plan_segments_starts_at_zero_and_runs_to_the_end():
+    assert plan_segments([1.0, 5.0, 9.0], 12.0) == [
+        {"index": 0, "start": 0.0, "end": 5.0},
+        {"index": 1, "start": 5.0, "end": 9.0},
+        {"index": 2, "start": 9.0, "end": 12.0},
+    ]
+
+
+def test_plan_segments_merges_short_tail():
+    plan = plan_segments([0.0, 4.0, 7.8], 8.0)
+    assert plan[-1] == {"index": 1, "start": 4.0, "end": 8.0}
+
+
+def test_plan_segments_open_end_without_duration():
+    assert plan_segments([], None) == [{"index": 0, "start": 0.0, "end": None}]
+
+
+def test_failed_segment_cancels_siblings_and_removes_audio(tmp_path, monkeypatch):
+    cancelled = []
+
+    def split_audio(audio_path, seg, out_path):
+        with open(out_path, "wb") as f:
+            f.write(b"wav")
+
+    async def run_musetalk(audio_path, avatar_path, output_path):
+        if audio_path.endswith("seg_1.wav"):
+            raise RuntimeError("render failed")
+        try:
+            await asyncio.sleep(30)
+        except asyncio.CancelledError:
+            cancelled.append(audio_path)
+            raise
+
+    monkeypatch.setattr(segments, "split_audio", split_audio)
+    monkeypatch.setattr(segments, "run_musetalk", run_musetalk)
+    monkeypatch.setattr(segments, "SEGMENT_RETRIES", 0)
+    audio = tmp_path / "narration.wav"
+    audio.write_bytes(b"")
+
+    async def publish(segs):
+        pass
+
+    async def scenario():
+        try:
+            await segments.render_segments(
+                "c1", str(audio), "avatar.png", [0.0, 5.0, 10.0],
+                str(tmp_path / "lecture.mp4"), publish, duration=15.0,
+            )
+        except RuntimeError as exc:
+            return exc
+
+    exc = asyncio.run(asyncio.wait_for(scenario(), 5))
+    assert str(exc) == "render failed"
+    assert len(cancelled) == 2
+    assert not [name for name in os.listdir(tmp_path) if name.startswith("seg_")]
@@ -0,0 +1,45 @@
+import json
+
+from app.slide_index import BM25, SlideIndex, SlideTexts, tokenize
+from app.storage import ClassStorage
+
+
+def test_bm25_ranks_documents_with_rarer_terms_higher():
+    docs = [tokenize(text) for text in (
+        "gradient descent updates the weights",
+        "the weights of the network",
+        "convolution kernels slide over the image",
+    )]
+    scores = BM25(docs).scores(tokenize("gradient weights"))
+    assert scores[0] > scores[1] > scores[2] == 0.0
+
+
+def test_search_returns_one_passage_per_page_and_skips_current_page():
+    index = SlideIndex(
+        ["backpropagation computes gradients", "gradients flow backwards gradients", "pooling layers"],
+        passage_words=2,
+    )
+    hits = index.search("gradients", k=3, exclude_page=1)
+    assert [page for page, _ in hits] == [2]
+
+
+def test_page_out_of_range_is_empty():
+    index = SlideIndex(["one"])
+    assert index.page(1) == "one"
+    assert index.page(0) == index.page(2) == ""
+
+
+def test_slide_texts_keeps_only_recent_indexes(tmp_path):
+    store = ClassStorage(str(tmp_path / "index.db"), str(tmp_path / "uploads"), str(tmp_path / "outputs"))
+    texts = SlideTexts(store, max_entries=2)
+    for uid in ("a", "b", "c"):
+        path = store.input_path(uid, "slides_text.json")
+        with open(path, "w") as f:
+            json.dump([f"slide about {uid}"], f)
+        store.register(uid, "slides_text", path)
+
+    texts.index("a")
+    texts.index("b")
+    texts.index("a")
+    texts.index("c")
+    assert list(texts._indexes) == ["a", "c"]
@@ -0,0 +1,32 @@
+import os
+import threading
+
+import pdf2image
+
+from app import slides
+
+
+def test_rasterize_keeps_pages_apart_when_names_share_a_prefix(tmp_path, monkeypatch):
+    written = threading.Barrier(12)
+
+    def convert_from_path(pdf_path, first_page, output_folder, output_file, **kwargs):
+        with open(os.path.join(output_folder, f"{output_file}.png"), "w") as f:
+            f.write(str(first_page))
+        # Every page is on disk before any of them lists its folder
+        written.wait(timeout=5)
+        return sorted(
+            os.path.join(output_folder, name)
+            for name in os.listdir(output_folder) if name.startswith(output_file)
+        )
+
+    monkeypatch.setattr(pdf2image, "convert_from_path", convert_from_path)
+    monkeypatch.setattr(pdf2image, "pdfinfo_from_path", lambda path: {"Pages": 12})
+    monkeypatch.setattr(slides, "encode_variants", lambda path, page, out_dir: [])
+
+    results = slides.rasterize_pdf("deck.pdf", str(tmp_path), workers=12)
+
+    assert [r["page"] for r in results] == list(range(1, 13))
+    for record in results:
+        with open(record["path"]) as f:
+            assert f.read() == str(record["page"])
+    assert not [name for name in os.listdir(tmp_path) if name.startswith(".slides_")]
@@ -0,0 +1,78 @@
+import asyncio
+import os
+import time
+
+from app.tts import TTSEngine, TTSService
+
+
+class FakeEngine(TTSEngine):
+    name = "fake"
+
+    def __init__(self):
+        super().__init__("en")
+        self.calls = 0
+
+    def synthesize(self, text, path):
+        self.calls += 1
+        with open(path, "wb") as f:
+            f.write(b"x" * 100)
+
+
+def test_cache_evicts_least_recently_used_audio(tmp_path):
+    engine = FakeEngine()
+    service = TTSService(engine, cache_dir=str(tmp_path), max_bytes=250)
+
+    async def scenario():
+        first = await service.synthesize("one")
+        os.utime(first, (1, 1))
+        second = await service.synthesize("two")
+        os.utime(second, (2, 2))
+        assert await service.synthesize("one") == first  # hit, now most recent
+        await service.synthesize("three")
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert os.path.exists(first)
+    assert not os.path.exists(second)
+    assert engine.calls == 3
+    assert service.stats()["evictions"] == 1
+
+
+class SlowEngine(FakeEngine):
+    def synthesize(self, text, path):
+        time.sleep(0.05)
+        super().synthesize(text, path)
+
+
+def test_waiter_takes_over_when_the_first_caller_is_cancelled(tmp_path):
+    engine = SlowEngine()
+    service = TTSService(engine, cache_dir=str(tmp_path / "tts"))
+
+    async def scenario():
+        first = asyncio.create_task(service.synthesize("hello"))
+        await asyncio.sleep(0.01)
+        second = asyncio.create_task(service.synthesize("hello"))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return await second
+
+    path = asyncio.run(scenario())
+    assert os.path.exists(path)
+    assert engine.calls >= 1
+
+
+def test_synthesis_errors_reach_every_waiter(tmp_path):
+    class BrokenEngine(FakeEngine):
+        def synthesize(self, text, path):
+            time.sleep(0.02)
+            raise RuntimeError("no voice")
+
+    service = TTSService(BrokenEngine(), cache_dir=str(tmp_path / "tts"))
+
+    async def scenario():
+        return await asyncio.gather(
+            service.synthesize("hello"), service.synthesize("hello"), return_exceptions=True
+        )
+
+    results = asyncio.run(scenario())
+    assert [str(r) for r in results] == ["no voice", "no voice"]
@@ -0,0 +1,57 @@
+import asyncio
+import os
+
+from app.slide_index import SlideIndex
+from app.storage import ClassStorage
+from app.warm_qa import WarmAnswers
+
+
+class FakeTexts:
+    def __init__(self, pages=None):
+        self.pages = pages
+
+    def index(self, uid):
+        return SlideIndex(self.pages) if self.pages is not None else None
+
+
+def _answers(tmp_path, pages):
+    store = ClassStorage(str(tmp_path / "index.db"), str(tmp_path / "uploads"), str(tmp_path / "outputs"))
+    answers = WarmAnswers(store, questions=["Explain this slide"], texts=FakeTexts(pages))
+    answers._slide_count = lambda uid: 3
+    return store, answers
+
+
+def test_warm_skips_slides_without_text(tmp_path):
+    store, answers = _answers(tmp_path, ["gradient descent", "", "loss functions"])
+    warmed = []
+
+    async def generate(uid, slide, question):
+        warmed.append(slide)
+        return {"answer": "a", "video": f"{uid}/warm_{slide}.mp4"}
+
+    asyncio.run(answers._warm("c1", generate, lambda: True))
+    assert warmed == [1, 3]
+
+
+def test_warm_does_nothing_without_slide_text(tmp_path):
+    store, answers = _answers(tmp_path, None)
+    warmed = []
+
+    async def generate(uid, slide, question):
+        warmed.append(slide)
+        return {"answer": "a", "video": "x.mp4"}
+
+    asyncio.run(answers._warm("c1", generate, lambda: True))
+    assert warmed == []
+
+
+def test_client_text_bypasses_match_when_class_has_no_text(tmp_path):
+    store, answers = _answers(tmp_path, None)
+    video = os.path.join(store.output_dir, "c1", "warm_1.mp4")
+    os.makedirs(os.path.dirname(video))
+    open(video, "wb").close()
+    answers._save("c1", [{"slide": 1, "question": "Explain this slide", "answer": "a",
+                          "video": "c1/warm_1.mp4"}])
+
+    assert answers.match("c1", 1, "Explain this slide") is not None
+    assert answers.match("c1", 1, "Explain this slide", "Backpropagation") is None